@@ -1,3 +1,3 @@
-from ado_wrapper.client import AdoClient
+from ado_wrapper.client import AdoClient, AdoClientPool
 from ado_wrapper.plan_resources import *
 from ado_wrapper.resources import *
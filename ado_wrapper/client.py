@@ -1,11 +1,19 @@
-from typing import Literal
+import copy
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Literal
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
 from ado_wrapper.plan_resources.plan_state_manager import PlanStateManager
 from ado_wrapper.state_manager import StateManager
-from ado_wrapper.errors import AuthenticationError
+from ado_wrapper.errors import AuthenticationError, UnknownError
+
+if TYPE_CHECKING:
+    from ado_wrapper.resources.projects import Project
+    from ado_wrapper.resources.users import AdoUser
 
 
 class AdoClient:
@@ -23,6 +31,10 @@ class AdoClient:
 
         self.suppress_warnings = suppress_warnings
         self.plan_mode = action == "plan"
+        self.policy_type_ids: dict[str, str] = {}  # Policy type display name -> id, org wide, filled on first use (see merge_policies)
+        # These never change, so are cached for the life of the client, filled on first use (see repo_user_permission)
+        self.identity_descriptors: dict[str, str] = {}  # Group subject descriptor -> identity descriptor
+        self.domain_container_ids: dict[str, str] = {}  # User email -> domain container id
 
         self.session = requests.Session()
         self.session.auth = HTTPBasicAuth(ado_email, ado_pat)
@@ -46,3 +58,117 @@ class AdoClient:
                     )
 
         self.state_manager = StateManager(self, state_file_name) if action == "apply" else PlanStateManager(self)  # Has to be last
+
+    def for_project(self, ado_project: str, ado_project_id: str) -> "AdoClient":
+        """Returns a copy of this client scoped to another project in the same organisation, without any initialisation requests.
+        The copy shares this client's session (and state manager), so it's cheap, but should only be used for reading.
+        It also shares the policy type and identity caches, which are org wide, so they're only fetched once across every project."""
+        project_client = copy.copy(self)
+        project_client.ado_project = ado_project
+        project_client.ado_project_id = ado_project_id
+        return project_client
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """An HTTPAdapter which spaces requests out to at most `max_requests_per_second` (across every thread using it),
+    and retries once after a 429, waiting for the Retry-After header (capped at 60 seconds)."""
+
+    def __init__(self, max_requests_per_second: float | None = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.interval = 1 / max_requests_per_second if max_requests_per_second else 0.0
+        self.next_request_time = 0.0
+        self.lock = threading.Lock()
+
+    def _wait_for_turn(self) -> None:
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_request_time - now
+            self.next_request_time = max(now, self.next_request_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def send(self, request: requests.PreparedRequest, *args: Any, **kwargs: Any) -> requests.Response:
+        self._wait_for_turn()
+        response = super().send(request, *args, **kwargs)
+        if response.status_code == 429:
+            time.sleep(min(float(response.headers.get("Retry-After", 1)), 60))
+            self._wait_for_turn()
+            response = super().send(request, *args, **kwargs)
+        return response
+
+
+class AdoClientPool:
+    """Makes per project AdoClients which share one session (and so one connection pool), one auth check, the project list,
+    the PAT author lookup, and a rate limiter, e.g.
+    pool = AdoClientPool(ado_email, ado_pat, ado_org, max_requests_per_second=20)  # 3 requests, no matter how many projects
+    for project_name in pool.projects:
+        ado_client = pool.get_client(project_name)  # No requests
+    Clients don't use a state file unless one is passed to `get_client`, as projects shouldn't share one."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self, ado_email: str, ado_pat: str, ado_org: str, suppress_warnings: bool = False,
+        max_connections: int = 32, max_requests_per_second: float | None = None,  # fmt: skip
+    ) -> None:
+        self.ado_email = ado_email
+        self.ado_pat = ado_pat
+        self.ado_org = ado_org
+        self.suppress_warnings = suppress_warnings
+
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth(ado_email, ado_pat)
+        adapter = RateLimitedAdapter(max_requests_per_second, pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount("https://", adapter)
+        self.clients: dict[tuple[str, str | None, str], AdoClient] = {}  # (project, state file name, action) -> client
+        # These are org wide, so every client shares them (see AdoClient)
+        self.policy_type_ids: dict[str, str] = {}
+        self.identity_descriptors: dict[str, str] = {}
+        self.domain_container_ids: dict[str, str] = {}
+
+        from ado_wrapper.resources.projects import Project  # Stop circular import
+        from ado_wrapper.resources.users import AdoUser  # Stop circular import
+
+        base_client = self._make_client("", "", None)
+        try:
+            # This is also the auth check (helps with setup for first time users)
+            self.projects: dict[str, Project] = {project.name: project for project in Project.get_all(base_client)}
+        except (UnknownError, ValueError) as e:
+            raise AuthenticationError("Failed to authenticate with ADO: Most likely incorrect token or expired token!") from e
+        self.pat_author: AdoUser | None = None
+        try:
+            self.pat_author = AdoUser.get_by_email(base_client, ado_email)
+        except ValueError:
+            if not suppress_warnings:
+                print(
+                    f"[ADO_WRAPPER] WARNING: User {ado_email} not found in ADO, nothing critical, but stops releases from being made, and plans from being accurate."
+                )
+
+    def _make_client(self, ado_project: str, ado_project_id: str, state_file_name: str | None, action: Literal["plan", "apply"] = "apply") -> AdoClient:  # fmt: skip
+        ado_client = AdoClient(
+            self.ado_email, self.ado_pat, self.ado_org, ado_project, state_file_name=None, suppress_warnings=self.suppress_warnings,
+            bypass_initialisation=True, action=action,  # fmt: skip
+        )
+        ado_client.session = self.session
+        ado_client.ado_project_id = ado_project_id
+        ado_client.policy_type_ids = self.policy_type_ids
+        ado_client.identity_descriptors = self.identity_descriptors
+        ado_client.domain_container_ids = self.domain_container_ids
+        if getattr(self, "pat_author", None) is not None:
+            ado_client.pat_author = self.pat_author  # type: ignore[assignment]
+        if state_file_name is not None and action == "apply":
+            ado_client.state_manager = StateManager(ado_client, state_file_name)
+        return ado_client
+
+    def get_client(self, ado_project: str, state_file_name: str | None = None, action: Literal["plan", "apply"] = "apply") -> AdoClient:
+        """Returns the client for a project (made on first use, without any requests), raises a KeyError for unknown projects.
+        Clients are cached per project, state file name and action, so asking for a different state file or action makes a new client."""
+        if ado_project not in self.projects:
+            raise KeyError(f"Project {ado_project} not found in {self.ado_org}! Projects: {list(self.projects)}")
+        key = (ado_project, state_file_name, action)
+        if key not in self.clients:
+            self.clients[key] = self._make_client(ado_project, self.projects[ado_project].project_id, state_file_name, action)
+        return self.clients[key]
+
+    def get_all_clients(self) -> list[AdoClient]:
+        return [self.get_client(project_name) for project_name in self.projects]
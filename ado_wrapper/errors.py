@@ -10,6 +10,12 @@ class ResourceAlreadyExists(Exception):
     pass
 
 
+class CreationFailed(ValueError):
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
 class UnknownError(Exception):
     pass
 
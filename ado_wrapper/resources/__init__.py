@@ -1,12 +1,14 @@
-from ado_wrapper.resources.agent_pools import AgentPool
+from ado_wrapper.resources.agent_pools import Agent, AgentJobRequest, AgentPool, AgentPoolCapacity, AgentPoolMonitor
 from ado_wrapper.resources.annotated_tags import AnnotatedTag
-from ado_wrapper.resources.audit_logs import AuditLog
+from ado_wrapper.resources.audit_logs import AuditLog, AuditLogStore
 from ado_wrapper.resources.branches import Branch
-from ado_wrapper.resources.builds import Build, BuildDefinition
-from ado_wrapper.resources.commits import Commit
+from ado_wrapper.resources.builds import Build, BuildArtifact, BuildDefinition, BuildLog, BuildTimelineRecord
+from ado_wrapper.resources.commits import Commit, PushBuilder
 from ado_wrapper.resources.environment import Environment, PipelineAuthorisation
 from ado_wrapper.resources.groups import Group
 from ado_wrapper.resources.merge_policies import (
+    BranchPolicyIndex,
+    DesiredBranchPolicy,
     MergeBranchPolicy,
     MergePolicies,
     MergePolicyDefaultReviewer,
@@ -14,11 +16,11 @@ from ado_wrapper.resources.merge_policies import (
 from ado_wrapper.resources.projects import Project
 from ado_wrapper.resources.pull_requests import PullRequest
 from ado_wrapper.resources.releases import Release, ReleaseDefinition
-from ado_wrapper.resources.repo_user_permission import RepoUserPermissions, UserPermission
-from ado_wrapper.resources.repo import BuildRepository, Repo
-from ado_wrapper.resources.runs import Run
+from ado_wrapper.resources.repo_user_permission import RepoPermissionAudit, RepoUserPermissions, UserPermission
+from ado_wrapper.resources.repo import BuildRepository, Repo, RepoContentCache
+from ado_wrapper.resources.runs import Run, RunRequest, RunScheduler
 from ado_wrapper.resources.searches import Search
-from ado_wrapper.resources.service_endpoint import ServiceEndpoint
+from ado_wrapper.resources.service_endpoint import ServiceEndpoint, ServiceEndpointPermissionIndex, ServiceEndpointPipelinePermissions
 from ado_wrapper.resources.teams import Team
 from ado_wrapper.resources.users import AdoUser, Member, Reviewer, TeamMember
-from ado_wrapper.resources.variable_groups import VariableGroup
+from ado_wrapper.resources.variable_groups import VariableGroup, VariableGroupSyncResult, VariableReferenceIndex
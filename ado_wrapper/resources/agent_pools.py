@@ -1,16 +1,19 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import TYPE_CHECKING, Any
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Literal
 
+from ado_wrapper.errors import UnknownError
 from ado_wrapper.resources.users import Member
 from ado_wrapper.state_managed_abc import StateManagedResource
-from ado_wrapper.utils import from_ado_date_string
+from ado_wrapper.utils import DEFAULT_MAX_WORKERS, from_ado_date_string, run_concurrently
 
 if TYPE_CHECKING:
     from ado_wrapper.client import AdoClient
 
+AgentStatus = Literal["online", "offline"]
+
 
 @dataclass
 class AgentPool(StateManagedResource):
@@ -87,3 +90,175 @@ class AgentPool(StateManagedResource):
     @classmethod
     def get_by_name(cls, ado_client: AdoClient, agent_pool_id: str) -> AgentPool | None:
         return cls._get_by_abstract_filter(ado_client, lambda agent_pool: agent_pool.agent_pool_id == agent_pool_id)  # type: ignore[return-value, attr-defined]
+
+    def get_agents(self, ado_client: AdoClient, include_capabilities: bool = True) -> list[Agent]:
+        """Returns every agent in the pool, with its status, capabilities, and the job it's currently running (if any)."""
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/_apis/distributedtask/pools/{self.agent_pool_id}/agents"
+            f"?includeCapabilities={str(include_capabilities).lower()}&includeAssignedRequest=true&api-version=7.1",
+        )
+        if request.status_code != 200:
+            raise UnknownError(f"Error getting the agents of pool {self.agent_pool_id}: {request.text}")
+        return [Agent.from_request_payload(x) for x in request.json()["value"]]
+
+    def get_job_requests(self, ado_client: AdoClient, include_completed: bool = False) -> list[AgentJobRequest]:
+        """Returns the pool's job requests, by default only ones which are queued or running."""
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/_apis/distributedtask/pools/{self.agent_pool_id}/jobrequests"
+            + ("?" if include_completed else "?completedRequestCount=0&")
+            + "api-version=7.1",
+        )
+        if request.status_code != 200:
+            raise UnknownError(f"Error getting the job requests of pool {self.agent_pool_id}: {request.text}")
+        job_requests = [AgentJobRequest.from_request_payload(x) for x in request.json()["value"]]
+        return job_requests if include_completed else [x for x in job_requests if x.finish_time is None]
+
+    def get_capacity(self, ado_client: AdoClient) -> AgentPoolCapacity:
+        """Samples how many of the pool's agents are online and busy, and how many jobs are waiting, in two requests."""
+        agents = self.get_agents(ado_client, include_capabilities=False)
+        job_requests = self.get_job_requests(ado_client)
+        return AgentPoolCapacity(
+            self.agent_pool_id, self.name, len(agents),
+            len([agent for agent in agents if agent.status == "online" and agent.enabled]),
+            len([agent for agent in agents if agent.current_job is not None]),
+            len([job_request for job_request in job_requests if job_request.assign_time is None]),
+            datetime.now(timezone.utc),  # fmt: skip
+        )
+
+    @classmethod
+    def get_capacity_many(cls, ado_client: AdoClient, agent_pool_ids: list[str], max_workers: int = DEFAULT_MAX_WORKERS) -> dict[str, AgentPoolCapacity]:  # fmt: skip
+        """Samples the capacity of many pools concurrently, returning {agent_pool_id: capacity}."""
+
+        def get_capacity(agent_pool_id: str) -> AgentPoolCapacity:
+            return cls.get_by_id(ado_client, agent_pool_id).get_capacity(ado_client)
+
+        results, failures = run_concurrently(get_capacity, agent_pool_ids, max_workers)
+        if failures:
+            raise failures[0][1]
+        return dict(results)
+
+
+# ========================================================================================================
+
+
+@dataclass
+class AgentJobRequest:
+    """A job which is queued for, or running on, an agent pool.
+    https://learn.microsoft.com/en-us/rest/api/azure/devops/distributedtask/requests?view=azure-devops-rest-7.1"""
+
+    request_id: str
+    agent_pool_id: str
+    plan_type: str | None = field(repr=False)
+    definition_name: str | None
+    owner_name: str | None
+    reserved_agent_id: str | None  # None until an agent picks it up
+    queue_time: datetime | None = field(repr=False)
+    assign_time: datetime | None = field(repr=False)
+    finish_time: datetime | None = field(repr=False)
+    result: str | None
+
+    @classmethod
+    def from_request_payload(cls, data: dict[str, Any]) -> AgentJobRequest:
+        reserved_agent = data.get("reservedAgent")
+        return cls(
+            str(data["requestId"]), str(data.get("poolId")), data.get("planType"), data.get("definition", {}).get("name"),
+            data.get("owner", {}).get("name"), str(reserved_agent["id"]) if reserved_agent else None,
+            from_ado_date_string(data.get("queueTime")), from_ado_date_string(data.get("assignTime")),
+            from_ado_date_string(data.get("finishTime")), data.get("result"),  # fmt: skip
+        )
+
+
+@dataclass
+class Agent:
+    """https://learn.microsoft.com/en-us/rest/api/azure/devops/distributedtask/agents?view=azure-devops-rest-7.1"""
+
+    agent_id: str
+    name: str
+    version: str = field(repr=False)
+    status: AgentStatus
+    enabled: bool
+    capabilities: dict[str, str] = field(repr=False)  # System and user capabilities, user ones take precedence
+    current_job: AgentJobRequest | None
+
+    @classmethod
+    def from_request_payload(cls, data: dict[str, Any]) -> Agent:
+        assigned_request = data.get("assignedRequest")
+        return cls(
+            str(data["id"]), data["name"], data.get("version", ""), data["status"], data["enabled"],
+            data.get("systemCapabilities", {}) | data.get("userCapabilities", {}),
+            AgentJobRequest.from_request_payload(assigned_request) if assigned_request else None,  # fmt: skip
+        )
+
+
+@dataclass
+class AgentPoolCapacity:
+    """A sample of a pool's capacity, returned by `AgentPool.get_capacity`."""
+
+    agent_pool_id: str
+    name: str
+    total_agents: int
+    online_agents: int  # Online and enabled
+    busy_agents: int
+    queued_jobs: int  # Waiting for an agent
+    sampled_at: datetime = field(repr=False)
+
+    @property
+    def idle_agents(self) -> int:
+        return max(self.online_agents - self.busy_agents, 0)
+
+    @property
+    def free_slots(self) -> int:
+        """How many more jobs could start right now, i.e. idle agents not already claimed by a queued job."""
+        return max(self.idle_agents - self.queued_jobs, 0)
+
+    @property
+    def utilisation(self) -> float:
+        return self.busy_agents / self.online_agents if self.online_agents else 1.0
+
+
+@dataclass
+class AgentPoolMonitor:
+    """Samples the capacity of many pools concurrently, keeping the last `history_size` samples of each for metrics, e.g.
+    monitor = AgentPoolMonitor(["1", "2"])
+    monitor.sample(ado_client)
+    print(monitor.get_free_slots(), monitor.get_average_utilisation("1"), monitor.get_peak_queue_depth())"""
+
+    agent_pool_ids: list[str]
+    max_workers: int = DEFAULT_MAX_WORKERS
+    history_size: int = 60
+    history: dict[str, list[AgentPoolCapacity]] = field(default_factory=dict, repr=False)
+    _agent_pools: dict[str, AgentPool] = field(default_factory=dict, repr=False)
+
+    def sample(self, ado_client: AdoClient) -> dict[str, AgentPoolCapacity]:
+        """Takes one sample of every pool, returning {agent_pool_id: capacity}. The pools themselves are only fetched once."""
+
+        def get_capacity(agent_pool_id: str) -> AgentPoolCapacity:
+            if agent_pool_id not in self._agent_pools:
+                self._agent_pools[agent_pool_id] = AgentPool.get_by_id(ado_client, agent_pool_id)
+            return self._agent_pools[agent_pool_id].get_capacity(ado_client)
+
+        results, failures = run_concurrently(get_capacity, self.agent_pool_ids, self.max_workers)
+        if failures:
+            raise failures[0][1]
+        for agent_pool_id, capacity in results:
+            self.history[agent_pool_id] = (self.history.get(agent_pool_id, []) + [capacity])[-self.history_size :]
+        return dict(results)
+
+    def _get_samples(self, agent_pool_id: str | None) -> list[AgentPoolCapacity]:
+        if agent_pool_id is not None:
+            return self.history.get(agent_pool_id, [])
+        return [capacity for samples in self.history.values() for capacity in samples]
+
+    def get_latest(self) -> dict[str, AgentPoolCapacity]:
+        return {agent_pool_id: samples[-1] for agent_pool_id, samples in self.history.items() if samples}
+
+    def get_free_slots(self) -> int:
+        """The total free slots across every pool, as of the latest sample."""
+        return sum(capacity.free_slots for capacity in self.get_latest().values())
+
+    def get_average_utilisation(self, agent_pool_id: str | None = None) -> float:
+        samples = self._get_samples(agent_pool_id)
+        return sum(capacity.utilisation for capacity in samples) / len(samples) if samples else 0.0
+
+    def get_peak_queue_depth(self, agent_pool_id: str | None = None) -> int:
+        return max((capacity.queued_jobs for capacity in self._get_samples(agent_pool_id)), default=0)
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+import json
+import sqlite3
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from typing import TYPE_CHECKING, Any, Literal
 
 from ado_wrapper.errors import InvalidPermissionsError
@@ -58,41 +62,183 @@ class AuditLog:
             data["actorDisplayName"], data["data"],  # fmt: skip
         )
 
+    def to_json(self) -> dict[str, Any]:
+        return {field_obj.name: getattr(self, field_obj.name) for field_obj in fields(self)} | {"created_on": to_iso(self.created_on)}
+
     @classmethod
-    def get_all(cls, ado_client: AdoClient, start_time: datetime | None = None, end_time: datetime = datetime.now()) -> list[AuditLog]:
-        """https://learn.microsoft.com/en-us/rest/api/azure/devops/audit/audit-log/query?view=azure-devops-rest-7.1&tabs=HTTP#auditlogqueryresult"""
+    def from_json(cls, data: dict[str, Any]) -> AuditLog:
+        return cls(**(data | {"created_on": datetime.fromisoformat(data["created_on"])}))
+
+    @classmethod
+    def iterate_pages(cls, ado_client: AdoClient, start_time: datetime | None = None, end_time: datetime | None = None,
+                      batch_size: int = 100000) -> Iterator[list[AuditLog]]:  # fmt: skip
+        """Yields each page of audit logs as it's downloaded, rather than waiting for (and holding) every page at once.
+        The audit service can only filter by time range, so any other filtering has to happen per page."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)  # Log timestamps are naive UTC
         if start_time is None:
-            start_time = datetime.now() - timedelta(days=1)
+            start_time = now - timedelta(days=1)
+        if end_time is None:
+            end_time = now
         assert start_time <= end_time, "Start time must be before end time!"
-        combined_entries = []
         has_more = True
         continuation_token = None
         while has_more:
             data = ado_client.session.get(
-                f"https://auditservice.dev.azure.com/{ado_client.ado_org}/_apis/audit/auditlog?batchSize=100000&startTime={to_iso(start_time)}&endTime={to_iso(end_time)}{f'&continuationToken={continuation_token}' if continuation_token else ''}&api-version=7.1-preview.1",
+                f"https://auditservice.dev.azure.com/{ado_client.ado_org}/_apis/audit/auditlog?batchSize={batch_size}&startTime={to_iso(start_time)}&endTime={to_iso(end_time)}{f'&continuationToken={continuation_token}' if continuation_token else ''}&api-version=7.1-preview.1",
             )
             if data.status_code == 403:
                 raise InvalidPermissionsError("You have insufficient perms to use this function, it requires 'View audit log'")
             json_data = data.json()
             has_more = json_data["hasMore"]
             continuation_token = json_data["continuationToken"]
-            combined_entries.extend(json_data["decoratedAuditLogEntries"])
-        return [cls.from_request_payload(x) for x in combined_entries]
+            yield [cls.from_request_payload(x) for x in json_data["decoratedAuditLogEntries"]]
+
+    @classmethod
+    def get_all(cls, ado_client: AdoClient, start_time: datetime | None = None, end_time: datetime | None = None) -> list[AuditLog]:
+        """https://learn.microsoft.com/en-us/rest/api/azure/devops/audit/audit-log/query?view=azure-devops-rest-7.1&tabs=HTTP#auditlogqueryresult"""
+        return [audit_log for page in cls.iterate_pages(ado_client, start_time, end_time) for audit_log in page]
 
     @classmethod
     def get_all_by_area(
-        cls, ado_client: AdoClient, area_type: AreaType, start_time: datetime | None = None, end_time: datetime = datetime.now()
+        cls, ado_client: AdoClient, area_type: AreaType, start_time: datetime | None = None, end_time: datetime | None = None
     ) -> list[AuditLog]:
-        return [x for x in cls.get_all(ado_client, start_time, end_time) if x.area == area_type]
+        return [x for page in cls.iterate_pages(ado_client, start_time, end_time) for x in page if x.area == area_type]
 
     @classmethod
     def get_all_by_category(
-        cls, ado_client: AdoClient, category: CategoryType, start_time: datetime | None = None, end_time: datetime = datetime.now()
+        cls, ado_client: AdoClient, category: CategoryType, start_time: datetime | None = None, end_time: datetime | None = None
     ) -> list[AuditLog]:
-        return [x for x in cls.get_all(ado_client, start_time, end_time) if x.category == category]
+        return [x for page in cls.iterate_pages(ado_client, start_time, end_time) for x in page if x.category == category]
 
     @classmethod
     def get_all_by_scope_type(
-        cls, ado_client: AdoClient, scope_type: ScopeTypeType, start_time: datetime | None = None, end_time: datetime = datetime.now()
+        cls, ado_client: AdoClient, scope_type: ScopeTypeType, start_time: datetime | None = None, end_time: datetime | None = None
     ) -> list[AuditLog]:
-        return [x for x in cls.get_all(ado_client, start_time, end_time) if x.scope_type == scope_type]
+        return [x for page in cls.iterate_pages(ado_client, start_time, end_time) for x in page if x.scope_type == scope_type]
+
+    # =============== Incremental syncing ===================== #
+
+    @classmethod
+    def sync(cls, ado_client: AdoClient, watermark_file_name: str, sink: AuditLogSink, initial_start_time: datetime | None = None,
+             areas: list[AreaType] | None = None, batch_size: int = 1000) -> int:  # fmt: skip
+        """Fetches only the audit logs created since the last sync (tracked in `watermark_file_name`), and passes each page to `sink`
+        as it arrives, e.g. an `AuditLogStore`, or `functools.partial(AuditLog.append_to_jsonl, file_name)`.
+        The first sync starts from `initial_start_time` (defaulting to 24 hours ago).
+        `areas` filters which logs reach the sink, but filtered logs still move the watermark forward.
+        Returns the number of logs passed to the sink."""
+        watermark = AuditLogWatermark.load(watermark_file_name)
+        end_time = datetime.now(timezone.utc).replace(tzinfo=None)  # Log timestamps are naive UTC, so the watermark is too
+        start_time = watermark.last_timestamp or initial_start_time or (end_time - timedelta(days=1))
+        newest_timestamp, newest_ids = watermark.last_timestamp, set(watermark.last_ids)
+        total_synced = 0
+        for page in cls.iterate_pages(ado_client, min(start_time, end_time), end_time, batch_size):
+            # The start time is inclusive, so skip anything we already synced at the watermark's timestamp
+            new_logs = [x for x in page if x.created_on != watermark.last_timestamp or x.audit_log_id not in watermark.last_ids]
+            for audit_log in new_logs:
+                if newest_timestamp is None or audit_log.created_on > newest_timestamp:
+                    newest_timestamp, newest_ids = audit_log.created_on, set()
+                if audit_log.created_on == newest_timestamp:
+                    newest_ids.add(audit_log.audit_log_id)
+            filtered_logs = [x for x in new_logs if areas is None or x.area in areas]
+            if filtered_logs:
+                sink(filtered_logs)
+                total_synced += len(filtered_logs)
+        # Only saved once every page is in the sink, pages aren't guaranteed to arrive oldest first
+        AuditLogWatermark(newest_timestamp, sorted(newest_ids)).save(watermark_file_name)
+        return total_synced
+
+    @staticmethod
+    def append_to_jsonl(file_name: str, audit_logs: list[AuditLog]) -> None:
+        """Appends each log to `file_name` as one line of JSON, can be used as a sink for `AuditLog.sync`."""
+        with open(file_name, "a", encoding="utf-8") as file:
+            file.writelines(json.dumps(audit_log.to_json()) + "\n" for audit_log in audit_logs)
+
+    @classmethod
+    def read_jsonl(cls, file_name: str) -> Iterator[AuditLog]:
+        with open(file_name, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield cls.from_json(json.loads(line))
+
+
+AuditLogSink = Callable[[list[AuditLog]], None]
+
+
+@dataclass
+class AuditLogWatermark:
+    """Where the previous `AuditLog.sync` got up to. Continuation tokens only last for a single query, so instead we store the newest
+    timestamp synced, and the ids of the logs at that timestamp (timestamps are only to the second)."""
+
+    last_timestamp: datetime | None = None
+    last_ids: list[str] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, file_name: str) -> AuditLogWatermark:
+        if not Path(file_name).exists():
+            return cls()
+        with open(file_name, encoding="utf-8") as file:
+            data = json.load(file)
+        return cls(datetime.fromisoformat(data["last_timestamp"]) if data["last_timestamp"] else None, data["last_ids"])
+
+    def save(self, file_name: str) -> None:
+        with open(file_name, "w", encoding="utf-8") as file:
+            json.dump({"last_timestamp": to_iso(self.last_timestamp), "last_ids": self.last_ids}, file, indent=4)
+
+
+class AuditLogStore:
+    """A local SQLite store of audit logs, so logs can be downloaded once and queried offline as many times as needed.
+    Instances can be passed straight into `AuditLog.sync` as the sink. Uses an in-memory database unless a file name is given."""
+
+    INDEXED_COLUMNS = ["created_on", "area", "category", "actor_UPN", "action_id"]
+
+    def __init__(self, file_name: str = ":memory:") -> None:
+        self.connection = sqlite3.connect(file_name)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS audit_logs (audit_log_id TEXT PRIMARY KEY, created_on TEXT NOT NULL, area TEXT, category TEXT, actor_UPN TEXT, action_id TEXT, data TEXT NOT NULL)"
+        )
+        for column in self.INDEXED_COLUMNS:
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS audit_logs_{column} ON audit_logs ({column})")
+        self.connection.commit()
+
+    def __call__(self, audit_logs: list[AuditLog]) -> None:
+        self.add(audit_logs)
+
+    def __enter__(self) -> AuditLogStore:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def add(self, audit_logs: list[AuditLog]) -> None:
+        """Adds logs to the store, logs which are already stored are ignored."""
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO audit_logs VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(x.audit_log_id, to_iso(x.created_on), x.area, x.category, x.actor_UPN, x.action_id, json.dumps(x.to_json())) for x in audit_logs],  # fmt: skip
+        )
+        self.connection.commit()
+
+    def query(self, actor_upn: str | None = None, area: AreaType | None = None, category: CategoryType | None = None,
+              action_id: str | None = None, start_time: datetime | None = None, end_time: datetime | None = None,
+              limit: int | None = None) -> list[AuditLog]:  # fmt: skip
+        """Returns the stored logs matching every filter passed in, newest first. `actor_upn` is case insensitive."""
+        conditions: list[str] = []
+        parameters: list[Any] = []
+        for condition, value in [("actor_UPN = ? COLLATE NOCASE", actor_upn), ("area = ?", area), ("category = ?", category),
+                                 ("action_id = ?", action_id), ("created_on >= ?", to_iso(start_time)), ("created_on <= ?", to_iso(end_time))]:  # fmt: skip
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        where_clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        limit_clause = f" LIMIT {int(limit)}" if limit is not None else ""
+        rows = self.connection.execute(f"SELECT data FROM audit_logs{where_clause} ORDER BY created_on DESC{limit_clause}", parameters)
+        return [AuditLog.from_json(json.loads(row[0])) for row in rows]
+
+    def get_latest_timestamp(self) -> datetime | None:
+        latest = self.connection.execute("SELECT MAX(created_on) FROM audit_logs").fetchone()[0]
+        return datetime.fromisoformat(latest) if latest is not None else None
+
+    def __len__(self) -> int:
+        return int(self.connection.execute("SELECT COUNT(*) FROM audit_logs").fetchone()[0])
+
+    def close(self) -> None:
+        self.connection.close()
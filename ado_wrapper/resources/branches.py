@@ -79,6 +79,18 @@ class Branch(StateManagedResource):
                 return branch
         raise ValueError(f"Branch {branch_name} not found")
 
+    @staticmethod
+    def get_head_commit_id(ado_client: AdoClient, repo_name_or_id: str, branch_name: str) -> str | None:
+        """Returns the id of the latest commit on a branch (or None if the branch doesn't exist), with one small refs request."""
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/git/repositories/{repo_name_or_id}/refs?filter=heads/{branch_name}&api-version=7.1",
+        )
+        if request.status_code != 200:
+            raise ValueError(f"Error getting the head of branch {branch_name}: {request.text}")
+        # The filter is a prefix match, so `main` would also return `main-2`
+        matching_refs = [x for x in request.json()["value"] if x["name"] == f"refs/heads/{branch_name}"]
+        return matching_refs[0]["objectId"] if matching_refs else None
+
     @classmethod
     def get_main_branch(cls, ado_client: AdoClient, repo_id: str) -> Branch:
         return [x for x in cls.get_all_by_repo(ado_client, repo_id) if x.name in ("main", "master", "trunk")][0]
@@ -1,13 +1,24 @@
+import fnmatch
 import time
+import zipfile
+from collections.abc import Callable, Iterator
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import TYPE_CHECKING, Any, Literal
+from functools import partial
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Literal
+from urllib.parse import quote
+
+import requests
 
 from ado_wrapper.resources.environment import Environment, PipelineAuthorisation
 from ado_wrapper.resources.repo import BuildRepository
 from ado_wrapper.resources.users import Member
 from ado_wrapper.state_managed_abc import StateManagedResource
-from ado_wrapper.utils import from_ado_date_string
+from ado_wrapper.errors import DeletionFailed
+from ado_wrapper.utils import (
+    DEFAULT_MAX_WORKERS, ProgressCallback, from_ado_date_string, iterate_continuation_pages, run_concurrently, stream_response_to_file,  # fmt: skip
+)
 
 if TYPE_CHECKING:
     from ado_wrapper.client import AdoClient
@@ -15,12 +26,19 @@ if TYPE_CHECKING:
 BuildDefinitionEditableAttribute = Literal["name", "description"]
 BuildStatus = Literal["notStarted", "inProgress", "completed", "cancelling", "postponed", "notSet", "none"]
 QueuePriority = Literal["low", "belowNormal", "normal", "aboveNormal", "high"]
+BuildResult = Literal["succeeded", "partiallySucceeded", "failed", "canceled", "none"]
+LogLineCallback = Callable[[int, str], None]  # (log_id, line)
+ARTIFACT_CHUNK_SIZE = 8 * 1024 * 1024  # Artifacts are often GBs, so bigger chunks than usual
+MAX_QUEUED_BUILDS = 100  # How far get_latest_by_definitions looks past queued builds for one which has started
+BuildQueryOrder = Literal["finishTimeAscending", "finishTimeDescending", "queueTimeAscending", "queueTimeDescending",
+                          "startTimeAscending", "startTimeDescending"]  # fmt: skip
 
 # ========================================================================================================
 
 
 def get_build_definition(
-    name: str, repo_id: str, repo_name: str, path_to_pipeline: str, description: str, project: str, agent_pool_id: str, branch_name: str = "main"  # fmt: skip
+    name: str, repo_id: str, repo_name: str, path_to_pipeline: str, description: str, project: str, agent_pool_id: str, branch_name: str = "main",
+    variables: dict[str, str] | None = None, variable_group_ids: list[str] | None = None,  # fmt: skip
 ) -> dict[str, Any]:
     return {
         "name": f"{name}",
@@ -38,6 +56,8 @@ def get_build_definition(
         },
         "type": "build",
         "queue": {"id": agent_pool_id},
+        "variables": {key: {"value": value} for key, value in (variables or {}).items()},
+        "variableGroups": [{"id": int(variable_group_id)} for variable_group_id in variable_group_ids or []],
     }
 
 
@@ -146,19 +166,78 @@ class Build(StateManagedResource):
             if not ado_client.suppress_warnings:
                 print(f"Could not delete leases, {leases_request.status_code}")
             return
-        leases = leases_request.json()["value"]
-        for lease in leases:
+        Build.delete_leases(ado_client, [lease["leaseId"] for lease in leases_request.json()["value"]])
+
+    @staticmethod
+    def delete_leases(ado_client: "AdoClient", lease_ids: list[int]) -> None:
+        """Deletes retention leases, 100 per request (using the multi-id `ids=` parameter)."""
+        for i in range(0, len(lease_ids), 100):
             lease_response = ado_client.session.delete(
-                f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/build/retention/leases?ids={lease['leaseId']}&api-version=6.1",
+                f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/build/retention/leases?ids={','.join(str(x) for x in lease_ids[i:i+100])}&api-version=7.1",
             )
-            assert lease_response.status_code <= 204
+            if lease_response.status_code > 204:
+                raise DeletionFailed(f"[ADO_WRAPPER] Error deleting leases {lease_ids[i:i+100]}: {lease_response.text}")
+
+    @staticmethod
+    def get_all_lease_ids_by_definition(ado_client: "AdoClient", definition_id: str) -> list[int]:
+        """Returns the id of every retention lease on any build of the definition, in one request."""
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/build/retention/leases?definitionId={definition_id}&api-version=7.1",
+        )
+        if request.status_code != 200:
+            raise ValueError(f"Error getting the leases of definition {definition_id}: {request.text}")
+        return [lease["leaseId"] for lease in request.json()["value"]]
+
+    @classmethod
+    def delete_all_by_definition(cls, ado_client: "AdoClient", definition_id: str, max_workers: int = DEFAULT_MAX_WORKERS) -> None:
+        """Purges every build of a definition: lists and deletes all the leases in bulk, then deletes the builds concurrently.
+        Every build is attempted, then a DeletionFailed is raised listing any which failed."""
+        cls.delete_leases(ado_client, cls.get_all_lease_ids_by_definition(ado_client, definition_id))
+        build_ids = [build.build_id for build in cls.query(ado_client, definition_ids=[definition_id])]
+
+        def _delete_build(build_id: str) -> None:  # The leases are already gone, so this skips delete_by_id's per build lookup
+            super(Build, cls)._delete_by_id(
+                ado_client, f"/{ado_client.ado_project}/_apis/build/builds/{build_id}?api-version=7.1", build_id,
+            )  # fmt: skip
+
+        _, failures = run_concurrently(_delete_build, build_ids, max_workers=max_workers)
+        if failures:
+            failure_lines = "\n".join(f"{build_id}: {e}" for build_id, e in failures)
+            raise DeletionFailed(f"[ADO_WRAPPER] Failed to delete {len(failures)} of {len(build_ids)} builds:\n{failure_lines}")
 
     @classmethod
     def get_all_by_definition(cls, ado_client: "AdoClient", definition_id: str) -> "list[Build]":
-        return super()._get_all(
+        return list(cls.query(ado_client, definition_ids=[definition_id]))
+
+    @classmethod
+    def query(cls, ado_client: "AdoClient", definition_ids: list[str] | None = None, status: BuildStatus | None = None,
+              result: BuildResult | None = None, branch_name: str | None = None, min_time: datetime | None = None,
+              max_time: datetime | None = None, requested_for: str | None = None, tags: list[str] | None = None,
+              query_order: BuildQueryOrder | None = None, max_builds_per_definition: int | None = None,
+              top: int | None = None, page_size: int = 1000) -> "Iterator[Build]":  # fmt: skip
+        """Yields builds matching every filter passed, which are applied server side. Pages are fetched lazily (following
+        continuation tokens) as you iterate, so breaking out early, or passing `top`, stops any more being downloaded.
+        min_time and max_time filter on finish time (unless query_order is by queue/start time), requested_for takes a user id/email.
+        https://learn.microsoft.com/en-us/rest/api/azure/devops/build/builds/list?view=azure-devops-rest-7.1"""
+        filters = {
+            "definitions": ",".join(definition_ids) if definition_ids else None, "statusFilter": status, "resultFilter": result,
+            "branchName": (branch_name if branch_name.startswith("refs/") else f"refs/heads/{branch_name}") if branch_name else None,
+            "minTime": min_time.isoformat() if min_time is not None else None, "maxTime": max_time.isoformat() if max_time is not None else None,
+            "requestedFor": requested_for, "tagFilters": ",".join(tags) if tags else None, "queryOrder": query_order,
+            "maxBuildsPerDefinition": str(max_builds_per_definition) if max_builds_per_definition is not None else None,
+            "$top": str(min(page_size, top) if top is not None else page_size),
+        }  # fmt: skip
+        query_string = "".join(f"{key}={quote(value, safe=',/')}&" for key, value in filters.items() if value is not None)
+        yielded = 0
+        for page in iterate_continuation_pages(
             ado_client,
-            f"/{ado_client.ado_project}/_apis/build/builds?definitions={definition_id}&api-version=7.1",
-        )  # type: ignore[return-value]
+            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/build/builds?{query_string}api-version=7.1",
+        ):
+            for build_data in page:
+                yield cls.from_request_payload(build_data)
+                yielded += 1
+                if top is not None and yielded >= top:
+                    return  # Before the next page is requested
 
     @classmethod
     def allow_on_environment(cls, ado_client: "AdoClient", definition_id: str, environment_id: str) -> PipelineAuthorisation:
@@ -167,9 +246,173 @@ class Build(StateManagedResource):
 
     @classmethod
     def get_latest(cls, ado_client: "AdoClient", definition_id: str) -> "Build | None":
-        all_builds = cls.get_all_by_definition(ado_client, definition_id)
-        builds_with_start = [x for x in all_builds if x.start_time is not None]
-        return max(builds_with_start, key=lambda build: build.start_time) if builds_with_start else None  # type: ignore[return-value, arg-type]
+        """Returns the most recently started build of the definition, ordered server side so only a handful of builds are fetched."""
+        return cls.get_latest_by_definitions(ado_client, [definition_id])[definition_id]
+
+    @classmethod
+    def get_latest_by_definitions(cls, ado_client: "AdoClient", definition_ids: list[str]) -> "dict[str, Build | None]":
+        """Returns a mapping of definition_id -> most recently started build (or None), using one request per 100 definitions.
+        Builds which haven't started yet have no start time, so a few builds per definition are fetched to skip past them. Only if all
+        of those are still queued is that definition checked on its own, looking at up to `MAX_QUEUED_BUILDS` more of its builds."""
+        latest_builds: dict[str, Build | None] = {definition_id: None for definition_id in definition_ids}
+        build_counts = dict.fromkeys(definition_ids, 0)
+        for i in range(0, len(definition_ids), 100):  # Stops the URL getting too long
+            for build in cls.query(ado_client, definition_ids[i : i + 100], query_order="startTimeDescending", max_builds_per_definition=5):
+                if build.definition is None:
+                    continue
+                build_counts[build.definition.build_definition_id] = build_counts.get(build.definition.build_definition_id, 0) + 1
+                if build.start_time is None:
+                    continue
+                existing_build = latest_builds.get(build.definition.build_definition_id)
+                if existing_build is None or build.start_time > existing_build.start_time:  # type: ignore[operator]
+                    latest_builds[build.definition.build_definition_id] = build
+        # Definitions with fewer than 5 builds (e.g. never built) have already had every build checked
+        for definition_id in [definition_id for definition_id, build in latest_builds.items() if build is None and build_counts[definition_id] >= 5]:  # fmt: skip
+            for build in cls.query(ado_client, [definition_id], query_order="startTimeDescending", top=MAX_QUEUED_BUILDS, page_size=25):
+                if build.start_time is not None:
+                    latest_builds[definition_id] = build
+                    break
+        return latest_builds
+
+    # ================== Artifacts ================== #
+    def get_artifacts(self, ado_client: "AdoClient") -> "list[BuildArtifact]":
+        return self.get_artifacts_by_build_id(ado_client, self.build_id)
+
+    @staticmethod
+    def get_artifacts_by_build_id(ado_client: "AdoClient", build_id: str) -> "list[BuildArtifact]":
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/build/builds/{build_id}/artifacts?api-version=7.1",
+        )
+        if request.status_code != 200:
+            raise ValueError(f"Error getting the artifacts of build {build_id}: {request.text}")
+        return [BuildArtifact.from_request_payload(x) for x in request.json()["value"]]
+
+    @staticmethod
+    def download_artifact(ado_client: "AdoClient", artifact: "BuildArtifact", file_path: str, extract_to: str | None = None,
+                          file_patterns: list[str] | None = None, progress_callback: ProgressCallback | None = None) -> Path:  # fmt: skip
+        """Streams the artifact (as a zip) to `file_path`, via a `.part` file. If a previous download was interrupted, the `.part`
+        file is resumed with a Range request rather than starting again. If `extract_to` is passed, the zip is extracted there,
+        optionally only the files matching any of `file_patterns` (globs, e.g. "*/coverage/*.xml"). Returns the zip's path."""
+        zip_path, part_path = Path(file_path), Path(f"{file_path}.part")
+        zip_path.parent.mkdir(parents=True, exist_ok=True)
+        already_downloaded = part_path.stat().st_size if part_path.exists() else 0
+        headers = {"Range": f"bytes={already_downloaded}-"} if already_downloaded else {}
+        request: requests.Response | None  # None once the .part file is known to be complete
+        request = ado_client.session.get(artifact.download_url, headers=headers, stream=True)
+        if request.status_code == 416:  # The .part file is already complete
+            request.close()
+            request = None
+        elif request.status_code not in (200, 206):
+            raise ValueError(f"Error downloading artifact {artifact.name}: {request.status_code}")
+        if request is not None:
+            offset = already_downloaded if request.status_code == 206 else 0  # A 200 means the server ignored the Range, so start again
+            offset_callback = None if progress_callback is None else (
+                lambda downloaded, total: progress_callback(offset + downloaded, offset + total if total is not None else None)
+            )  # fmt: skip
+            with request, open(part_path, "ab" if offset else "wb") as part_file:
+                stream_response_to_file(request, part_file, ARTIFACT_CHUNK_SIZE, offset_callback)
+        part_path.replace(zip_path)
+        if extract_to is not None:
+            with zipfile.ZipFile(zip_path) as zip_file:
+                members = [
+                    name for name in zip_file.namelist()
+                    if file_patterns is None or any(fnmatch.fnmatch(name, pattern) for pattern in file_patterns)
+                ]  # fmt: skip
+                zip_file.extractall(extract_to, members)
+        return zip_path
+
+    @classmethod
+    def download_artifacts_many(cls, ado_client: "AdoClient", build_ids: list[str], directory: str, artifact_names: list[str] | None = None,
+                                extract: bool = False, file_patterns: list[str] | None = None,
+                                max_workers: int = DEFAULT_MAX_WORKERS) -> dict[tuple[str, str], Path]:  # fmt: skip
+        """Downloads the artifacts of many builds concurrently, to `directory/<build_id>/<artifact_name>.zip`. If `extract` is set,
+        they're also extracted into `directory/<build_id>/` (the zips contain an <artifact_name> folder). Re-running after a failure
+        resumes any partial downloads.
+        Returns a mapping of (build_id, artifact_name) -> zip path, and raises the first failure once every download has been tried."""
+        build_artifacts, failures = run_concurrently(partial(cls.get_artifacts_by_build_id, ado_client), build_ids, max_workers=max_workers)
+        if failures:
+            raise failures[0][1]
+        downloads = [
+            (build_id, artifact) for build_id, artifacts in build_artifacts for artifact in artifacts
+            if artifact_names is None or artifact.name in artifact_names
+        ]  # fmt: skip
+
+        def _download(download: tuple[str, BuildArtifact]) -> Path:
+            build_id, artifact = download
+            build_directory = Path(directory, build_id)
+            extract_to = str(build_directory) if extract else None
+            return cls.download_artifact(ado_client, artifact, str(build_directory / f"{artifact.name}.zip"), extract_to, file_patterns)
+
+        results, download_failures = run_concurrently(_download, downloads, max_workers=max_workers)
+        if download_failures:
+            raise download_failures[0][1]
+        return {(build_id, artifact.name): path for (build_id, artifact), path in results}
+
+    def download_artifacts(self, ado_client: "AdoClient", directory: str, artifact_names: list[str] | None = None, extract: bool = False,
+                           file_patterns: list[str] | None = None, max_workers: int = DEFAULT_MAX_WORKERS) -> dict[str, Path]:  # fmt: skip
+        """Downloads (some or all of) this build's artifacts concurrently, see `download_artifacts_many`."""
+        paths = self.download_artifacts_many(ado_client, [self.build_id], directory, artifact_names, extract, file_patterns, max_workers)
+        return {artifact_name: path for (_, artifact_name), path in paths.items()}
+
+    # ================== Logs & Timeline ================== #
+    def get_logs(self, ado_client: "AdoClient") -> "list[BuildLog]":
+        """Returns the metadata (id, line count) for each of the build's logs, use `iterate_log_lines` to read one."""
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/build/builds/{self.build_id}/logs?api-version=7.1",
+        )
+        if request.status_code != 200:
+            raise ValueError(f"Error getting the logs of build {self.build_id}: {request.text}")
+        return [BuildLog.from_request_payload(x) for x in request.json()["value"]]
+
+    def get_timeline(self, ado_client: "AdoClient") -> "list[BuildTimelineRecord]":
+        """Returns the stages, jobs and tasks of the build, each with its state, result and log id."""
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/build/builds/{self.build_id}/timeline?api-version=7.1",
+        )
+        if request.status_code == 204 or not request.text:  # Builds which haven't started have no timeline
+            return []
+        if request.status_code != 200:
+            raise ValueError(f"Error getting the timeline of build {self.build_id}: {request.text}")
+        return sorted([BuildTimelineRecord.from_request_payload(x) for x in request.json()["records"]], key=lambda x: x.order or 0)
+
+    def iterate_log_lines(self, ado_client: "AdoClient", log_id: int, start_line: int | None = None,
+                          end_line: int | None = None) -> Iterator[str]:  # fmt: skip
+        """Streams one log's lines (1 indexed, start and end inclusive), without holding the whole log in memory."""
+        line_range = f"startLine={start_line}&" if start_line is not None else ""
+        line_range += f"endLine={end_line}&" if end_line is not None else ""
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/build/builds/{self.build_id}/logs/{log_id}?{line_range}api-version=7.1",
+            stream=True,
+        )
+        if request.status_code != 200:
+            raise ValueError(f"Error getting log {log_id} of build {self.build_id}: {request.text}")
+        request.encoding = "utf-8"  # Logs are sent without a charset, which would make iter_lines yield bytes
+        with request:
+            yield from request.iter_lines(decode_unicode=True)
+
+    def tail_logs(self, ado_client: "AdoClient", callback: LogLineCallback | None = None, file: IO[str] | None = None,
+                  poll_interval_seconds: int = 5, max_timeout_seconds: int | None = None) -> "Build":  # fmt: skip
+        """Follows every log of the build until it completes, passing each new line to `callback` and/or writing it to `file`.
+        Each poll only requests the lines added since the previous one. Returns the completed build.
+        WARNING: This is a blocking operation, it will not return until the build is completed or the timeout is reached."""
+        lines_read: dict[int, int] = {}
+        start_time = datetime.now()
+        while True:
+            build = Build.get_by_id(ado_client, self.build_id)  # Checked before reading, so the final read gets everything
+            for log in self.get_logs(ado_client):
+                if log.line_count <= lines_read.get(log.log_id, 0):
+                    continue
+                for line in self.iterate_log_lines(ado_client, log.log_id, lines_read.get(log.log_id, 0) + 1, log.line_count):
+                    if callback is not None:
+                        callback(log.log_id, line)
+                    if file is not None:
+                        file.write(line + "\n")
+                lines_read[log.log_id] = log.line_count
+            if build.status == "completed":
+                return build
+            if max_timeout_seconds is not None and (datetime.now() - start_time).seconds > max_timeout_seconds:
+                raise TimeoutError(f"The build did not complete within {max_timeout_seconds} seconds ({max_timeout_seconds//60} minutes)")
+            time.sleep(poll_interval_seconds)
 
 
 # ========================================================================================================
@@ -215,10 +458,12 @@ class BuildDefinition(StateManagedResource):
     @classmethod
     def create(
         cls, ado_client: "AdoClient", name: str, repo_id: str, repo_name: str, path_to_pipeline: str,
-        description: str, agent_pool_id: str, branch_name: str = "main",  # fmt: skip
+        description: str, agent_pool_id: str, branch_name: str = "main", variables: dict[str, str] | None = None,
+        variable_group_ids: list[str] | None = None,  # fmt: skip
     ) -> "BuildDefinition":
+        """`variables` are definition level variables, and `variable_group_ids` the variable groups the definition can use."""
         payload = get_build_definition(name, repo_id, repo_name, path_to_pipeline, description,
-                                       ado_client.ado_project, agent_pool_id, branch_name)  # fmt: skip
+                                       ado_client.ado_project, agent_pool_id, branch_name, variables, variable_group_ids)  # fmt: skip
         return super()._create(
             ado_client,
             f"/{ado_client.ado_project}/_apis/build/definitions?api-version=7.0",
@@ -243,8 +488,7 @@ class BuildDefinition(StateManagedResource):
 
     @classmethod
     def delete_by_id(cls, ado_client: "AdoClient", resource_id: str) -> None:
-        for build in Build.get_all_by_definition(ado_client, resource_id):
-            build.delete(ado_client)  # Can't remove from state because retention policies etc.
+        Build.delete_all_by_definition(ado_client, resource_id)  # Can't remove from state because retention policies etc.
         return super()._delete_by_id(
             ado_client,
             f"/{ado_client.ado_project}/_apis/build/definitions/{resource_id}?forceDelete=true&api-version=7.1",
@@ -271,8 +515,7 @@ class BuildDefinition(StateManagedResource):
         return Build.get_all_by_definition(ado_client, self.build_definition_id)
 
     def get_latest_build_by_definition(self, ado_client: "AdoClient") -> "Build | None":
-        builds = self.get_all_builds_by_definition(ado_client)
-        return max(builds, key=lambda build: build.start_time if build.start_time else datetime(2000, 1, 1)) if builds else None
+        return Build.get_latest(ado_client, self.build_definition_id)
 
     @classmethod
     def get_all_by_repo_id(cls, ado_client: "AdoClient", repo_id: str) -> "list[BuildDefinition]":
@@ -283,3 +526,56 @@ class BuildDefinition(StateManagedResource):
 
 
 # ========================================================================================================
+
+
+@dataclass
+class BuildLog:
+    """https://learn.microsoft.com/en-us/rest/api/azure/devops/build/builds/get-build-logs?view=azure-devops-rest-7.1"""
+
+    log_id: int
+    line_count: int
+    created_on: datetime | None = field(repr=False)
+    last_changed_on: datetime | None = field(repr=False)
+
+    @classmethod
+    def from_request_payload(cls, data: dict[str, Any]) -> "BuildLog":
+        return cls(data["id"], data.get("lineCount", 0), from_ado_date_string(data.get("createdOn")), from_ado_date_string(data.get("lastChangedOn")))  # fmt: skip
+
+
+@dataclass
+class BuildTimelineRecord:
+    """One stage, job, or task in a build's timeline.
+    https://learn.microsoft.com/en-us/rest/api/azure/devops/build/timeline/get?view=azure-devops-rest-7.1"""
+
+    record_id: str
+    parent_id: str | None = field(repr=False)
+    record_type: str  # Stage, Phase, Job, Task, Checkpoint
+    name: str
+    state: str | None  # pending, inProgress, completed
+    result: str | None  # succeeded, succeededWithIssues, failed, canceled, skipped, abandoned
+    start_time: datetime | None = field(repr=False)
+    finish_time: datetime | None = field(repr=False)
+    log_id: int | None = field(repr=False)
+    error_count: int = field(default=0, repr=False)
+    warning_count: int = field(default=0, repr=False)
+    order: int | None = field(default=None, repr=False)
+
+    @classmethod
+    def from_request_payload(cls, data: dict[str, Any]) -> "BuildTimelineRecord":
+        return cls(data["id"], data.get("parentId"), data["type"], data["name"], data.get("state"), data.get("result"),
+                   from_ado_date_string(data.get("startTime")), from_ado_date_string(data.get("finishTime")),
+                   (data.get("log") or {}).get("id"), data.get("errorCount") or 0, data.get("warningCount") or 0, data.get("order"))  # fmt: skip
+
+
+@dataclass
+class BuildArtifact:
+    """https://learn.microsoft.com/en-us/rest/api/azure/devops/build/artifacts/list?view=azure-devops-rest-7.1"""
+
+    artifact_id: str
+    name: str
+    resource_type: str  # E.g. Container, PipelineArtifact
+    download_url: str = field(repr=False)
+
+    @classmethod
+    def from_request_payload(cls, data: dict[str, Any]) -> "BuildArtifact":
+        return cls(str(data["id"]), data["name"], data["resource"]["type"], data["resource"]["downloadUrl"])
@@ -1,19 +1,24 @@
+import base64
+import json
+from collections.abc import Iterator
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import TYPE_CHECKING, Any, Literal
+from urllib.parse import quote
 
+from ado_wrapper.resources.branches import Branch
 from ado_wrapper.resources.users import Member
 from ado_wrapper.state_managed_abc import StateManagedResource
 from ado_wrapper.errors import InvalidPermissionsError
 from ado_wrapper.utils import from_ado_date_string
 
-# from ado_wrapper.resources.branches import Branch
-
 if TYPE_CHECKING:
     from ado_wrapper.client import AdoClient
 
 ChangeType = Literal["edit", "add", "delete"]
+PushChangeType = Literal["edit", "add", "delete", "rename"]
 FIRST_COMMIT_ID = "0000000000000000000000000000000000000000"  # I don't know why this works, but it does, please leave it.
+MAX_PUSH_PAYLOAD_BYTES = 20 * 1024 * 1024  # ADO rejects pushes much over ~25MB, so leave some headroom
 
 
 def get_commit_body_template(old_object_id: str | None, updates: dict[str, str], branch_name: str, change_type: ChangeType, commit_message: str) -> dict[str, str | dict | list]:  # type: ignore[type-arg]
@@ -88,20 +93,10 @@ class Commit(StateManagedResource):
         #
         if not updates:
             raise ValueError("No updates provided! It's not possible to create a commit without updates.")
-        latest_commit = cls.get_latest_by_repo(ado_client, repo_id, from_branch_name)
-        latest_commit_id = None if latest_commit is None else latest_commit.commit_id
-        data = get_commit_body_template(latest_commit_id, updates, to_branch_name, change_type, commit_message)
-        request = ado_client.session.post(
-            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/git/repositories/{repo_id}/pushes?api-version=7.1",
-            json=data,
-        )
-        if request.status_code == 400:
-            raise ValueError("The commit was not created successfully, the file(s) you're trying to add might already exist there.")
-        if request.status_code == 403:
-            raise InvalidPermissionsError("You do not have permission to create a commit in this repo (possibly due to main branch protections)")  # fmt: skip
-        if not request.json().get("commits"):
-            raise ValueError("The commit was not created successfully.\nError:", request.json())
-        return cls.from_request_payload(request.json()["commits"][-1])
+        push = PushBuilder(repo_id, to_branch_name)
+        for path, new_content_body in updates.items():
+            push.add_change(change_type, path, new_content_body)
+        return push.commit(commit_message).push(ado_client, from_branch_name)[-1]
 
     @staticmethod
     def delete_by_id(ado_client: "AdoClient", commit_id: str) -> None:
@@ -112,18 +107,41 @@ class Commit(StateManagedResource):
     # =============== Start of additional methods included with class ===================== #
 
     @classmethod
-    def get_latest_by_repo(cls, ado_client: "AdoClient", repo_id: str, branch_name: str | None = None) -> "Commit":
-        return max(cls.get_all_by_repo(ado_client, repo_id, branch_name), key=lambda commit: commit.date)
+    def get_latest_by_repo(cls, ado_client: "AdoClient", repo_id: str, branch_name: str | None = None) -> "Commit | None":
+        """Returns the newest commit (on the branch, if passed), fetching only that one commit."""
+        return next(cls.iterate_by_repo(ado_client, repo_id, branch_name, top=1), None)
 
     @classmethod
-    def get_all_by_repo(cls, ado_client: "AdoClient", repo_id: str, branch_name: str | None = None) -> "list[Commit]":
-        """Returns a list of all commits in the given repository."""
-        extra_query = (f"searchCriteria.itemVersion.version={branch_name}&searchCriteria.itemVersion.versionType={'branch'}&"
-                       if branch_name is not None else "")  # fmt: skip
-        return super()._get_all(
-            ado_client,
-            f"/{ado_client.ado_project}/_apis/git/repositories/{repo_id}/commits?{extra_query}api-version=7.1",
-        )  # type: ignore[return-value]
+    def get_all_by_repo(cls, ado_client: "AdoClient", repo_id: str, branch_name: str | None = None, from_date: datetime | None = None,
+                        to_date: datetime | None = None, author: str | None = None, item_path: str | None = None,
+                        top: int | None = None) -> "list[Commit]":  # fmt: skip
+        """Returns a list of all commits in the given repository, newest first, optionally filtered (see `iterate_by_repo`)."""
+        return list(cls.iterate_by_repo(ado_client, repo_id, branch_name, from_date, to_date, author, item_path, top))
+
+    @classmethod
+    def iterate_by_repo(cls, ado_client: "AdoClient", repo_id: str, branch_name: str | None = None, from_date: datetime | None = None,
+                        to_date: datetime | None = None, author: str | None = None, item_path: str | None = None,
+                        top: int | None = None, page_size: int = 1000) -> "Iterator[Commit]":  # fmt: skip
+        """Yields commits newest first, with the filters applied server side (author matches names or emails, and item_path
+        only returns commits which touched that file/folder). Fetches `page_size` commits at a time, stopping after `top` commits.
+        https://learn.microsoft.com/en-us/rest/api/azure/devops/git/commits/get-commits?view=azure-devops-rest-7.1"""
+        search_criteria = {
+            "itemVersion.version": branch_name, "itemVersion.versionType": "branch" if branch_name is not None else None,
+            "fromDate": from_date.isoformat() if from_date is not None else None, "toDate": to_date.isoformat() if to_date is not None else None,
+            "author": author, "itemPath": item_path,
+        }  # fmt: skip
+        extra_query = "".join(f"searchCriteria.{key}={quote(value)}&" for key, value in search_criteria.items() if value is not None)
+        fetched = 0
+        while top is None or fetched < top:
+            page_top = page_size if top is None else min(page_size, top - fetched)
+            page: list[Commit] = super()._get_all(
+                ado_client,
+                f"/{ado_client.ado_project}/_apis/git/repositories/{repo_id}/commits?{extra_query}searchCriteria.$top={page_top}&searchCriteria.$skip={fetched}&api-version=7.1",
+            )  # type: ignore[assignment]
+            yield from page
+            fetched += len(page)
+            if len(page) < page_top:
+                return
 
     @classmethod
     def add_initial_readme(cls, ado_client: "AdoClient", repo_id: str) -> "Commit":
@@ -140,3 +158,122 @@ class Commit(StateManagedResource):
             json=default_commit_body,
         )
         return cls.from_request_payload(request.json()["commits"][0])
+
+
+# ====================================================================
+
+
+@dataclass
+class PushBuilder:
+    """Accumulates file changes across one or more commits, then sends them all in a single `pushes` request, e.g.
+    PushBuilder(repo_id, "main").add("a.txt", "Hi").delete("b.txt").commit("First").rename("c.txt", "d.txt").commit("Second").push(ado_client)
+    If the payload would be too large, the commits are split over several pushes (and oversized commits split into parts),
+    each one building on the last. If one of those pushes fails, the commits which made it are kept in `pushed_commits` (and
+    removed from `commits`), so calling `push` again carries on from there. Content can be a str, or bytes for binary files
+    (which are sent base64 encoded).
+    https://learn.microsoft.com/en-us/rest/api/azure/devops/git/pushes/create?view=azure-devops-rest-7.1"""
+
+    repo_id: str
+    branch_name: str
+    max_payload_bytes: int = MAX_PUSH_PAYLOAD_BYTES
+    commits: list[tuple[str, list[dict[str, Any]]]] = field(default_factory=list, repr=False)  # (message, changes)
+    pending_changes: list[dict[str, Any]] = field(default_factory=list, repr=False)
+    pushed_commits: "list[Commit]" = field(default_factory=list, repr=False)  # Created by a push which then failed part way
+
+    def add_change(self, change_type: PushChangeType, path: str, content: str | bytes | None = None, source_path: str | None = None) -> "PushBuilder":  # fmt: skip
+        change: dict[str, Any] = {"changeType": change_type, "item": {"path": path}}
+        if source_path is not None:
+            change["sourceServerItem"] = source_path
+        if isinstance(content, bytes):
+            change["newContent"] = {"content": base64.b64encode(content).decode("ascii"), "contentType": "base64encoded"}
+        elif content is not None:
+            change["newContent"] = {"content": content, "contentType": "rawtext"}
+        self.pending_changes.append(change)
+        return self
+
+    def add(self, path: str, content: str | bytes) -> "PushBuilder":
+        return self.add_change("add", path, content)
+
+    def edit(self, path: str, content: str | bytes) -> "PushBuilder":
+        return self.add_change("edit", path, content)
+
+    def delete(self, path: str) -> "PushBuilder":
+        return self.add_change("delete", path)
+
+    def rename(self, source_path: str, path: str) -> "PushBuilder":
+        return self.add_change("rename", path, source_path=source_path)
+
+    def commit(self, commit_message: str) -> "PushBuilder":
+        """Closes the current set of changes into a commit, further changes will go into the next one."""
+        if not self.pending_changes:
+            raise ValueError("No updates provided! It's not possible to create a commit without updates.")
+        self.commits.append((commit_message, self.pending_changes))
+        self.pending_changes = []
+        return self
+
+    def _get_pushes(self) -> list[list[tuple[int, dict[str, Any]]]]:
+        """Packs the commits into as few pushes as fit under `max_payload_bytes`, splitting any commit which is too large by itself.
+        Returns each push's commit bodies, alongside the index (in `commits`) of the commit each one came from."""
+        commit_bodies: list[tuple[int, dict[str, Any]]] = []
+        for index, (commit_message, changes) in enumerate(self.commits):
+            parts: list[list[dict[str, Any]]] = [[]]
+            part_size = 0
+            for change in changes:
+                change_size = len(json.dumps(change))
+                if parts[-1] and part_size + change_size > self.max_payload_bytes:
+                    parts.append([])
+                    part_size = 0
+                parts[-1].append(change)
+                part_size += change_size
+            for i, part in enumerate(parts, start=1):
+                commit_bodies.append((index, {"comment": commit_message if len(parts) == 1 else f"{commit_message} (part {i}/{len(parts)})", "changes": part}))  # fmt: skip
+        pushes: list[list[tuple[int, dict[str, Any]]]] = [[]]
+        push_size = 0
+        for index, commit_body in commit_bodies:
+            commit_size = len(json.dumps(commit_body))
+            if pushes[-1] and push_size + commit_size > self.max_payload_bytes:
+                pushes.append([])
+                push_size = 0
+            pushes[-1].append((index, commit_body))
+            push_size += commit_size
+        return pushes
+
+    def push(self, ado_client: "AdoClient", from_branch_name: str | None = None) -> list[Commit]:
+        """Sends every commit, returning the created commits. Builds on the head of `from_branch_name` (defaults to the branch being pushed to),
+        or after a failed push, on the last commit which made it (see `pushed_commits`)."""
+        if self.pending_changes:
+            raise ValueError("There are changes which haven't been committed, call `.commit(message)` first.")
+        if not self.commits:
+            raise ValueError("No updates provided! It's not possible to create a commit without updates.")
+        old_object_id = (
+            self.pushed_commits[-1].commit_id if self.pushed_commits
+            else Branch.get_head_commit_id(ado_client, self.repo_id, from_branch_name or self.branch_name)
+        )  # fmt: skip
+        commits, sent_change_counts = self.commits, [0] * len(self.commits)
+        for commit_bodies in self._get_pushes():
+            data = {"refUpdates": [{"name": f"refs/heads/{self.branch_name}", "oldObjectId": old_object_id or FIRST_COMMIT_ID}], "commits": [x for _, x in commit_bodies]}  # fmt: skip
+            request = ado_client.session.post(
+                f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/git/repositories/{self.repo_id}/pushes?api-version=7.1",
+                json=data,
+            )
+            progress = "" if not self.pushed_commits else (
+                f" {len(self.pushed_commits)} commit(s) were pushed before this failed ({', '.join(x.commit_id for x in self.pushed_commits)}),"
+                " calling `push` again carries on from the last of them."
+            )  # fmt: skip
+            if request.status_code == 400:
+                raise ValueError(f"The commit was not created successfully, the file(s) you're trying to add might already exist there.{progress}")  # fmt: skip
+            if request.status_code == 403:
+                raise InvalidPermissionsError(f"You do not have permission to create a commit in this repo (possibly due to main branch protections).{progress}")  # fmt: skip
+            if not request.json().get("commits"):
+                raise ValueError(f"The commit was not created successfully.{progress}\nError:", request.json())
+            self.pushed_commits.extend(Commit.from_request_payload(x) for x in request.json()["commits"])
+            old_object_id = self.pushed_commits[-1].commit_id  # The next push builds on this one
+            # Drop what was just sent, so a retry after a later failure doesn't send it twice (parts are sent in order)
+            for index, commit_body in commit_bodies:
+                sent_change_counts[index] += len(commit_body["changes"])
+            self.commits = [
+                (message, changes[sent_change_counts[index] :])
+                for index, (message, changes) in enumerate(commits) if sent_change_counts[index] < len(changes)
+            ]  # fmt: skip
+        created_commits, self.commits, self.pushed_commits = self.pushed_commits, [], []
+        return created_commits
@@ -6,12 +6,51 @@ from typing import TYPE_CHECKING, Any, Literal
 
 from ado_wrapper.resources.users import Member
 from ado_wrapper.state_managed_abc import StateManagedResource
-from ado_wrapper.utils import from_ado_date_string
+from ado_wrapper.utils import DEFAULT_MAX_WORKERS, from_ado_date_string, run_concurrently
 
 if TYPE_CHECKING:
     from ado_wrapper.client import AdoClient
 
 EnvironmentEditableAttribute = Literal["name", "description"]
+PipelinePermissionResourceType = Literal["environment", "endpoint", "queue", "variablegroup", "securefile", "repository"]
+
+
+# ====================================================================
+
+
+def get_pipeline_permissions(ado_client: AdoClient, resource_type: PipelinePermissionResourceType, resource_id: str) -> dict[str, Any]:
+    """Returns the raw pipeline permissions of a resource, {"resource": ..., "pipelines": [...], "allPipelines": ...}
+    https://learn.microsoft.com/en-us/rest/api/azure/devops/approvalsandchecks/pipeline-permissions/get?view=azure-devops-rest-7.1"""
+    request = ado_client.session.get(
+        f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/pipelines/pipelinePermissions/{resource_type}/{resource_id}?api-version=7.1-preview.1",
+    )
+    if request.status_code != 200:
+        raise ValueError(f"Error getting the pipeline permissions of {resource_type} {resource_id}: {request.text}")
+    return request.json()  # type: ignore[no-any-return]
+
+
+def set_pipeline_permissions(ado_client: AdoClient, resource_type: PipelinePermissionResourceType, resource_id: str,
+                             pipeline_ids: list[str], authorized: bool = True, all_pipelines: bool | None = None) -> dict[str, Any]:  # fmt: skip
+    """(De)authorises many pipelines to use a resource in one request, pipelines which aren't passed in are left as they are.
+    `all_pipelines` (if not None) also sets whether every pipeline in the project can use the resource.
+    Returns the resource's raw pipeline permissions after the change.
+    https://learn.microsoft.com/en-us/rest/api/azure/devops/approvalsandchecks/pipeline-permissions/update-pipeline-permisions-for-resource?view=azure-devops-rest-7.1
+    """
+    payload = {
+        "resource": {"type": resource_type, "id": resource_id},
+        "pipelines": [{"id": pipeline_id, "authorized": authorized} for pipeline_id in dict.fromkeys(pipeline_ids)],  # Deduplicated
+    }
+    if all_pipelines is not None:
+        payload["allPipelines"] = {"authorized": all_pipelines}
+    request = ado_client.session.patch(
+        f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/pipelines/pipelinePermissions/{resource_type}/{resource_id}?api-version=7.1-preview.1",
+        json=payload,
+    )
+    if request.status_code == 404:
+        raise ValueError(f"One of the pipelines {pipeline_ids} (or {resource_type} {resource_id}) was not found.")
+    if request.status_code != 200:
+        raise ValueError(f"Error setting the pipeline permissions of {resource_type} {resource_id}: {request.text}")
+    return request.json()  # type: ignore[no-any-return]
 
 
 # ====================================================================
@@ -99,6 +138,31 @@ class Environment(StateManagedResource):
     def remove_pipeline_permissions(self, ado_client: AdoClient, pipeline_id: str) -> None:
         PipelineAuthorisation.delete_by_id(ado_client, self.environment_id, pipeline_id)
 
+    def add_pipeline_permissions_batch(self, ado_client: AdoClient, pipeline_ids: list[str]) -> list[PipelineAuthorisation]:
+        return PipelineAuthorisation.create_many(ado_client, self.environment_id, pipeline_ids)
+
+    def remove_pipeline_permissions_batch(self, ado_client: AdoClient, pipeline_ids: list[str]) -> None:
+        PipelineAuthorisation.delete_many(ado_client, self.environment_id, pipeline_ids)
+
+    @staticmethod
+    def set_pipeline_permissions_for_environments(
+        ado_client: AdoClient, environment_ids: list[str], pipeline_ids: list[str], authorized: bool = True,
+        max_workers: int = DEFAULT_MAX_WORKERS,  # fmt: skip
+    ) -> dict[str, list[PipelineAuthorisation]]:
+        """(De)authorises every pipeline to every environment, with one request per environment, sent concurrently.
+        Returns {environment_id: authorisations} (empty lists when deauthorising)."""
+
+        def set_permissions(environment_id: str) -> list[PipelineAuthorisation]:
+            if authorized:
+                return PipelineAuthorisation.create_many(ado_client, environment_id, pipeline_ids)
+            PipelineAuthorisation.delete_many(ado_client, environment_id, pipeline_ids)
+            return []
+
+        results, failures = run_concurrently(set_permissions, list(dict.fromkeys(environment_ids)), max_workers)
+        if failures:
+            raise failures[0][1]
+        return dict(results)
+
 
 @dataclass
 class PipelineAuthorisation:
@@ -122,38 +186,36 @@ class PipelineAuthorisation:
 
     @classmethod
     def get_all_for_environment(cls, ado_client: AdoClient, environment_id: str) -> list[PipelineAuthorisation]:
-        request = ado_client.session.get(
-            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/pipelines/pipelinePermissions/environment/{environment_id}",
-        ).json()
-        return [cls.from_request_payload(x, request["resource"]["id"]) for x in request["pipelines"]]
+        data = get_pipeline_permissions(ado_client, "environment", environment_id)
+        return [cls.from_request_payload(x, data["resource"]["id"]) for x in data["pipelines"]]
 
     @classmethod
     def create(cls, ado_client: AdoClient, environment_id: str, pipeline_id: str, authorized: bool = True) -> PipelineAuthorisation:
-        all_existing = cls.get_all_for_environment(ado_client, environment_id)
-        payload: dict[str, Any] = {"pipelines": [{"id": x.pipeline_id, "authorized": True} for x in all_existing]}
-        payload["pipelines"] = [x for x in payload["pipelines"] if x["id"] != pipeline_id]  # Remove existing entry if it exists
-        payload["pipelines"].append({"id": pipeline_id, "authorized": authorized})
-        payload |= {"resource": {"type": "environment", "id": environment_id}}
-
-        request = ado_client.session.patch(
-            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/pipelines/pipelinePermissions/environment/{environment_id}?api-version=7.1-preview.1",
-            json=payload,
-        )
-        if request.status_code == 404:
-            raise ValueError(f"Pipeline {pipeline_id} not found.")
-        if not request.json()["pipelines"]:
+        data = set_pipeline_permissions(ado_client, "environment", environment_id, [pipeline_id], authorized)
+        created_pipeline_dict = next((x for x in data["pipelines"] if str(x["id"]) == str(pipeline_id)), None)
+        if created_pipeline_dict is None:
             raise ValueError(f"Pipeline {pipeline_id} not found.")
-        created_pipeline_dict = max(request.json()["pipelines"], key=lambda x: x["authorizedOn"])
         return cls.from_request_payload(created_pipeline_dict, environment_id)
 
     def update(self, ado_client: AdoClient, authorized: bool) -> None:
-        self.delete_by_id(ado_client, self.environment_id, self.pipeline_id)
         new = self.create(ado_client, self.environment_id, self.pipeline_id, authorized)
         self.__dict__.update(new.__dict__)
 
     @classmethod
     def delete_by_id(cls, ado_client: AdoClient, environment_id: str, pipeline_authorisation_id: str) -> None:
         try:
-            cls.create(ado_client, environment_id, pipeline_authorisation_id, False)
+            cls.delete_many(ado_client, environment_id, [pipeline_authorisation_id])
         except ValueError:
             pass
+
+    @classmethod
+    def create_many(cls, ado_client: AdoClient, environment_id: str, pipeline_ids: list[str]) -> list[PipelineAuthorisation]:
+        """Authorises many pipelines to an environment in one request, returning their authorisations."""
+        data = set_pipeline_permissions(ado_client, "environment", environment_id, pipeline_ids)
+        pipeline_ids = [str(pipeline_id) for pipeline_id in pipeline_ids]
+        return [cls.from_request_payload(x, environment_id) for x in data["pipelines"] if str(x["id"]) in pipeline_ids]
+
+    @classmethod
+    def delete_many(cls, ado_client: AdoClient, environment_id: str, pipeline_ids: list[str]) -> None:
+        """Deauthorises many pipelines from an environment in one request."""
+        set_pipeline_permissions(ado_client, "environment", environment_id, pipeline_ids, authorized=False)
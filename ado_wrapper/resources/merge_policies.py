@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import json
+from collections.abc import Callable
 from dataclasses import dataclass, field
 from datetime import datetime
+from pathlib import Path
 from typing import TYPE_CHECKING, Any, Literal
 
 from ado_wrapper.resources.users import Reviewer
 from ado_wrapper.state_managed_abc import StateManagedResource
-from ado_wrapper.utils import from_ado_date_string, requires_initialisation
-from ado_wrapper.errors import ConfigurationError
+from ado_wrapper.utils import (
+    DEFAULT_MAX_WORKERS, from_ado_date_string, iterate_continuation_pages, requires_initialisation, run_concurrently,  # fmt: skip
+)
+from ado_wrapper.errors import ConfigurationError, InvalidPermissionsError, UnknownError
 
 if TYPE_CHECKING:
     from ado_wrapper.client import AdoClient
@@ -29,13 +34,32 @@ limit_merge_type_mapping = {
 }
 
 
+def get_policy_type_ids(ado_client: AdoClient, cache_file_name: str | None = None) -> dict[str, str]:
+    """Returns a mapping of policy type display name -> id. These never change for an org, so they're fetched once and kept on the client.
+    If `cache_file_name` is passed, they're also read from/written to that JSON file (keyed by org), so later runs needn't fetch them."""
+    if ado_client.policy_type_ids:
+        return ado_client.policy_type_ids
+    cached_orgs: dict[str, dict[str, str]] = {}
+    if cache_file_name is not None and Path(cache_file_name).exists():
+        cached_orgs = json.loads(Path(cache_file_name).read_text(encoding="utf-8"))
+    if ado_client.ado_org not in cached_orgs:
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/policy/types?api-version=6.0"
+        )
+        if request.status_code == 403:
+            raise InvalidPermissionsError("You have insufficient perms to get the policy types!")
+        if request.status_code >= 300:
+            raise UnknownError(f"Error getting the policy types: {request.status_code}, {request.text}")
+        cached_orgs[ado_client.ado_org] = {x["displayName"]: x["id"] for x in request.json()["value"]}
+        if cache_file_name is not None:
+            Path(cache_file_name).write_text(json.dumps(cached_orgs, indent=4), encoding="utf-8")
+    ado_client.policy_type_ids.update(cached_orgs[ado_client.ado_org])
+    return ado_client.policy_type_ids
+
+
 def _get_type_id(ado_client: AdoClient, action_type: str) -> str:
     """Used internally to get a specific update request ID"""
-    request = ado_client.session.get(
-        f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/policy/types?api-version=6.0"
-    )
-    # rint([(x["displayName"], x["id"]) for x in request.json()["value"]])
-    return [x for x in request.json()["value"] if x["displayName"] == action_type][0]["id"]  # type: ignore[no-any-return]
+    return get_policy_type_ids(ado_client)[action_type]
 
 
 @dataclass
@@ -83,6 +107,10 @@ class MergePolicyDefaultReviewer(StateManagedResource):
         """If the reviewer is a group, use the Group.origin_id attribute, for users, use their regular user id"""
         if reviewer_id in [x.member_id for x in cls.get_default_reviewers(ado_client, repo_id, branch_name)]:
             raise ValueError("Reviewer already exists! To update, please remove the reviewer first.")
+        cls._create_default_reviewer(ado_client, repo_id, reviewer_id, is_required, branch_name)
+
+    @staticmethod
+    def _create_default_reviewer(ado_client: AdoClient, repo_id: str, reviewer_id: str, is_required: bool, branch_name: str) -> None:
         payload = {
             "type": {"id": _get_type_id(ado_client, "Required reviewers")},
             "isBlocking": is_required,
@@ -151,7 +179,17 @@ class MergeBranchPolicy(StateManagedResource):
                           when_new_changes_are_pushed: WhenChangesArePushed, branch_name: str = "main") -> None:  # fmt: skip
         """Sets the perms for a pull request, can also be used as a "update" function."""
         existing_policy = MergePolicies.get_branch_policy(ado_client, repo_id, branch_name)
-        latest_policy_id = f"/{existing_policy.policy_id}" if existing_policy is not None else ""
+        MergeBranchPolicy._put_branch_policy(
+            ado_client, repo_id, minimum_approver_count, creator_vote_counts, prohibit_last_pushers_vote, allow_completion_with_rejects,
+            when_new_changes_are_pushed, branch_name, existing_policy.policy_id if existing_policy is not None else None,
+        )  # fmt: skip
+
+    @staticmethod
+    def _put_branch_policy(ado_client: AdoClient, repo_id: str, minimum_approver_count: int,
+                           creator_vote_counts: bool, prohibit_last_pushers_vote: bool, allow_completion_with_rejects: bool,
+                           when_new_changes_are_pushed: WhenChangesArePushed, branch_name: str, existing_policy_id: str | None) -> None:  # fmt: skip
+        """Creates the policy, or updates it in place if there's an existing policy id."""
+        latest_policy_id = f"/{existing_policy_id}" if existing_policy_id is not None else ""
         payload = {
             "settings": {
                 "minimumApproverCount": minimum_approver_count,
@@ -264,3 +302,288 @@ class MergePolicies(StateManagedResource):
     @staticmethod
     def get_branch_policy(ado_client: AdoClient, repo_id: str, branch_name: str = "main") -> MergeBranchPolicy | None:
         return MergeBranchPolicy.get_branch_policy(ado_client, repo_id, branch_name)
+
+    # ================== Bulk ================== #
+    @staticmethod
+    def apply_changes(ado_client: AdoClient, changes: list[BranchPolicyChange], max_workers: int = DEFAULT_MAX_WORKERS) -> None:
+        """Executes the changes from `BranchPolicyIndex.diff` concurrently, raising the first failure once all have been attempted."""
+        get_policy_type_ids(ado_client)
+        _, failures = run_concurrently(lambda change: change.apply(ado_client), changes, max_workers=max_workers)
+        if failures:
+            raise failures[0][1]
+
+    @classmethod
+    def enforce_desired_policies(cls, ado_client: AdoClient, desired_policies: list[DesiredBranchPolicy],
+                                 prune_other_branches: bool = False, max_workers: int = DEFAULT_MAX_WORKERS) -> list[BranchPolicyChange]:  # fmt: skip
+        """Snapshots the project's policies, diffs them against `desired_policies`, and applies the minimal set of changes.
+        See `BranchPolicyIndex.diff` for `prune_other_branches`. Returns the changes which were made (an empty list if everything already matched).
+        """
+        changes = BranchPolicyIndex.from_project(ado_client).diff(desired_policies, prune_other_branches=prune_other_branches)
+        cls.apply_changes(ado_client, changes, max_workers)
+        return changes
+
+    @staticmethod
+    def _run_for_each_branch(ado_client: AdoClient, function: Callable[[tuple[str, str]], None], repo_ids: list[str],
+                             branch_names: list[str] | None, max_workers: int) -> None:  # fmt: skip
+        get_policy_type_ids(ado_client)  # Warm the cache before fanning out, so the threads don't all fetch it
+        _, failures = run_concurrently(function, [(repo_id, branch_name) for repo_id in repo_ids for branch_name in branch_names or ["main"]],
+                                       max_workers=max_workers)  # fmt: skip
+        if failures:
+            raise failures[0][1]
+
+    @classmethod
+    def set_branch_policy_many(cls, ado_client: AdoClient, repo_ids: list[str], minimum_approver_count: int,
+                               creator_vote_counts: bool, prohibit_last_pushers_vote: bool, allow_completion_with_rejects: bool,
+                               when_new_changes_are_pushed: WhenChangesArePushed, branch_names: list[str] | None = None,
+                               max_workers: int = DEFAULT_MAX_WORKERS) -> None:  # fmt: skip
+        """Applies the same branch policy to every repo/branch pair concurrently (branch_names defaults to ["main"]).
+        Existing policies (to update in place) are found with one `BranchPolicyIndex` rather than one query per repo."""
+        index = BranchPolicyIndex.from_project(ado_client)
+
+        def _set_branch_policy(repo_and_branch: tuple[str, str]) -> None:
+            repo_id, branch_name = repo_and_branch
+            existing_policies = index.get_policies(repo_id, branch_name, "Minimum number of reviewers", exact_only=True)
+            existing_policy = max(existing_policies, key=lambda x: x["createdDate"]) if existing_policies else None
+            MergeBranchPolicy._put_branch_policy(
+                ado_client, repo_id, minimum_approver_count, creator_vote_counts, prohibit_last_pushers_vote, allow_completion_with_rejects,
+                when_new_changes_are_pushed, branch_name, existing_policy["id"] if existing_policy is not None else None,
+            )  # fmt: skip
+
+        cls._run_for_each_branch(ado_client, _set_branch_policy, repo_ids, branch_names, max_workers)
+
+    @classmethod
+    def add_default_reviewer_many(cls, ado_client: AdoClient, repo_ids: list[str], reviewer_id: str, is_required: bool,
+                                  branch_names: list[str] | None = None, max_workers: int = DEFAULT_MAX_WORKERS) -> None:  # fmt: skip
+        """Adds the reviewer to every repo/branch pair concurrently, skipping the ones which already have them as a default reviewer."""
+        index = BranchPolicyIndex.from_project(ado_client)
+
+        def _add_default_reviewer(repo_and_branch: tuple[str, str]) -> None:
+            repo_id, branch_name = repo_and_branch
+            if reviewer_id not in index.get_default_reviewer_ids(repo_id, branch_name):
+                MergePolicyDefaultReviewer._create_default_reviewer(ado_client, repo_id, reviewer_id, is_required, branch_name)
+
+        cls._run_for_each_branch(ado_client, _add_default_reviewer, repo_ids, branch_names, max_workers)
+
+
+# ====================================================================
+
+
+@dataclass
+class BranchPolicyIndex:
+    """A snapshot of every branch policy configuration in the project, downloaded in one paginated sweep rather than one
+    HierarchyQuery per repo, so it can be queried as often as you like with no more network calls.
+    Policies scoped to one repo and exact branch are looked up by key, while project wide (repositoryId of None)
+    and prefix scoped policies are kept separately and checked against every query."""
+
+    policies: dict[tuple[str, str], dict[str, list[dict[str, Any]]]] = field(default_factory=dict)  # (repo_id, ref) -> type -> policies
+    broad_policies: list[tuple[dict[str, Any], dict[str, Any]]] = field(default_factory=list)  # (scope, policy)
+    identities: dict[str, Reviewer] = field(default_factory=dict)  # Only populated by `from_repos`, reviewer_id -> Reviewer
+
+    def add(self, policy: dict[str, Any]) -> None:
+        policy_type = policy["type"]["displayName"]
+        for scope in policy["settings"].get("scope") or [{}]:
+            if scope.get("repositoryId") and scope.get("refName") and scope.get("matchKind", "Exact") == "Exact":
+                self.policies.setdefault((scope["repositoryId"], scope["refName"]), {}).setdefault(policy_type, []).append(policy)
+            else:
+                self.broad_policies.append((scope, policy))
+
+    @classmethod
+    def from_project(cls, ado_client: AdoClient) -> BranchPolicyIndex:
+        """Builds the index from the policy configurations list endpoint, which covers every repo in the project."""
+        index = cls()
+        for page in iterate_continuation_pages(
+            ado_client, f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/policy/configurations?api-version=7.1"
+        ):
+            for policy in page:
+                index.add(policy)
+        return index
+
+    @classmethod
+    def from_repos(cls, ado_client: AdoClient, repo_ids: list[str], branch_name: str = "main",
+                   max_workers: int = DEFAULT_MAX_WORKERS) -> BranchPolicyIndex:  # fmt: skip
+        """A fallback for when the configurations endpoint can't be used, which fans out one HierarchyQuery per repo concurrently."""
+        requires_initialisation(ado_client)
+
+        def _get_data_provider(repo_id: str) -> dict[str, Any] | None:
+            payload = {"contributionIds": ["ms.vss-code-web.branch-policies-data-provider"],
+                       "dataProviderContext": {"properties": {"projectId": ado_client.ado_project_id, "repositoryId": repo_id, "refName": f"refs/heads/{branch_name}"}}}  # fmt: skip
+            request = ado_client.session.post(
+                f"https://dev.azure.com/{ado_client.ado_org}/_apis/Contribution/HierarchyQuery?api-version=7.1-preview.1",
+                json=payload,
+            ).json()
+            return request["dataProviders"].get("ms.vss-code-web.branch-policies-data-provider") if request is not None else None
+
+        index = cls()
+        results, failures = run_concurrently(_get_data_provider, repo_ids, max_workers=max_workers)
+        if failures:
+            raise failures[0][1]
+        seen_policy_ids: set[int] = set()
+        for _, data_provider in results:
+            if data_provider is None:  # Disabled repos
+                continue
+            for identity in data_provider["identities"]:
+                index.identities[identity["id"]] = Reviewer(identity["displayName"], identity["uniqueName"], identity["id"])
+            for policy_group in (data_provider["policyGroups"] or {}).values():
+                for policy in policy_group["currentScopePolicies"] or []:
+                    if policy["id"] not in seen_policy_ids:  # Project wide policies show up for every repo
+                        seen_policy_ids.add(policy["id"])
+                        index.add(policy)
+        return index
+
+    def get_policy_types(self, repo_id: str) -> list[tuple[str, str]]:
+        """Returns every (ref_name, policy type) pair which has an exact scoped policy on the repo."""
+        return [
+            (ref_name, policy_type)
+            for (policy_repo_id, ref_name), policies_by_type in self.policies.items() if policy_repo_id == repo_id
+            for policy_type in policies_by_type
+        ]  # fmt: skip
+
+    def get_policies(self, repo_id: str, branch_name: str = "main", policy_type: str | None = None,
+                     exact_only: bool = False) -> list[dict[str, Any]]:  # fmt: skip
+        """Returns the raw configurations which apply to a repo's branch, optionally only those of one type, e.g. "Required reviewers".
+        `exact_only` skips project wide and prefix scoped policies, i.e. only returns ones set on that specific branch."""
+        ref_name = f"refs/heads/{branch_name}"
+        matches = [
+            policy for type_name, policies in self.policies.get((repo_id, ref_name), {}).items() if policy_type in (None, type_name)
+            for policy in policies
+        ]  # fmt: skip
+        if exact_only:
+            return matches
+        for scope, policy in self.broad_policies:
+            if scope.get("repositoryId") not in (None, repo_id) or policy_type not in (None, policy["type"]["displayName"]):
+                continue
+            scope_ref_name = scope.get("refName")
+            if scope_ref_name is None or (ref_name.startswith(scope_ref_name) if scope.get("matchKind") == "Prefix" else ref_name == scope_ref_name):  # fmt: skip
+                matches.append(policy)
+        return matches
+
+    def get_default_reviewer_ids(self, repo_id: str, branch_name: str = "main") -> set[str]:
+        """Returns the ids of every reviewer automatically added to pull requests into the branch, required or not."""
+        return {
+            reviewer_id
+            for policy in self.get_policies(repo_id, branch_name, "Required reviewers") if policy.get("isEnabled", True)
+            for reviewer_id in policy["settings"].get("requiredReviewerIds", [])
+        }  # fmt: skip
+
+    @staticmethod
+    def get_identity_id(ado_client: AdoClient, email: str) -> str | None:
+        """Resolves a user's email (or a group's name) to the identity id which policies use for reviewers."""
+        request = ado_client.session.get(
+            f"https://vssps.dev.azure.com/{ado_client.ado_org}/_apis/identities?searchFilter=General&filterValue={email}&api-version=7.1",
+        )
+        if request.status_code != 200:
+            return None
+        identities = request.json()["value"]
+        return identities[0]["id"] if identities else None
+
+    def get_repo_ids_with_default_reviewer(self, ado_client: AdoClient, reviewer_email: str, repo_ids: list[str],
+                                           branch_name: str = "main") -> list[str]:  # fmt: skip
+        """Returns the repo ids (of the ones passed in) which have the reviewer as a default reviewer on the branch."""
+        reviewer_id = next((x.member_id for x in self.identities.values() if x.email.lower() == reviewer_email.lower()), None)
+        if reviewer_id is None:
+            reviewer_id = self.get_identity_id(ado_client, reviewer_email)
+        if reviewer_id is None:
+            return []
+        return [repo_id for repo_id in repo_ids if reviewer_id in self.get_default_reviewer_ids(repo_id, branch_name)]
+
+    def diff(self, desired_policies: list[DesiredBranchPolicy], managed_policy_types: list[str] | None = None,
+             prune_other_branches: bool = False) -> list[BranchPolicyChange]:  # fmt: skip
+        """Compares the snapshot against the desired policies, returning the minimal creates, updates and deletes to match them.
+        Only the branches in `desired_policies` are touched (or every branch of their repos, if `prune_other_branches`), and only
+        policy types in `managed_policy_types` (defaulting to the desired ones) are deleted, so any other policies are left alone.
+        Project wide, prefix and multi-scope policies are never changed."""
+        managed_policy_types = managed_policy_types or list({x.policy_type for x in desired_policies})
+        desired_by_key: dict[tuple[str, str, str], list[DesiredBranchPolicy]] = {}
+        for desired_policy in desired_policies:
+            desired_by_key.setdefault((desired_policy.repo_id, desired_policy.ref_name, desired_policy.policy_type), []).append(
+                desired_policy
+            )
+        desired_branches = {(x.repo_id, x.ref_name) for x in desired_policies}
+        existing_keys = {
+            (repo_id, ref_name, policy_type)
+            for repo_id in {x.repo_id for x in desired_policies}
+            for ref_name, policy_type in self.get_policy_types(repo_id)
+            if policy_type in managed_policy_types and (prune_other_branches or (repo_id, ref_name) in desired_branches)
+        }
+
+        changes: list[BranchPolicyChange] = []
+        for repo_id, ref_name, policy_type in sorted(existing_keys | set(desired_by_key)):
+            remaining_desired = list(desired_by_key.get((repo_id, ref_name, policy_type), []))
+            remaining_existing = [
+                x for x in self.policies.get((repo_id, ref_name), {}).get(policy_type, []) if len(x["settings"].get("scope") or []) == 1
+            ]
+            for desired_policy in list(remaining_desired):  # Anything which already matches needs no changes
+                match = next((x for x in remaining_existing if desired_policy.matches(x)), None)
+                if match is not None:
+                    remaining_desired.remove(desired_policy)
+                    remaining_existing.remove(match)
+            for desired_policy, existing_policy in zip(remaining_desired, remaining_existing):
+                changes.append(BranchPolicyChange("update", repo_id, ref_name, policy_type, desired_policy, existing_policy))
+            for desired_policy in remaining_desired[len(remaining_existing) :]:
+                changes.append(BranchPolicyChange("create", repo_id, ref_name, policy_type, desired_policy, None))
+            for existing_policy in remaining_existing[len(remaining_desired) :]:
+                changes.append(BranchPolicyChange("delete", repo_id, ref_name, policy_type, None, existing_policy))
+        return changes
+
+
+@dataclass
+class DesiredBranchPolicy:
+    """One policy which should exist on a repo's branch, for use with `BranchPolicyIndex.diff`.
+    `settings` are compared against (and merged into) the existing policy's settings, so only the ones you care about are needed,
+    e.g. DesiredBranchPolicy(repo_id, "main", "Minimum number of reviewers", {"minimumApproverCount": 2})"""
+
+    repo_id: str
+    branch_name: str
+    policy_type: str  # The type's display name, e.g. "Required reviewers"
+    settings: dict[str, Any] = field(default_factory=dict)  # Excluding "scope", which comes from repo_id and branch_name
+    is_blocking: bool = True
+    is_enabled: bool = True
+
+    @property
+    def ref_name(self) -> str:
+        return f"refs/heads/{self.branch_name}"
+
+    def matches(self, policy: dict[str, Any]) -> bool:
+        return (
+            policy.get("isBlocking") == self.is_blocking and policy.get("isEnabled") == self.is_enabled
+            and all(policy["settings"].get(key) == value for key, value in self.settings.items())
+        )  # fmt: skip
+
+
+@dataclass
+class BranchPolicyChange:
+    """A single create, update or delete of a policy configuration, as returned by `BranchPolicyIndex.diff`."""
+
+    action: Literal["create", "update", "delete"]
+    repo_id: str
+    ref_name: str
+    policy_type: str
+    desired_policy: DesiredBranchPolicy | None = field(repr=False)
+    existing_policy: dict[str, Any] | None = field(repr=False)
+
+    def apply(self, ado_client: AdoClient) -> None:
+        base_url = f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/policy/configurations"
+        if self.action == "delete":
+            assert self.existing_policy is not None
+            request = ado_client.session.delete(f"{base_url}/{self.existing_policy['id']}?api-version=7.1")
+            if request.status_code != 204:
+                raise UnknownError(f"Error deleting policy {self.existing_policy['id']}! {request.status_code}, {request.text}")
+            return
+        assert self.desired_policy is not None
+        existing_settings = self.existing_policy["settings"] if self.existing_policy is not None else {}
+        payload = {
+            "type": {"id": _get_type_id(ado_client, self.policy_type)},
+            "isBlocking": self.desired_policy.is_blocking,
+            "isEnabled": self.desired_policy.is_enabled,
+            "settings": existing_settings | self.desired_policy.settings | {
+                "scope": [{"repositoryId": self.repo_id, "refName": self.ref_name, "matchKind": "Exact"}]
+            },
+        }  # fmt: skip
+        policy_id = f"/{self.existing_policy['id']}" if self.existing_policy is not None else ""
+        request = ado_client.session.request(
+            "PUT" if self.existing_policy is not None else "POST", f"{base_url}{policy_id}?api-version=7.1", json=payload,
+        )  # fmt: skip
+        if request.status_code == 400:
+            raise ConfigurationError(f"Error setting policy {self.policy_type} on {self.repo_id}, {request.text}")
+        if request.status_code != 200:
+            raise UnknownError(f"Error setting policy {self.policy_type} on {self.repo_id}! {request.status_code}, {request.text}")
@@ -5,6 +5,7 @@ from datetime import datetime
 from typing import TYPE_CHECKING, Any
 
 from ado_wrapper.state_managed_abc import StateManagedResource
+from ado_wrapper.utils import iterate_continuation_pages
 
 if TYPE_CHECKING:
     from ado_wrapper.client import AdoClient
@@ -39,10 +40,11 @@ class Project(StateManagedResource):
 
     @classmethod
     def get_all(cls, ado_client: AdoClient) -> list[Project]:
-        return super()._get_all(
-            ado_client,
-            "/_apis/projects?api-version=7.1",
-        )  # type: ignore[return-value]
+        return [
+            cls.from_request_payload(x)
+            for page in iterate_continuation_pages(ado_client, f"https://dev.azure.com/{ado_client.ado_org}/_apis/projects?api-version=7.1")
+            for x in page
+        ]
 
     # ============ End of requirement set by all state managed resources ================== #
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ #
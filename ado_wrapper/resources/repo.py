@@ -1,21 +1,27 @@
 from __future__ import annotations
 
+import fnmatch
 import io
 import json
+import shutil
+import tempfile
+import time
 import zipfile
+from collections.abc import Callable, Iterator
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING, Any, Literal
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Literal
 
 import requests
 import yaml
 
+from ado_wrapper.resources.branches import Branch
 from ado_wrapper.resources.commits import Commit
-
-# from ado_wrapper.resources.branches import Branch
-from ado_wrapper.resources.merge_policies import MergePolicies, MergePolicyDefaultReviewer
+from ado_wrapper.resources.merge_policies import BranchPolicyIndex, MergePolicies
 from ado_wrapper.resources.pull_requests import PullRequest, PullRequestStatus
 from ado_wrapper.state_managed_abc import StateManagedResource
 from ado_wrapper.errors import ResourceNotFound, UnknownError
+from ado_wrapper.utils import DEFAULT_MAX_WORKERS, ProgressCallback, run_concurrently, stream_response_to_file
 
 if TYPE_CHECKING:
     from ado_wrapper.client import AdoClient
@@ -117,46 +123,117 @@ class Repo(StateManagedResource):
             return yaml.safe_load(file_content)  # type: ignore[no-any-return]
         raise TypeError("Can only decode .json, .yaml or .yml files!")
 
-    def get_contents(self, ado_client: AdoClient, file_types: list[str] | None = None, branch_name: str = "main") -> dict[str, str]:
-        """https://learn.microsoft.com/en-us/rest/api/azure/devops/git/items/get?view=azure-devops-rest-7.1&tabs=HTTP
-        This function downloads the contents of a repo, and returns a dictionary of the files and their contents
-        The file_types parameter is a list of file types to filter for, e.g. ["json", "yaml"] etc."""
+    def _download_archive(self, ado_client: AdoClient, branch_name: str = "main", version_type: Literal["branch", "commit"] = "branch",
+                          progress_callback: ProgressCallback | None = None) -> IO[bytes]:  # fmt: skip
+        """Spools the zipped repo into a temporary file (deleted once closed), rather than into memory.
+        Raises ResourceNotFound for empty repos, and UnknownError if the download fails."""
         try:
             request = ado_client.session.get(
-                f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/git/repositories/{self.repo_id}/items?recursionLevel={'Full'}&download={True}&$format={'Zip'}&versionDescriptor.version={branch_name}&api-version=7.1",
+                f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/git/repositories/{self.repo_id}/items?recursionLevel={'Full'}&download={True}&$format={'Zip'}&versionDescriptor.version={branch_name}&versionDescriptor.versionType={version_type}&api-version=7.1",
+                stream=True,
             )
-        except requests.exceptions.ConnectionError:
-            if not ado_client.suppress_warnings:
-                print(f"=== Connection error, failed to download {self.repo_id}")
-            return {}
+        except requests.exceptions.ConnectionError as e:
+            raise UnknownError(f"=== Connection error, failed to download {self.repo_id}") from e
         if request.status_code == 404:
             raise ResourceNotFound(f"Repo {self.repo_id} does not have any branches or content!")
         if request.status_code != 200:
-            if not ado_client.suppress_warnings:
-                print(f"Error getting repo contents for {self.name} ({self.repo_id}):", request.text)
-            return {}
-        # ============ We do this because ADO ===================
-        bytes_io = io.BytesIO()
-        for chunk in request.iter_content(chunk_size=128):
-            bytes_io.write(chunk)
-
-        files = {}
+            raise UnknownError(f"Error getting repo contents for {self.name} ({self.repo_id}): {request.text}")
+        archive = tempfile.TemporaryFile()
         try:
-            with zipfile.ZipFile(bytes_io) as zip_ref:
-                # For each file, read the bytes and convert to string
-                for file_name in [x for x in zip_ref.namelist() if file_types is None or x.split(".")[-1] in file_types]:
-                    try:
-                        files[file_name] = zip_ref.read(file_name).decode()  # fmt: skip
-                    except UnicodeDecodeError:
-                        if not ado_client.suppress_warnings:
-                            print(f"Error decoding file: {file_name} in {self.name}")
-        except zipfile.BadZipFile as e:
+            stream_response_to_file(request, archive, progress_callback=progress_callback)
+        except requests.exceptions.RequestException as e:
+            archive.close()
+            raise UnknownError(f"=== Connection error, failed to download {self.repo_id}") from e
+        archive.seek(0)
+        return archive
+
+    @staticmethod
+    def _iterate_archive(archive: IO[bytes], file_types: list[str] | None = None,
+                         glob_patterns: list[str] | None = None) -> Iterator[tuple[str, bytes]]:  # fmt: skip
+        with zipfile.ZipFile(archive) as zip_ref:
+            for file_info in zip_ref.infolist():
+                if file_info.is_dir():
+                    continue
+                if file_types is not None and file_info.filename.split(".")[-1] not in file_types:
+                    continue
+                if glob_patterns is not None and not any(fnmatch.fnmatch(file_info.filename, x) for x in glob_patterns):
+                    continue
+                yield file_info.filename, zip_ref.read(file_info)
+
+    def _decode_contents(self, ado_client: AdoClient, files: Iterator[tuple[str, bytes]]) -> dict[str, str]:
+        decoded_files = {}
+        for file_name, file_bytes in files:
+            try:
+                decoded_files[file_name] = file_bytes.decode()
+            except UnicodeDecodeError:
+                if not ado_client.suppress_warnings:
+                    print(f"Error decoding file: {file_name} in {self.name}")
+        return decoded_files
+
+    def iterate_contents(self, ado_client: AdoClient, file_types: list[str] | None = None, branch_name: str = "main",
+                         glob_patterns: list[str] | None = None, progress_callback: ProgressCallback | None = None,
+                         version_type: Literal["branch", "commit"] = "branch") -> Iterator[tuple[str, bytes]]:  # fmt: skip
+        """Downloads the repo to a temporary file, then yields (path, bytes) one file at a time, so only one file is ever in memory.
+        Files can be filtered by extension (file_types, e.g. ["json", "yaml"]) and/or glob_patterns (e.g. ["pipelines/*.yml"]).
+        Decoding is left to the caller, so binary files can be skipped or handled without paying for it on every file.
+        progress_callback gets called with (bytes_downloaded, total_bytes or None) as the archive downloads."""
+        try:
+            archive = self._download_archive(ado_client, branch_name, version_type, progress_callback)
+        except UnknownError as e:
             if not ado_client.suppress_warnings:
-                print(f"{self.name} ({self.repo_id}) couldn't be unzipped:", e)
+                print(e)
+            return
+        with archive:
+            try:
+                yield from self._iterate_archive(archive, file_types, glob_patterns)
+            except zipfile.BadZipFile as e:
+                if not ado_client.suppress_warnings:
+                    print(f"{self.name} ({self.repo_id}) couldn't be unzipped:", e)
+
+    def get_contents(self, ado_client: AdoClient, file_types: list[str] | None = None, branch_name: str = "main") -> dict[str, str]:
+        """https://learn.microsoft.com/en-us/rest/api/azure/devops/git/items/get?view=azure-devops-rest-7.1&tabs=HTTP
+        This function downloads the contents of a repo, and returns a dictionary of the files and their contents
+        The file_types parameter is a list of file types to filter for, e.g. ["json", "yaml"] etc.
+        For large repos, use `iterate_contents` instead, which doesn't hold every file in memory at once."""
+        return self._decode_contents(ado_client, self.iterate_contents(ado_client, file_types, branch_name))
 
-        bytes_io.close()
-        # =========== That's all I have to say ==================
-        return files
+    @classmethod
+    def get_contents_many(cls, ado_client: AdoClient, callback: Callable[[Repo, dict[str, str]], None], repos: list[Repo] | None = None,
+                          file_types: list[str] | None = None, branch_name: str | None = None,
+                          max_workers: int = DEFAULT_MAX_WORKERS) -> RepoContentsSummary:  # fmt: skip
+        """Downloads the contents of many repos (default all of them) at once, calling `callback` with each repo and its contents
+        (as `get_contents` returns them) as soon as that repo finishes. Callbacks are all run from the calling thread.
+        Disabled and empty repos are skipped, and failed downloads are collected rather than printed.
+        branch_name defaults to each repo's default branch."""
+        repos = cls.get_all(ado_client) if repos is None else repos
+        summary = RepoContentsSummary()
+        start_time = time.perf_counter()
+
+        def download(repo: Repo) -> tuple[dict[str, str], int] | None:
+            try:
+                archive = repo._download_archive(ado_client, branch_name or repo.default_branch)  # pylint: disable=protected-access
+            except ResourceNotFound:
+                return None
+            with archive:
+                archive_size = archive.seek(0, io.SEEK_END)
+                archive.seek(0)
+                contents = repo._decode_contents(ado_client, repo._iterate_archive(archive, file_types))  # pylint: disable=protected-access
+                return contents, archive_size
+
+        def on_complete(repo: Repo, result: tuple[dict[str, str], int] | None) -> None:
+            if result is None:
+                summary.skipped_repo_ids.append(repo.repo_id)
+                return
+            files, archive_size = result
+            summary.downloaded_repo_ids.append(repo.repo_id)
+            summary.total_bytes += archive_size
+            callback(repo, files)
+
+        summary.skipped_repo_ids.extend(repo.repo_id for repo in repos if repo.is_disabled)
+        _, failures = run_concurrently(download, [repo for repo in repos if not repo.is_disabled], max_workers, on_complete)
+        summary.failed_repo_ids = {repo.repo_id: str(exception) for repo, exception in failures}
+        summary.elapsed_seconds = time.perf_counter() - start_time
+        return summary
 
     def create_pull_request(self, ado_client: AdoClient, branch_name: str, pull_request_title: str, pull_request_description: str) -> PullRequest:  # fmt: skip
         """Helper function which redirects to the PullRequest class to make a PR"""
@@ -192,12 +269,192 @@ class Repo(StateManagedResource):
                                                branch_name)  # fmt: skip
 
     @classmethod
-    def get_all_repos_with_required_reviewer(cls, ado_client: AdoClient, reviewer_email: str) -> list[Repo]:
-        return [
-            repo for repo in Repo.get_all(ado_client)
-            if any(x.email.lower() == reviewer_email.lower() for x in MergePolicyDefaultReviewer.get_default_reviewers(ado_client, repo.repo_id)
+    def get_all_repos_with_required_reviewer(cls, ado_client: AdoClient, reviewer_email: str, branch_name: str = "main") -> list[Repo]:
+        """Uses the project's policy configurations (one paginated listing), falling back to a concurrent query per repo."""
+        repos = Repo.get_all(ado_client)
+        repo_ids = [repo.repo_id for repo in repos if not repo.is_disabled]
+        try:
+            policy_index = BranchPolicyIndex.from_project(ado_client)
+        except UnknownError:
+            policy_index = BranchPolicyIndex.from_repos(ado_client, repo_ids, branch_name)
+        matching_repo_ids = set(policy_index.get_repo_ids_with_default_reviewer(ado_client, reviewer_email, repo_ids, branch_name))
+        return [repo for repo in repos if repo.repo_id in matching_repo_ids]
+
+
+# ====================================================================
+
+
+@dataclass
+class RepoContentsSummary:
+    """Returned by `Repo.get_contents_many`, tracks which repos were downloaded and the aggregate throughput."""
+
+    downloaded_repo_ids: list[str] = field(default_factory=list)
+    skipped_repo_ids: list[str] = field(default_factory=list)  # Disabled or empty repos
+    failed_repo_ids: dict[str, str] = field(default_factory=dict)  # repo_id -> error message
+    total_bytes: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.total_bytes / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+# ====================================================================
+
+
+class RepoContentCache:
+    """A local mirror of one branch of a repo, so files can be read from disk rather than the items API.
+    Trees are stored once per (repo_id, commit_id), in `cache_dir/<repo_id>/<commit_id>/`, and `refresh` checks the branch head
+    (one small refs request), only fetching the paths which changed between the cached commit and the new head.
+    file_types limits which files get mirrored, e.g. ["json", "yaml", "yml"]."""
+
+    def __init__(self, repo: Repo, branch_name: str | None = None, cache_dir: str = ".ado_wrapper_cache",
+                 file_types: list[str] | None = None, max_changed_files: int = 500) -> None:  # fmt: skip
+        self.repo = repo
+        self.branch_name = branch_name or repo.default_branch
+        self.repo_dir = Path(cache_dir) / repo.repo_id
+        self.file_types = file_types
+        self.max_changed_files = max_changed_files  # Past this, redownloading the archive is quicker than fetching file by file
+        self._decoded_files: dict[str, str] = {}
+
+    @property
+    def _ref_file(self) -> Path:
+        return self.repo_dir / "refs" / self.branch_name
+
+    @property
+    def commit_id(self) -> str | None:
+        """The commit currently mirrored, or None if nothing has been mirrored yet."""
+        return self._ref_file.read_text(encoding="utf-8") if self._ref_file.exists() else None
+
+    def _tree_dir(self, commit_id: str) -> Path:
+        return self.repo_dir / commit_id
+
+    def _local_path(self, commit_id: str, file_path: str) -> Path:
+        local_path = (self._tree_dir(commit_id) / file_path.lstrip("/")).resolve()
+        if not local_path.is_relative_to(self._tree_dir(commit_id).resolve()):
+            raise ValueError(f"File path {file_path} is outside of the repo!")
+        return local_path
+
+    def _is_mirrored(self, file_path: str) -> bool:
+        return self.file_types is None or file_path.split(".")[-1] in self.file_types
+
+    def _set_commit_id(self, commit_id: str) -> None:
+        self._ref_file.parent.mkdir(parents=True, exist_ok=True)
+        self._ref_file.write_text(commit_id, encoding="utf-8")
+        self._decoded_files = {}
+
+    def _download_tree(self, ado_client: AdoClient, commit_id: str) -> None:
+        temporary_dir = self.repo_dir / f"{commit_id}.partial"
+        shutil.rmtree(temporary_dir, ignore_errors=True)
+        with self.repo._download_archive(ado_client, commit_id, "commit") as archive:  # pylint: disable=protected-access
+            for file_path, file_bytes in self.repo._iterate_archive(archive, self.file_types):  # pylint: disable=protected-access
+                local_path = self._local_path(f"{commit_id}.partial", file_path)
+                local_path.parent.mkdir(parents=True, exist_ok=True)
+                local_path.write_bytes(file_bytes)
+        temporary_dir.mkdir(parents=True, exist_ok=True)  # For repos with no matching files
+        temporary_dir.rename(self._tree_dir(commit_id))
+
+    def _commit_exists(self, ado_client: AdoClient, commit_id: str) -> bool:
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/git/repositories/{self.repo.repo_id}/commits/{commit_id}?api-version=7.1",
+        )
+        return request.status_code == 200
+
+    def _get_changes(self, ado_client: AdoClient, base_commit_id: str, target_commit_id: str) -> list[dict[str, Any]] | None:
+        """Returns the changes from the base commit directly to the target (not from their merge base, which is wrong after a force push),
+        or None if the base commit no longer exists (e.g. it was rewritten away), in which case the tree has to be redownloaded.
+        https://learn.microsoft.com/en-us/rest/api/azure/devops/git/diffs/get?view=azure-devops-rest-7.1"""
+        changes: list[dict[str, Any]] = []
+        while True:
+            request = ado_client.session.get(
+                f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/git/repositories/{self.repo.repo_id}/diffs/commits?baseVersion={base_commit_id}&baseVersionType={'commit'}&targetVersion={target_commit_id}&targetVersionType={'commit'}&diffCommonCommit={'false'}&$top={1000}&$skip={len(changes)}&api-version=7.1",
             )
-        ]  # fmt: skip
+            if request.status_code != 200:
+                if not self._commit_exists(ado_client, base_commit_id):
+                    return None
+                raise UnknownError(f"Error getting the changes between {base_commit_id} and {target_commit_id}: {request.text}")
+            changes.extend(request.json()["changes"])
+            if request.json().get("allChangesIncluded", True) or not request.json()["changes"]:
+                return changes
+
+    def _get_file_bytes(self, ado_client: AdoClient, commit_id: str, file_path: str) -> bytes:
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/git/repositories/{self.repo.repo_id}/items?path={file_path}&versionDescriptor.version={commit_id}&versionDescriptor.versionType={'commit'}&download={True}&api-version=7.1",
+        )
+        if request.status_code != 200:
+            raise UnknownError(f"Error getting file {file_path} from repo {self.repo.repo_id}: {request.text}")
+        return request.content
+
+    def _apply_changes(self, ado_client: AdoClient, old_commit_id: str, new_commit_id: str, changes: list[dict[str, Any]]) -> None:
+        """Moves (or copies, if another branch still uses it) the old tree to the new commit, then updates only the changed paths."""
+        blob_changes = [x for x in changes if x["item"].get("gitObjectType", "blob") == "blob" and not x["item"].get("isFolder")]
+        deleted_paths = [x["item"]["path"] for x in blob_changes if "delete" in x["changeType"]]
+        deleted_paths += [x["sourceServerItem"] for x in blob_changes if "rename" in x["changeType"] and x.get("sourceServerItem")]
+        updated_paths = [x["item"]["path"] for x in blob_changes if "delete" not in x["changeType"]]
+        new_files, failures = run_concurrently(
+            lambda file_path: self._get_file_bytes(ado_client, new_commit_id, file_path),
+            [x for x in updated_paths if self._is_mirrored(x)],
+        )
+        if failures:
+            raise failures[0][1]
+        # ====
+        other_refs = [x for x in (self.repo_dir / "refs").rglob("*") if x.is_file() and x != self._ref_file]
+        temporary_dir = self.repo_dir / f"{new_commit_id}.partial"
+        shutil.rmtree(temporary_dir, ignore_errors=True)
+        if any(x.read_text(encoding="utf-8") == old_commit_id for x in other_refs):
+            shutil.copytree(self._tree_dir(old_commit_id), temporary_dir)
+        else:
+            self._tree_dir(old_commit_id).rename(temporary_dir)
+        for file_path in deleted_paths:
+            self._local_path(f"{new_commit_id}.partial", file_path).unlink(missing_ok=True)
+        for file_path, file_bytes in new_files:
+            local_path = self._local_path(f"{new_commit_id}.partial", file_path)
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            local_path.write_bytes(file_bytes)
+        temporary_dir.rename(self._tree_dir(new_commit_id))
+
+    def refresh(self, ado_client: AdoClient) -> bool:
+        """Brings the mirror up to date with the head of the branch, returns True if the mirrored commit changed."""
+        head_commit_id = Branch.get_head_commit_id(ado_client, self.repo.repo_id, self.branch_name)
+        if head_commit_id is None:
+            raise ResourceNotFound(f"Branch {self.branch_name} not found in repo {self.repo.name} ({self.repo.repo_id})")
+        cached_commit_id = self.commit_id
+        if head_commit_id == cached_commit_id and self._tree_dir(head_commit_id).exists():
+            return False
+        if not self._tree_dir(head_commit_id).exists():
+            if cached_commit_id is not None and self._tree_dir(cached_commit_id).exists():
+                changes = self._get_changes(ado_client, cached_commit_id, head_commit_id)
+                if changes is not None and len(changes) <= self.max_changed_files:
+                    self._apply_changes(ado_client, cached_commit_id, head_commit_id, changes)
+            if not self._tree_dir(head_commit_id).exists():
+                self._download_tree(ado_client, head_commit_id)
+        self._set_commit_id(head_commit_id)
+        return True
+
+    def list_files(self) -> list[str]:
+        if self.commit_id is None:
+            return []
+        tree_dir = self._tree_dir(self.commit_id)
+        return sorted(x.relative_to(tree_dir).as_posix() for x in tree_dir.rglob("*") if x.is_file())
+
+    def get_file(self, file_path: str) -> str:
+        """Reads a file from the mirror (call `refresh` first), decoded files are also kept in memory until the next refresh."""
+        if file_path not in self._decoded_files:
+            if self.commit_id is None:
+                raise ResourceNotFound("Nothing has been mirrored yet, call `refresh` first!")
+            local_path = self._local_path(self.commit_id, file_path)
+            if not local_path.is_file():
+                raise ResourceNotFound(f"File {file_path} not found in repo {self.repo.name} ({self.repo.repo_id})")
+            self._decoded_files[file_path] = local_path.read_text(encoding="utf-8")
+        return self._decoded_files[file_path]
+
+    def get_and_decode_file(self, file_path: str) -> dict[str, Any]:
+        file_content = self.get_file(file_path)
+        if file_path.endswith(".json"):
+            return json.loads(file_content)  # type: ignore[no-any-return]
+        if file_path.endswith(".yaml") or file_path.endswith(".yml"):
+            return yaml.safe_load(file_content)  # type: ignore[no-any-return]
+        raise TypeError("Can only decode .json, .yaml or .yml files!")
 
 
 # ====================================================================
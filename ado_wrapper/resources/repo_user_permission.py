@@ -5,8 +5,8 @@ from typing import TYPE_CHECKING, Any, Literal
 
 from ado_wrapper.resources.users import AdoUser
 from ado_wrapper.state_managed_abc import StateManagedResource
-from ado_wrapper.errors import ResourceNotFound, InvalidPermissionsError
-from ado_wrapper.utils import requires_initialisation
+from ado_wrapper.errors import ResourceNotFound, InvalidPermissionsError, UnknownError
+from ado_wrapper.utils import DEFAULT_MAX_WORKERS, requires_initialisation, run_concurrently
 
 PERMISSION_SET_ID = "2e9eb7ed-3c0a-47d4-87c1-0ffdd275fd87"  # This is global and hardcoded
 ActionType = Literal["Allow", "Deny", "Not set"]
@@ -62,6 +62,17 @@ flag_mapping = {  # Where is 1 & 256?
 }
 
 
+def _build_access_control_entry(descriptor: str, mapping: dict[PermissionType, ActionType]) -> dict[str, Any]:
+    """Folds a mapping of permission -> action into one ACE, OR'ing each permission's bit into the allow/deny masks."""
+    allow = deny = 0
+    for permission, action in mapping.items():
+        if action == "Allow":
+            allow |= flag_mapping[permission]
+        elif action == "Deny":
+            deny |= flag_mapping[permission]
+    return {"descriptor": descriptor, "allow": allow, "deny": deny}
+
+
 @dataclass
 class UserPermission:
     namespace_id: str = field(repr=False)
@@ -97,48 +108,68 @@ class UserPermission:
             raise ResourceNotFound("Couldn't find perms for that repo, descriptor combo.")
         return [UserPermission.from_request_payload(x) for x in request["subjectPermissions"]]
 
-    @classmethod
-    def set_by_group_descriptor(cls, ado_client: AdoClient, repo_id: str, group_descriptor: str, action: ActionType, permission: PermissionType) -> None:  # fmt: skip
+    @staticmethod
+    def _get_identity_descriptor(ado_client: AdoClient, repo_id: str, group_descriptor: str) -> str:
         requires_initialisation(ado_client)
-        IDENTITY_PAYLOAD = {"contributionIds": ["ms.vss-admin-web.security-view-permissions-data-provider"], "dataProviderContext": {"properties": {
-            "subjectDescriptor": group_descriptor, "permissionSetId": PERMISSION_SET_ID,
-            "permissionSetToken": f"repoV2/{ado_client.ado_project_id}/{repo_id}",
-        }}}  # fmt: skip
-        request = ado_client.session.post(
-            f"https://dev.azure.com/{ado_client.ado_org}/_apis/Contribution/HierarchyQuery?api-version=7.0-preview.1",
-            json=IDENTITY_PAYLOAD,
-        ).json()
-        identity_descriptor = request["dataProviders"]["ms.vss-admin-web.security-view-permissions-data-provider"]["identityDescriptor"]
-        # ====
-        PAYLOAD = {"token": f"repoV2/{ado_client.ado_project_id}/{repo_id}", "merge": True, "accessControlEntries": [
-            {"descriptor": identity_descriptor,
-             "allow": flag_mapping[permission] if action == "Allow" else 0, "deny": flag_mapping[permission] if action == "Deny" else 0,
-        }]}  # fmt: skip
+        if group_descriptor not in ado_client.identity_descriptors:
+            IDENTITY_PAYLOAD = {"contributionIds": ["ms.vss-admin-web.security-view-permissions-data-provider"], "dataProviderContext": {"properties": {
+                "subjectDescriptor": group_descriptor, "permissionSetId": PERMISSION_SET_ID,
+                "permissionSetToken": f"repoV2/{ado_client.ado_project_id}/{repo_id}",
+            }}}  # fmt: skip
+            request = ado_client.session.post(
+                f"https://dev.azure.com/{ado_client.ado_org}/_apis/Contribution/HierarchyQuery?api-version=7.0-preview.1",
+                json=IDENTITY_PAYLOAD,
+            ).json()
+            identity_descriptor = request["dataProviders"]["ms.vss-admin-web.security-view-permissions-data-provider"]["identityDescriptor"]
+            ado_client.identity_descriptors[group_descriptor] = identity_descriptor
+        return ado_client.identity_descriptors[group_descriptor]
+
+    @staticmethod
+    def _get_domain_container_ids(ado_client: AdoClient, emails: list[str]) -> dict[str, str]:
+        """Returns a mapping of email -> domain_container_id, fetching every user once if any of them aren't cached yet."""
+        if any(email not in ado_client.domain_container_ids for email in emails):
+            ado_client.domain_container_ids |= {user.email: user.domain_container_id for user in AdoUser.get_all(ado_client)}
+        missing = [email for email in emails if email not in ado_client.domain_container_ids]
+        if missing:
+            raise ResourceNotFound(f"Could not find users with the emails: {', '.join(missing)}")
+        return {email: ado_client.domain_container_ids[email] for email in emails}
+
+    @staticmethod
+    def _get_user_descriptor(email: str, domain_container_id: str) -> str:
+        return f"Microsoft.IdentityModel.Claims.ClaimsIdentity;{domain_container_id}\\{email}"
+
+    @staticmethod
+    def set_access_control_entries(ado_client: AdoClient, repo_id: str, access_control_entries: list[dict[str, Any]]) -> None:
+        """Sets (merges) many ACEs on a repo in one request, see `_build_access_control_entry` for making them."""
+        requires_initialisation(ado_client)
+        PAYLOAD = {"token": f"repoV2/{ado_client.ado_project_id}/{repo_id}", "merge": True, "accessControlEntries": access_control_entries}
         request = ado_client.session.post(
             f"https://dev.azure.com/{ado_client.ado_org}/_apis/AccessControlEntries/{PERMISSION_SET_ID}",
             json=PAYLOAD,
         )
         if request.status_code == 403:
-            raise InvalidPermissionsError("Cannot change the group's perms on this repo!")
-        assert request.status_code == 200
+            raise InvalidPermissionsError("Cannot change the perms on this repo!")
+        if request.status_code != 200:
+            raise UnknownError(f"Error setting the perms on repo {repo_id}! {request.status_code}, {request.text}")
+
+    @classmethod
+    def set_by_group_descriptor(cls, ado_client: AdoClient, repo_id: str, group_descriptor: str, action: ActionType, permission: PermissionType) -> None:  # fmt: skip
+        identity_descriptor = cls._get_identity_descriptor(ado_client, repo_id, group_descriptor)
+        try:
+            cls.set_access_control_entries(ado_client, repo_id, [_build_access_control_entry(identity_descriptor, {permission: action})])
+        except InvalidPermissionsError as e:
+            raise InvalidPermissionsError("Cannot change the group's perms on this repo!") from e
 
     @classmethod
     def set_by_user_email(cls, ado_client: AdoClient, repo_id: str, email: str, action: ActionType,
                              permission: PermissionType, domain_container_id: str = "") -> None:  # fmt: skip
-        requires_initialisation(ado_client)
         if not domain_container_id:
-            domain_container_id = AdoUser.get_by_email(ado_client, email).domain_container_id
-        PAYLOAD = {"token": f"repoV2/{ado_client.ado_project_id}/{repo_id}", "merge": True, "accessControlEntries": [
-            {"descriptor": f"Microsoft.IdentityModel.Claims.ClaimsIdentity;{domain_container_id}\\{email}",
-             "allow": flag_mapping[permission] if action == "Allow" else 0, "deny": flag_mapping[permission] if action == "Deny" else 0,
-        }]}  # fmt: skip
-        request = ado_client.session.post(
-            f"https://dev.azure.com/{ado_client.ado_org}/_apis/AccessControlEntries/{PERMISSION_SET_ID}",
-            json=PAYLOAD,
-        )
-        if request.status_code == 403:
-            raise InvalidPermissionsError("Cannot change the user's perms on this repo!")
-        assert request.status_code == 200
+            domain_container_id = cls._get_domain_container_ids(ado_client, [email])[email]
+        access_control_entry = _build_access_control_entry(cls._get_user_descriptor(email, domain_container_id), {permission: action})
+        try:
+            cls.set_access_control_entries(ado_client, repo_id, [access_control_entry])
+        except InvalidPermissionsError as e:
+            raise InvalidPermissionsError("Cannot change the user's perms on this repo!") from e
 
     @classmethod
     def remove_perm(cls, ado_client: AdoClient, repo_id: str, subject_email: str, domain_container_id: str = "") -> None:
@@ -155,10 +186,9 @@ class UserPermission:
 
 @dataclass
 class RepoUserPermissions(StateManagedResource):
-    @classmethod
-    def get_all_by_repo_id(cls, ado_client: AdoClient, repo_id: str, users_only: bool=True,
-                           ignore_inherits: bool=True, remove_not_set: bool=False) -> dict[str, list[UserPermission]]:  # fmt: skip
-        """Gets all user permissions for a repo, user_only removes groups"""
+    @staticmethod
+    def _get_identities(ado_client: AdoClient, repo_id: str, users_only: bool = True) -> dict[str, str]:
+        """Returns a mapping of descriptor -> display name for everyone with permissions on the repo."""
         requires_initialisation(ado_client)
         PAYLOAD =  {"contributionIds":["ms.vss-admin-web.security-view-members-data-provider"], "dataProviderContext": {"properties": {
             "permissionSetId": PERMISSION_SET_ID,
@@ -170,18 +200,16 @@ class RepoUserPermissions(StateManagedResource):
         ).json()["dataProviders"]["ms.vss-admin-web.security-view-members-data-provider"]
         if request is None:
             raise ResourceNotFound("Could not find any permissions for this repo! Does it exist?")
-        # We now make descriptor -> display_name mapping
-        groups_and_users = {
+        return {
             identity["descriptor"]: identity["principalName"] if identity["subjectKind"] == "group" else identity["displayName"]
             for identity in request["identities"]
             if not users_only or (identity["subjectKind"] != "group")  # If we're doing users only, don't include if it's a group
         }  # fmt: skip
-        # We then make user_name -> list[UserPermissions]
-        perms_mapping = {
-            name: UserPermission.get_by_subject_descriptor(ado_client, descriptor, repo_id)
-            for descriptor, name in groups_and_users.items()  # fmt: skip
-        }
-        # Then, if they want to remove inherited perms, we do that.
+
+    @staticmethod
+    def _filter_permissions(perms_mapping: dict[str, list[UserPermission]], ignore_inherits: bool,
+                            remove_not_set: bool) -> dict[str, list[UserPermission]]:  # fmt: skip
+        # If they want to remove inherited perms, we do that.
         filtered_perms = {
             user: perms for user, perms in perms_mapping.items() if not ignore_inherits or
             any(x.permission_display_string in ["Allow", "Deny"] for x in perms)  # fmt: skip
@@ -192,6 +220,34 @@ class RepoUserPermissions(StateManagedResource):
             for user, perms in filtered_perms.items()
         }
 
+    @classmethod
+    def get_all_by_repo_id(cls, ado_client: AdoClient, repo_id: str, users_only: bool=True, ignore_inherits: bool=True,
+                           remove_not_set: bool=False, max_workers: int = DEFAULT_MAX_WORKERS) -> dict[str, list[UserPermission]]:  # fmt: skip
+        """Gets all user permissions for a repo, user_only removes groups. Each identity's permissions are fetched concurrently."""
+        return cls.get_all_by_repo_ids(ado_client, [repo_id], users_only, ignore_inherits, remove_not_set, max_workers)[repo_id]
+
+    @classmethod
+    def get_all_by_repo_ids(cls, ado_client: AdoClient, repo_ids: list[str], users_only: bool=True, ignore_inherits: bool=True,
+                            remove_not_set: bool=False, max_workers: int = DEFAULT_MAX_WORKERS) -> dict[str, dict[str, list[UserPermission]]]:  # fmt: skip
+        """Same as `get_all_by_repo_id`, but for many repos, returns a mapping of repo_id -> user_name -> list[UserPermissions].
+        Every (repo, identity) lookup shares one pool, so one repo with hundreds of members doesn't hold up the rest."""
+        # We first make repo_id -> descriptor -> display_name mappings
+        identities, failures = run_concurrently(lambda repo_id: cls._get_identities(ado_client, repo_id, users_only), repo_ids, max_workers)
+        if failures:
+            raise failures[0][1]
+        # We then get the permissions for every (repo_id, descriptor) pair
+        pairs = [(repo_id, descriptor) for repo_id, groups_and_users in identities for descriptor in groups_and_users]
+        permissions, permission_failures = run_concurrently(
+            lambda pair: UserPermission.get_by_subject_descriptor(ado_client, pair[1], pair[0]), pairs, max_workers
+        )
+        if permission_failures:
+            raise permission_failures[0][1]
+        perms_mappings: dict[str, dict[str, list[UserPermission]]] = {repo_id: {} for repo_id in repo_ids}
+        names = dict(identities)
+        for (repo_id, descriptor), perms in permissions:
+            perms_mappings[repo_id][names[repo_id][descriptor]] = perms
+        return {repo_id: cls._filter_permissions(perms_mapping, ignore_inherits, remove_not_set) for repo_id, perms_mapping in perms_mappings.items()}  # fmt: skip
+
     @staticmethod
     def get_by_subject_descriptor(ado_client: AdoClient, repo_id: str, subject_descriptor: str) -> list[UserPermission]:
         return UserPermission.get_by_subject_descriptor(ado_client, subject_descriptor, repo_id)
@@ -213,18 +269,62 @@ class RepoUserPermissions(StateManagedResource):
     @classmethod
     def set_by_user_email_batch(cls, ado_client: AdoClient, repo_id: str, subject_email: str,
                                    mapping: dict[PermissionType, ActionType], domain_container_id: str = "") -> None:  # fmt: skip
-        """Does a batch job of updating permissions, updating all permissions for each user"""
-        if not domain_container_id:
-            domain_container_id = AdoUser.get_by_email(ado_client, subject_email).domain_container_id
-        for permission, action in mapping.items():
-            cls.set_by_user_email(ado_client, repo_id, subject_email, action, permission, domain_container_id)
+        """Does a batch job of updating permissions, setting all of the user's permissions in one request"""
+        domain_container_ids = {subject_email: domain_container_id} if domain_container_id else None
+        cls.set_all_permissions_for_repo(ado_client, repo_id, {subject_email: mapping}, domain_container_ids=domain_container_ids)
+
+    @classmethod
+    def _build_access_control_entries(cls, ado_client: AdoClient, repo_id: str, mapping: dict[str, dict[PermissionType, ActionType]],
+                                      group_mapping: dict[str, dict[PermissionType, ActionType]] | None = None,
+                                      domain_container_ids: dict[str, str] | None = None,
+                                      identity_descriptors: dict[str, str] | None = None) -> list[dict[str, Any]]:  # fmt: skip
+        domain_container_ids = domain_container_ids or UserPermission._get_domain_container_ids(ado_client, list(mapping.keys()))
+        identity_descriptors = identity_descriptors or cls._get_identity_descriptors(ado_client, repo_id, list(group_mapping or {}))
+        access_control_entries = [
+            _build_access_control_entry(UserPermission._get_user_descriptor(email, domain_container_ids[email]), permission_pairs)
+            for email, permission_pairs in mapping.items()
+        ]
+        for group_descriptor, permission_pairs in (group_mapping or {}).items():
+            access_control_entries.append(_build_access_control_entry(identity_descriptors[group_descriptor], permission_pairs))
+        return access_control_entries
+
+    @staticmethod
+    def _get_identity_descriptors(ado_client: AdoClient, repo_id: str, group_descriptors: list[str]) -> dict[str, str]:
+        """Returns a mapping of group_descriptor -> identity_descriptor, any repo will do, as they're the same for every repo."""
+        return {
+            group_descriptor: UserPermission._get_identity_descriptor(ado_client, repo_id, group_descriptor)
+            for group_descriptor in group_descriptors
+        }
+
+    @classmethod
+    def set_all_permissions_for_repo(cls, ado_client: AdoClient, repo_id: str, mapping: dict[str, dict[PermissionType, ActionType]],
+                                     group_mapping: dict[str, dict[PermissionType, ActionType]] | None = None,
+                                     domain_container_ids: dict[str, str] | None = None,
+                                     identity_descriptors: dict[str, str] | None = None) -> None:  # fmt: skip
+        """Takes a mapping of <user_email>: {permission_name: Allow | Deny | Not set}}, and optionally <group_descriptor>: {...}
+        Every identity's permissions are folded into one ACE, and all of them are sent in a single request."""
+        access_control_entries = cls._build_access_control_entries(
+            ado_client, repo_id, mapping, group_mapping, domain_container_ids, identity_descriptors
+        )
+        if access_control_entries:
+            UserPermission.set_access_control_entries(ado_client, repo_id, access_control_entries)
 
     @classmethod
-    def set_all_permissions_for_repo(cls, ado_client: AdoClient, repo_id: str, mapping: dict[str, dict[PermissionType, ActionType]]) -> None:  # fmt: skip
-        """Takes a mapping of <user_email>: {permission_name: Allow | Deny | Not set}}"""
-        domain_container_id = AdoUser.get_by_email(ado_client, list(mapping.keys())[0]).domain_container_id
-        for email, permission_pairs in mapping.items():
-            cls.set_by_user_email_batch(ado_client, repo_id, email, permission_pairs, domain_container_id)
+    def set_all_permissions_for_repos(cls, ado_client: AdoClient, repo_ids: list[str], mapping: dict[str, dict[PermissionType, ActionType]],
+                                      group_mapping: dict[str, dict[PermissionType, ActionType]] | None = None,
+                                      max_workers: int = DEFAULT_MAX_WORKERS) -> None:  # fmt: skip
+        """Applies the same mappings as `set_all_permissions_for_repo` to many repos concurrently, one request per repo.
+        User and group descriptors are resolved once up front, and the first failure is raised once every repo has been attempted."""
+        if not repo_ids:
+            return
+        domain_container_ids = UserPermission._get_domain_container_ids(ado_client, list(mapping.keys()))
+        identity_descriptors = cls._get_identity_descriptors(ado_client, repo_ids[0], list(group_mapping or {}))
+        _, failures = run_concurrently(
+            lambda repo_id: cls.set_all_permissions_for_repo(ado_client, repo_id, mapping, group_mapping, domain_container_ids, identity_descriptors),
+            repo_ids, max_workers=max_workers,
+        )  # fmt: skip
+        if failures:
+            raise failures[0][1]
 
     @classmethod
     def remove_perm(cls, ado_client: AdoClient, repo_id: str, subject_email: str, domain_container_id: str = "") -> None:
@@ -237,3 +337,122 @@ class RepoUserPermissions(StateManagedResource):
     @staticmethod
     def display_output_for_repo(mapping: dict[str, list[UserPermission]]) -> str:
         return "\n".join([user_name + "\n" + RepoUserPermissions.display_output(values) for user_name, values in mapping.items()])
+
+
+# ====================================================================
+
+
+def _combine_aces(parent: tuple[int, int], child: tuple[int, int]) -> tuple[int, int]:
+    """Takes two (allow, deny) bitmasks, where explicit bits on the child override inherited bits from the parent."""
+    parent_allow, parent_deny = parent
+    child_allow, child_deny = child
+    deny = child_deny | (parent_deny & ~child_allow)
+    allow = (child_allow | (parent_allow & ~child_deny)) & ~deny  # Deny wins when both are set at the same level
+    return allow, deny
+
+
+@dataclass
+class RepoPermissionAudit:
+    """A snapshot of every repo's permissions in the project, pulled from the access control lists in bulk (a handful of requests,
+    rather than one HierarchyQuery per identity per repo), so it can be queried as much as you like with no more network calls.
+    Permissions are stored per repo as descriptor -> (allow, deny) bitmasks (see `flag_mapping`), with project and organisation
+    level entries already folded into each repo that inherits permissions.
+    Only explicit entries are included, so users who get a permission through a group show up as that group, not themselves.
+    https://learn.microsoft.com/en-us/rest/api/azure/devops/security/access-control-lists/query?view=azure-devops-rest-7.1"""
+
+    identities: dict[str, str]  # descriptor -> display name
+    effective_permissions: dict[str, dict[str, tuple[int, int]]]  # repo_id -> descriptor -> (allow, deny)
+
+    @staticmethod
+    def _get_access_control_lists(ado_client: AdoClient, token: str, recurse: bool) -> list[dict[str, Any]]:
+        request = ado_client.session.get(
+            f"https://dev.azure.com/{ado_client.ado_org}/_apis/accesscontrollists/{PERMISSION_SET_ID}?token={token}&recurse={recurse}&api-version=7.1",
+        )
+        if request.status_code == 403:
+            raise InvalidPermissionsError("You do not have permission to read the repo access control lists!")
+        if request.status_code != 200:
+            raise UnknownError(f"Error getting access control lists for {token}: {request.text}")
+        return request.json()["value"]  # type: ignore[no-any-return]
+
+    @staticmethod
+    def _get_display_names(ado_client: AdoClient, descriptors: list[str], batch_size: int = 50) -> dict[str, str]:
+        """https://learn.microsoft.com/en-us/rest/api/azure/devops/ims/identities/read-identities?view=azure-devops-rest-7.1"""
+
+        def get_batch(batch: list[str]) -> dict[str, str]:
+            request = ado_client.session.get(
+                f"https://vssps.dev.azure.com/{ado_client.ado_org}/_apis/identities?descriptors={','.join(batch)}&api-version=7.1",
+            )
+            if request.status_code != 200:
+                raise UnknownError(f"Error resolving identities: {request.text}")
+            # Identities come back in the order they were requested, with None for any which couldn't be found
+            return {
+                descriptor: identity.get("customDisplayName") or identity["providerDisplayName"]
+                for descriptor, identity in zip(batch, request.json()["value"]) if identity is not None  # fmt: skip
+            }
+
+        batches = [descriptors[i : i + batch_size] for i in range(0, len(descriptors), batch_size)]
+        results, failures = run_concurrently(get_batch, batches)
+        if failures:
+            raise failures[0][1]
+        return {descriptor: display_name for _, names in results for descriptor, display_name in names.items()}
+
+    @classmethod
+    def from_project(cls, ado_client: AdoClient, repo_ids: list[str] | None = None) -> RepoPermissionAudit:
+        """Builds the audit for every repo in the project (or just repo_ids), branch level permissions are ignored."""
+        requires_initialisation(ado_client)
+        if repo_ids is None:
+            from ado_wrapper.resources.repo import Repo  # Stop circular import
+
+            repo_ids = [repo.repo_id for repo in Repo.get_all(ado_client)]
+        project_token = f"repoV2/{ado_client.ado_project_id}"
+        access_control_lists = cls._get_access_control_lists(ado_client, "repoV2", False)
+        access_control_lists += cls._get_access_control_lists(ado_client, project_token, True)
+        # token -> (inherits, descriptor -> (allow, deny))
+        aces_by_token = {
+            acl["token"]: (acl.get("inheritPermissions", True), {ace["descriptor"]: (ace["allow"], ace["deny"]) for ace in acl["acesDictionary"].values()})
+            for acl in access_control_lists
+        }  # fmt: skip
+        # Fold the organisation level entries into the project level ones, then those into each repo
+        organisation_aces = aces_by_token.get("repoV2", (True, {}))[1]
+        project_inherits, project_aces = aces_by_token.get(project_token, (True, {}))
+        parent_aces = {
+            descriptor: _combine_aces(organisation_aces.get(descriptor, (0, 0)) if project_inherits else (0, 0), project_aces.get(descriptor, (0, 0)))
+            for descriptor in (set(organisation_aces) if project_inherits else set()) | set(project_aces)
+        }  # fmt: skip
+        effective_permissions: dict[str, dict[str, tuple[int, int]]] = {}
+        for repo_id in repo_ids:
+            repo_inherits, repo_aces = aces_by_token.get(f"{project_token}/{repo_id}", (True, {}))
+            inherited_aces = parent_aces if repo_inherits else {}
+            effective_permissions[repo_id] = {
+                descriptor: _combine_aces(inherited_aces.get(descriptor, (0, 0)), repo_aces.get(descriptor, (0, 0)))
+                for descriptor in set(inherited_aces) | set(repo_aces)
+            }
+        all_descriptors = sorted({descriptor for aces in effective_permissions.values() for descriptor in aces})
+        return cls(cls._get_display_names(ado_client, all_descriptors), effective_permissions)
+
+    def _get_name(self, descriptor: str) -> str:
+        return self.identities.get(descriptor, descriptor)
+
+    def get_permissions(self, repo_id: str, descriptor_or_name: str) -> dict[PermissionType, ActionType]:
+        """Returns the effective permissions for an identity (by descriptor or display name) on a repo."""
+        matching_descriptors = [x for x in self.effective_permissions[repo_id] if descriptor_or_name in (x, self._get_name(x))]
+        allow, deny = self.effective_permissions[repo_id][matching_descriptors[0]] if matching_descriptors else (0, 0)
+        return {
+            permission: "Allow" if allow & bit else "Deny" if deny & bit else "Not set"  # type: ignore[misc]
+            for permission, bit in flag_mapping.items()
+        }
+
+    def get_identities_with_permission(self, permission: PermissionType, action: ActionType = "Allow") -> dict[str, list[str]]:
+        """Returns a mapping of identity display name -> repo_ids where that identity has the permission set to action.
+        E.g. `audit.get_identities_with_permission("force_push")` for everyone who can force push, and where."""
+        bit = flag_mapping[permission]
+        matches: dict[str, list[str]] = {}
+        for repo_id, aces in self.effective_permissions.items():
+            for descriptor, (allow, deny) in aces.items():
+                if (
+                    (action == "Allow" and allow & bit)
+                    or (action == "Deny" and deny & bit)
+                    or (action == "Not set" and not (allow | deny) & bit)
+                ):
+                    matches.setdefault(self._get_name(descriptor), []).append(repo_id)
+        return matches
@@ -1,10 +1,16 @@
+import heapq
+import itertools
 import time
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import TYPE_CHECKING, Any, Literal, TypedDict
 
+import requests
+
+from ado_wrapper.resources.agent_pools import AgentPool, AgentPoolMonitor
 from ado_wrapper.resources.builds import Build
 from ado_wrapper.state_managed_abc import StateManagedResource
+from ado_wrapper.errors import CreationFailed, ResourceNotFound, UnknownError
 from ado_wrapper.utils import from_ado_date_string, recursively_find_or_none
 
 if TYPE_CHECKING:
@@ -58,9 +64,12 @@ class Run(StateManagedResource):
                 f"/{ado_client.ado_project}/_apis/pipelines/{definition_id}/runs?api-version=6.1-preview.1",
                 {"templateParameters": template_variables, "repositories": {"refName": f"refs/heads/{source_branch}"}},
             )  # type: ignore[return-value]
-        except ValueError as e:
-            raise ValueError(
-                f"A template variable inputted is not allowed! {str(e).split('message')[1][3:].removesuffix(':').split('.')[0]}"
+        except CreationFailed as e:
+            if e.status_code != 400 or "message" not in str(e):  # Not a validation error, e.g. a 5xx
+                raise
+            raise CreationFailed(
+                f"A template variable inputted is not allowed! {str(e).split('message')[1][3:].removesuffix(':').split('.')[0]}",
+                e.status_code,
             ) from e
 
     @classmethod
@@ -131,6 +140,163 @@ class Run(StateManagedResource):
 
     @classmethod
     def get_latest(cls, ado_client: "AdoClient", definition_id: str) -> "Run | None":
-        all_runs = cls.get_all_by_definition(ado_client, definition_id)
-        runs_with_start = [x for x in all_runs if x.start_time is not None]
-        return max(runs_with_start, key=lambda run: run.start_time) if runs_with_start else None
+        """Runs are builds under the hood, so this finds the latest build (ordered server side), then gets it as a run."""
+        latest_build = Build.get_latest(ado_client, definition_id)
+        return cls.get_by_id(ado_client, definition_id, latest_build.build_id) if latest_build is not None else None
+
+
+# ========================================================================================================
+
+
+@dataclass
+class RunRequest:
+    """One run for `RunScheduler` to launch. Higher priorities are launched first, ties go in the order they were added.
+    `max_retries` is how many times to retry creating the run after a transient failure (a 429, 5xx, connection error or timeout)."""
+
+    definition_id: str
+    template_variables: dict[str, Any] = field(default_factory=dict)
+    branch_name: str = "main"
+    priority: int = 0
+    max_timeout_seconds: int | None = None
+    max_retries: int = 2
+
+
+@dataclass
+class RunSchedulerResult:
+    """Returned by `RunScheduler.run`, `runs` and `queue_wait_seconds` are in the same order as the requests were added."""
+
+    runs: list[Run | None]  # None if the request failed
+    failures: list[tuple[RunRequest, Exception]]
+    queue_wait_seconds: list[float]  # How long each request waited before being launched
+    elapsed_seconds: float
+
+    @property
+    def runs_per_minute(self) -> float:
+        return len([x for x in self.runs if x is not None]) / (self.elapsed_seconds / 60) if self.elapsed_seconds else 0.0
+
+    @property
+    def average_queue_wait_seconds(self) -> float:
+        return sum(self.queue_wait_seconds) / len(self.queue_wait_seconds) if self.queue_wait_seconds else 0.0
+
+
+class RunScheduler:
+    """Launches pipeline runs from a priority queue, keeping at most `max_in_flight` running at once, e.g.
+    scheduler = RunScheduler(ado_client, AgentPool.get_by_id(ado_client, pool_id))  # Or an int, or an AgentPoolMonitor
+    scheduler.add(RunRequest(definition_id, {"environment": "dev"}, priority=1))
+    result = scheduler.run()
+    Passing an AgentPool (or AgentPoolMonitor) throttles on the pools' live free slots, sampled once per poll, with an AgentPool
+    also capping the runs in flight at its size. Runs which exceed their timeout are cancelled, and runs which can't be polled
+    `max_poll_failures` times in a row are recorded as failures (they may still be running).
+    WARNING: `run` is a blocking operation, it will not return until every run has finished."""
+
+    def __init__(self, ado_client: "AdoClient", max_in_flight: "int | AgentPool | AgentPoolMonitor" = 5, poll_interval_seconds: int = 5,
+                 max_poll_failures: int = 5) -> None:  # fmt: skip
+        self.ado_client = ado_client
+        self.monitor: AgentPoolMonitor | None = None
+        self.max_in_flight: int | None = None  # Only None with a monitor, which throttles instead
+        if isinstance(max_in_flight, AgentPoolMonitor):
+            self.monitor = max_in_flight
+        elif isinstance(max_in_flight, AgentPool):
+            self.monitor, self.max_in_flight = AgentPoolMonitor([max_in_flight.agent_pool_id]), max_in_flight.pool_size
+        else:
+            self.max_in_flight = max_in_flight
+        self.poll_interval_seconds = poll_interval_seconds
+        self.max_poll_failures = max_poll_failures
+        self.requests: list[RunRequest] = []
+
+    def add(self, request: RunRequest) -> "RunScheduler":
+        self.requests.append(request)
+        return self
+
+    def get_capacity(self, in_flight_count: int) -> int:
+        """How many runs can be in flight at once, checked once per poll. With a monitor, this is the runs already in flight,
+        plus the pools' free slots (our queued runs have already been taken off those), or just what's in flight if sampling fails.
+        It's always at least 1, so with nothing in flight one run is still launched, e.g. for an elastic pool scaled down to 0 agents
+        (which only scales up once a job is queued), or one saturated by other people's jobs, rather than waiting forever."""
+        if self.monitor is None:
+            return self.max_in_flight  # type: ignore[return-value]
+        try:
+            self.monitor.sample(self.ado_client)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if not self.ado_client.suppress_warnings:
+                print(f"[ADO_WRAPPER] Could not sample agent pool capacity: {e}")
+            return max(in_flight_count, 1)
+        capacity = max(in_flight_count + self.monitor.get_free_slots(), 1)
+        return capacity if self.max_in_flight is None else min(capacity, self.max_in_flight)
+
+    @staticmethod
+    def _is_transient(exception: Exception) -> bool:
+        """Only throttling, server errors and network failures are worth retrying, anything else will fail the same way again."""
+        if isinstance(exception, (requests.ConnectionError, requests.Timeout)):
+            return True
+        return isinstance(exception, CreationFailed) and (exception.status_code == 429 or exception.status_code >= 500)
+
+    def _cancel(self, run: Run) -> None:
+        """Cancels the run's build directly, Build.update would also try to record it in the state, where runs are stored as Runs."""
+        try:
+            request = self.ado_client.session.patch(
+                f"https://dev.azure.com/{self.ado_client.ado_org}/{self.ado_client.ado_project}/_apis/build/builds/{run.run_id}?api-version=7.1",
+                json={"status": "cancelling"},
+            )
+            if request.status_code >= 300:
+                raise UnknownError(f"{request.status_code} - {request.text}")
+        except (requests.RequestException, UnknownError) as e:
+            if not self.ado_client.suppress_warnings:
+                print(f"[ADO_WRAPPER] Could not cancel run {run.run_id}: {e}")
+
+    def run(self) -> RunSchedulerResult:
+        start_time = time.monotonic()
+        counter = itertools.count()
+        # (priority, order, index, attempt), so the highest priority is launched first, then in the order they were added
+        queue = [(-request.priority, next(counter), index, 0) for index, request in enumerate(self.requests)]
+        heapq.heapify(queue)
+        retries: list[tuple[float, int, int, int]] = []  # (not before, order, index, attempt), re-queued once their backoff has passed
+        runs: list[Run | None] = [None] * len(self.requests)
+        queue_wait_seconds: list[float] = [0.0] * len(self.requests)
+        failures: list[tuple[RunRequest, Exception]] = []
+        in_flight: dict[int, tuple[Run, float]] = {}  # index -> (run, launch time)
+        poll_failures: dict[int, int] = {}  # index -> consecutive failed polls
+
+        while queue or retries or in_flight:
+            while retries and retries[0][0] <= time.monotonic():
+                _, _, index, attempt = heapq.heappop(retries)
+                heapq.heappush(queue, (-self.requests[index].priority, next(counter), index, attempt))
+            capacity = self.get_capacity(len(in_flight)) if queue else 0
+            while queue and len(in_flight) < capacity:
+                _, _, index, attempt = heapq.heappop(queue)
+                request = self.requests[index]
+                try:
+                    run = Run.create(self.ado_client, request.definition_id, request.template_variables, request.branch_name)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    if self._is_transient(e) and attempt < request.max_retries:
+                        heapq.heappush(retries, (time.monotonic() + 2**attempt, next(counter), index, attempt + 1))
+                    else:
+                        failures.append((request, e))
+                    continue
+                queue_wait_seconds[index] = time.monotonic() - start_time
+                in_flight[index] = (run, time.monotonic())
+            if not in_flight and not queue:
+                if retries:  # Only backed off requests are left, so wait for the first of them
+                    time.sleep(max(retries[0][0] - time.monotonic(), 0))
+                continue
+            time.sleep(self.poll_interval_seconds)
+            for index, (run, launch_time) in list(in_flight.items()):
+                request = self.requests[index]
+                try:
+                    run = Run.get_by_id(self.ado_client, request.definition_id, run.run_id)
+                except (requests.RequestException, ValueError, ResourceNotFound) as e:
+                    poll_failures[index] = poll_failures.get(index, 0) + 1
+                    if poll_failures[index] >= self.max_poll_failures:
+                        failures.append((request, e))
+                        del in_flight[index]
+                    continue  # Otherwise try again next poll
+                poll_failures.pop(index, None)
+                if run.status == "completed":
+                    runs[index] = run
+                    del in_flight[index]
+                elif request.max_timeout_seconds is not None and time.monotonic() - launch_time > request.max_timeout_seconds:
+                    self._cancel(run)
+                    timeout_error = TimeoutError(f"Run {run.run_id} did not complete within {request.max_timeout_seconds} seconds")
+                    failures.append((request, timeout_error))
+                    del in_flight[index]
+        return RunSchedulerResult(runs, failures, queue_wait_seconds, time.monotonic() - start_time)
@@ -3,9 +3,10 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Any, Literal
 
+from ado_wrapper.resources.environment import get_pipeline_permissions, set_pipeline_permissions
 from ado_wrapper.resources.users import Member
 from ado_wrapper.state_managed_abc import StateManagedResource
-from ado_wrapper.utils import requires_initialisation
+from ado_wrapper.utils import DEFAULT_MAX_WORKERS, requires_initialisation, run_concurrently
 
 if TYPE_CHECKING:
     from ado_wrapper.client import AdoClient
@@ -106,16 +107,123 @@ class ServiceEndpoint(StateManagedResource):
         )  # type: ignore[return-value]
 
     def update_pipeline_perms(self, ado_client: AdoClient, pipeline_id: str | Literal["all"]) -> dict[str, Any]:
-        """Updates the permissions of a service endpoint in a pipeline.
-        UNTESTED
-        https://learn.microsoft.com/en-us/rest/api/azure/devops/approvalsandchecks/pipeline-permissions/update-pipeline-permisions-for-resources?view=azure-devops-rest-7.1
+        """Authorises a pipeline (or every pipeline, with "all") to use the service endpoint, returning the endpoint's raw pipeline permissions.
+        https://learn.microsoft.com/en-us/rest/api/azure/devops/approvalsandchecks/pipeline-permissions/update-pipeline-permisions-for-resource?view=azure-devops-rest-7.1
         """
-        PAYLOAD = {
-            "resource": {"id": self.service_endpoint_id, "type": "endpoint", "name": ""},
-            "pipelines": [] if pipeline_id == "all" else [{"id": pipeline_id}],
-            "allPipelines": {"authorized": True, "authorizedBy": "null", "authorizedOn": "null"},
-        }
-        return ado_client.session.patch(  # type: ignore[no-any-return]
-            f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/pipelines/pipelinePermissions/endpoint/{self.service_endpoint_id}?api-version=7.1",
-            json=PAYLOAD,
-        ).json()
+        if pipeline_id == "all":
+            return set_pipeline_permissions(ado_client, "endpoint", self.service_endpoint_id, [], all_pipelines=True)
+        return set_pipeline_permissions(ado_client, "endpoint", self.service_endpoint_id, [pipeline_id])
+
+    def get_pipeline_permissions(self, ado_client: AdoClient) -> ServiceEndpointPipelinePermissions:
+        return ServiceEndpointPipelinePermissions.from_request_payload(
+            get_pipeline_permissions(ado_client, "endpoint", self.service_endpoint_id), self.service_endpoint_id
+        )
+
+    @staticmethod
+    def get_pipeline_permissions_many(ado_client: AdoClient, service_endpoint_ids: list[str],
+                                      max_workers: int = DEFAULT_MAX_WORKERS) -> dict[str, ServiceEndpointPipelinePermissions]:  # fmt: skip
+        """Gets the pipeline permissions of many service endpoints concurrently (once per unique endpoint), as {endpoint_id: permissions}."""
+
+        def get_permissions(service_endpoint_id: str) -> ServiceEndpointPipelinePermissions:
+            return ServiceEndpointPipelinePermissions.from_request_payload(
+                get_pipeline_permissions(ado_client, "endpoint", service_endpoint_id), service_endpoint_id
+            )
+
+        results, failures = run_concurrently(get_permissions, list(dict.fromkeys(service_endpoint_ids)), max_workers)
+        if failures:
+            raise failures[0][1]
+        return dict(results)
+
+    @staticmethod
+    def set_pipeline_permissions_many(ado_client: AdoClient, service_endpoint_ids: list[str], pipeline_ids: list[str], authorized: bool = True,
+                                      max_workers: int = DEFAULT_MAX_WORKERS) -> dict[str, ServiceEndpointPipelinePermissions]:  # fmt: skip
+        """(De)authorises every pipeline to use every service endpoint, with one request per unique endpoint, sent concurrently.
+        Returns each endpoint's permissions after the change, use `ServiceEndpointPermissionIndex` to skip ones already set."""
+
+        def set_permissions(service_endpoint_id: str) -> ServiceEndpointPipelinePermissions:
+            return ServiceEndpointPipelinePermissions.from_request_payload(
+                set_pipeline_permissions(ado_client, "endpoint", service_endpoint_id, pipeline_ids, authorized), service_endpoint_id
+            )
+
+        results, failures = run_concurrently(set_permissions, list(dict.fromkeys(service_endpoint_ids)), max_workers)
+        if failures:
+            raise failures[0][1]
+        return dict(results)
+
+
+# ====================================================================
+
+
+@dataclass
+class ServiceEndpointPipelinePermissions:
+    """Which pipelines can use a service endpoint.
+    https://learn.microsoft.com/en-us/rest/api/azure/devops/approvalsandchecks/pipeline-permissions/get?view=azure-devops-rest-7.1"""
+
+    service_endpoint_id: str
+    all_pipelines_authorized: bool
+    pipeline_ids: set[str]  # Only the pipelines which are authorised
+
+    @classmethod
+    def from_request_payload(cls, data: dict[str, Any], service_endpoint_id: str) -> ServiceEndpointPipelinePermissions:
+        return cls(
+            service_endpoint_id, bool((data.get("allPipelines") or {}).get("authorized")),
+            {str(x["id"]) for x in data.get("pipelines", []) if x.get("authorized", True)},  # fmt: skip
+        )
+
+    def can_use(self, pipeline_id: str) -> bool:
+        return self.all_pipelines_authorized or str(pipeline_id) in self.pipeline_ids
+
+
+@dataclass
+class ServiceEndpointPermissionIndex:
+    """A cached view of which pipelines can use which service endpoints, for answering queries without any requests, e.g.
+    index = ServiceEndpointPermissionIndex.from_endpoints(ado_client)  # Every endpoint in the project
+    index.get_endpoint_ids_for_pipeline("123")
+    index.set_pipeline_permissions(ado_client, ["endpoint-id"], ["123", "456"])  # Only sends requests for what's changed"""
+
+    permissions: dict[str, ServiceEndpointPipelinePermissions] = field(default_factory=dict)  # endpoint_id -> permissions
+
+    @classmethod
+    def from_endpoints(cls, ado_client: AdoClient, service_endpoint_ids: list[str] | None = None,
+                       max_workers: int = DEFAULT_MAX_WORKERS) -> ServiceEndpointPermissionIndex:  # fmt: skip
+        """Builds the index from the given endpoints, or every endpoint in the project if None."""
+        if service_endpoint_ids is None:
+            service_endpoint_ids = [endpoint.service_endpoint_id for endpoint in ServiceEndpoint.get_all(ado_client)]
+        return cls(ServiceEndpoint.get_pipeline_permissions_many(ado_client, service_endpoint_ids, max_workers))
+
+    def get_pipeline_ids(self, service_endpoint_id: str) -> set[str]:
+        """The pipelines explicitly authorised to use the endpoint (check `can_use` for endpoints open to every pipeline)."""
+        return self.permissions[service_endpoint_id].pipeline_ids
+
+    def get_endpoint_ids_for_pipeline(self, pipeline_id: str) -> list[str]:
+        return [endpoint_id for endpoint_id, permissions in self.permissions.items() if permissions.can_use(pipeline_id)]
+
+    def can_use(self, pipeline_id: str, service_endpoint_id: str) -> bool:
+        return service_endpoint_id in self.permissions and self.permissions[service_endpoint_id].can_use(pipeline_id)
+
+    def set_pipeline_permissions(self, ado_client: AdoClient, service_endpoint_ids: list[str], pipeline_ids: list[str],
+                                 authorized: bool = True, max_workers: int = DEFAULT_MAX_WORKERS) -> int:  # fmt: skip
+        """(De)authorises the pipelines to use the endpoints, only sending requests for endpoints (and pipelines) which need changing,
+        then updates the index. Endpoints which aren't in the index are fetched first. Returns how many endpoints were changed."""
+        missing_endpoint_ids = [endpoint_id for endpoint_id in service_endpoint_ids if endpoint_id not in self.permissions]
+        if missing_endpoint_ids:
+            self.permissions |= ServiceEndpoint.get_pipeline_permissions_many(ado_client, missing_endpoint_ids, max_workers)
+        changes = {
+            endpoint_id: [
+                pipeline_id for pipeline_id in dict.fromkeys(str(x) for x in pipeline_ids)
+                if (pipeline_id in self.permissions[endpoint_id].pipeline_ids) != authorized
+            ]
+            for endpoint_id in dict.fromkeys(service_endpoint_ids)
+        }  # fmt: skip
+        changes = {endpoint_id: changed_pipeline_ids for endpoint_id, changed_pipeline_ids in changes.items() if changed_pipeline_ids}
+
+        def set_permissions(endpoint_id: str) -> ServiceEndpointPipelinePermissions:
+            return ServiceEndpointPipelinePermissions.from_request_payload(
+                set_pipeline_permissions(ado_client, "endpoint", endpoint_id, changes[endpoint_id], authorized), endpoint_id
+            )
+
+        results, failures = run_concurrently(set_permissions, list(changes), max_workers)
+        self.permissions |= dict(results)
+        if failures:
+            raise failures[0][1]
+        return len(results)
@@ -1,17 +1,28 @@
 from __future__ import annotations
 
+import sqlite3
+import time
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import TYPE_CHECKING, Any, Literal
 
+from ado_wrapper.errors import ResourceNotFound, UpdateFailed
+from ado_wrapper.resources.projects import Project
 from ado_wrapper.resources.users import Member
 from ado_wrapper.state_managed_abc import StateManagedResource
-from ado_wrapper.utils import from_ado_date_string, requires_initialisation
+from ado_wrapper.utils import (
+    DEFAULT_MAX_WORKERS,
+    from_ado_date_string,
+    iterate_continuation_pages,
+    requires_initialisation,
+    run_concurrently,
+)
 
 if TYPE_CHECKING:
     from ado_wrapper.client import AdoClient
 
 VariableGroupEditableAttribute = Literal["variables"]
+DefinitionType = Literal["build", "release"]
 
 
 @dataclass
@@ -100,3 +111,232 @@ class VariableGroup(StateManagedResource):
     @classmethod
     def get_by_name(cls, ado_client: AdoClient, name: str) -> VariableGroup | None:
         return cls._get_by_abstract_filter(ado_client, lambda variable_group: variable_group.name == name)  # type: ignore[return-value, attr-defined]
+
+    def get_changed_variables(self, desired_variables: dict[str, str], remove_unlisted_variables: bool = True) -> dict[str, str | None]:
+        """Returns the variables which `desired_variables` would change, with None for ones which would be removed.
+        Secret variables (whose values ADO never returns) are always counted as changed if they're in `desired_variables`,
+        and are never removed."""
+        changed: dict[str, str | None] = {
+            key: value for key, value in desired_variables.items() if self.variables.get(key) is None or self.variables[key] != value
+        }
+        if remove_unlisted_variables:
+            changed |= {key: None for key, value in self.variables.items() if key not in desired_variables and value is not None}
+        return changed
+
+    def _put_variables(self, ado_client: AdoClient, variables: dict[str, str | None]) -> VariableGroup:
+        """Replaces every variable with one PUT. Existing secrets stay secret, and ones with a value of None are left unchanged."""
+        secret_names = {key for key, value in self.variables.items() if value is None}
+        payload = {
+            "variableGroupProjectReferences": [{"name": self.name, "description": self.description, "projectReference": {"name": ado_client.ado_project}}],
+            "name": self.name, "description": self.description, "type": "Vsts",
+            "variables": {key: {"value": value, "isSecret": key in secret_names} for key, value in variables.items()},  # fmt: skip
+        }
+        request = ado_client.session.put(
+            f"https://dev.azure.com/{ado_client.ado_org}/_apis/distributedtask/variablegroups/{self.variable_group_id}?api-version=7.1",
+            json=payload,
+        )
+        if request.status_code != 200:
+            raise UpdateFailed(f"Failed to update VariableGroup with id {self.variable_group_id}. \nReason:\n{request.text}")
+        return VariableGroup.from_request_payload(request.json())
+
+    @classmethod
+    def sync_many(
+        cls, ado_client: AdoClient, desired_variables: dict[str, dict[str, str]], snapshot: list[VariableGroup] | None = None,
+        remove_unlisted_variables: bool = True, max_retries: int = 3, max_workers: int = DEFAULT_MAX_WORKERS,  # fmt: skip
+    ) -> VariableGroupSyncResult:
+        """Makes the variables of many groups match `desired_variables` ({group_name: {key: value}}), with one PUT per changed group,
+        sent concurrently. Groups which are already up to date aren't sent at all, and `snapshot` (e.g. a previous `get_all`) saves fetching them.
+        A failed PUT (e.g. a conflict, or ADO's random update failures) re-fetches that group and retries, up to `max_retries` times.
+        Secret variables are never removed, others not in `desired_variables` are, unless `remove_unlisted_variables` is False."""
+        groups_by_name = {group.name: group for group in (snapshot if snapshot is not None else cls.get_all(ado_client))}
+        failures: list[tuple[str, Exception]] = [
+            (name, ResourceNotFound(f"Could not find variable group {name}!")) for name in desired_variables if name not in groups_by_name
+        ]
+        changed_group_names = [
+            name for name, variables in desired_variables.items()
+            if name in groups_by_name and groups_by_name[name].get_changed_variables(variables, remove_unlisted_variables)
+        ]  # fmt: skip
+
+        def sync_group(group: VariableGroup) -> VariableGroup:
+            for attempt in range(max_retries + 1):
+                variables: dict[str, str | None] = {
+                    key: value for key, value in group.variables.items() if value is None or not remove_unlisted_variables
+                }
+                variables.update(desired_variables[group.name])
+                try:
+                    return group._put_variables(ado_client, variables)  # pylint: disable=protected-access
+                except UpdateFailed:
+                    if attempt == max_retries:
+                        raise
+                time.sleep(2**attempt)
+                group = cls.get_by_id(ado_client, group.variable_group_id)  # Someone else may have changed it
+                if not group.get_changed_variables(desired_variables[group.name], remove_unlisted_variables):
+                    return group
+            raise AssertionError("Unreachable")  # pragma: no cover
+
+        results, put_failures = run_concurrently(sync_group, [groups_by_name[name] for name in changed_group_names], max_workers)
+        in_state = ado_client.state_manager.load_state()["resources"].get("VariableGroup", {})
+        for _, updated_group in results:
+            if updated_group.variable_group_id in in_state:
+                ado_client.state_manager.update_resource_in_state(cls.__name__, updated_group.variable_group_id, updated_group.to_json())  # type: ignore[arg-type]
+        return VariableGroupSyncResult(
+            [updated_group for _, updated_group in results],
+            [name for name in desired_variables if name in groups_by_name and name not in changed_group_names],
+            failures + [(group.name, exception) for group, exception in put_failures],
+        )
+
+
+@dataclass
+class VariableGroupSyncResult:
+    """Returned by `VariableGroup.sync_many`."""
+
+    updated: list[VariableGroup]
+    unchanged: list[str]  # The names of groups which were already up to date
+    failures: list[tuple[str, Exception]]  # (group name, exception)
+
+
+# ========================================================================================================
+
+
+@dataclass
+class IndexedVariableGroup:
+    project: str
+    variable_group_id: str
+    name: str
+
+
+@dataclass
+class IndexedDefinition:
+    project: str
+    definition_type: DefinitionType
+    definition_id: str
+    name: str
+
+
+class VariableReferenceIndex:
+    """An org-wide SQLite index of variable groups, build/release definitions, and which groups and variables each definition uses, e.g.
+    index = VariableReferenceIndex.from_organisation(ado_client)  # Crawls every project concurrently, reusing the client's session
+    index.get_definitions_referencing_group("my-secrets")
+    index.get_definitions_referencing_variable("DATABASE_URL")  # Directly, or through a group
+    index.add_projects(AdoClientPool(...).get_all_clients())  # Or index (or re-index) the projects of a client pool
+    Only variables set on the definitions themselves are indexed, not ones declared inside YAML files.
+    Uses an in-memory database unless a file name is given."""
+
+    def __init__(self, file_name: str = ":memory:") -> None:
+        self.connection = sqlite3.connect(file_name)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS variable_groups (project TEXT, variable_group_id TEXT, name TEXT, PRIMARY KEY (project, variable_group_id));
+            CREATE TABLE IF NOT EXISTS definitions (project TEXT, definition_type TEXT, definition_id TEXT, name TEXT, PRIMARY KEY (project, definition_type, definition_id));
+            CREATE TABLE IF NOT EXISTS variables (project TEXT, owner_type TEXT, owner_id TEXT, variable_name TEXT);
+            CREATE TABLE IF NOT EXISTS group_references (project TEXT, definition_type TEXT, definition_id TEXT, variable_group_id TEXT);
+            CREATE INDEX IF NOT EXISTS variables_variable_name ON variables (variable_name COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS group_references_variable_group_id ON group_references (variable_group_id);
+            """
+        )  # fmt: skip
+        self.connection.commit()
+
+    def __enter__(self) -> VariableReferenceIndex:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    @classmethod
+    def from_organisation(cls, ado_client: AdoClient, project_names: list[str] | None = None, file_name: str = ":memory:",
+                          max_workers: int = DEFAULT_MAX_WORKERS) -> VariableReferenceIndex:  # fmt: skip
+        """Crawls every project (or just `project_names`) concurrently, with one project id lookup for all of them."""
+        projects = [project for project in Project.get_all(ado_client) if project_names is None or project.name in project_names]
+        index = cls(file_name)
+        index.add_projects([ado_client.for_project(project.name, project.project_id) for project in projects], max_workers)
+        return index
+
+    def add_projects(self, project_clients: list[AdoClient], max_workers: int = DEFAULT_MAX_WORKERS) -> None:
+        """Fetches the variable groups, build definitions and release definitions of each project concurrently, then (re)indexes them."""
+        tasks = [(client, kind) for client in project_clients for kind in ("variable_groups", "build", "release")]
+        results, failures = run_concurrently(lambda task: self._fetch(*task), tasks, max_workers)
+        if failures:
+            raise failures[0][1]
+        projects = [(client.ado_project,) for client in project_clients]
+        for table in ["variable_groups", "definitions", "variables", "group_references"]:
+            self.connection.executemany(f"DELETE FROM {table} WHERE project = ?", projects)
+        for (client, kind), payloads in results:
+            self._insert(client.ado_project, kind, payloads)
+        self.connection.commit()
+
+    @staticmethod
+    def _fetch(ado_client: AdoClient, kind: str) -> list[dict[str, Any]]:
+        if kind == "variable_groups":
+            return [variable_group.to_json() for variable_group in VariableGroup.get_all(ado_client)]
+        if kind == "build":
+            url = f"https://dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/build/definitions?includeAllProperties=true&api-version=7.1"
+        else:
+            url = f"https://vsrm.dev.azure.com/{ado_client.ado_org}/{ado_client.ado_project}/_apis/release/definitions?$expand=variables,environments&api-version=7.1"
+        return [payload for page in iterate_continuation_pages(ado_client, url) for payload in page]
+
+    def _insert(self, project: str, kind: str, payloads: list[dict[str, Any]]) -> None:
+        variable_rows: list[tuple[str, str, str, str]] = []
+        if kind == "variable_groups":
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO variable_groups VALUES (?, ?, ?)", [(project, x["variable_group_id"], x["name"]) for x in payloads]
+            )
+            variable_rows = [(project, "variable_group", x["variable_group_id"], name) for x in payloads for name in x["variables"]]
+        else:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO definitions VALUES (?, ?, ?, ?)", [(project, kind, str(x["id"]), x["name"]) for x in payloads]
+            )
+            group_rows: list[tuple[str, str, str, str]] = []
+            for payload in payloads:
+                scopes = [payload] + payload.get("environments", [])  # Release environments have their own groups and variables
+                variable_group_ids = {
+                    str(group["id"] if isinstance(group, dict) else group)
+                    for scope in scopes
+                    for group in scope.get("variableGroups") or []
+                }
+                variable_names = {name for scope in scopes for name in scope.get("variables") or {}}
+                group_rows.extend((project, kind, str(payload["id"]), variable_group_id) for variable_group_id in variable_group_ids)
+                variable_rows.extend((project, kind, str(payload["id"]), name) for name in variable_names)
+            self.connection.executemany("INSERT INTO group_references VALUES (?, ?, ?, ?)", group_rows)
+        self.connection.executemany("INSERT INTO variables VALUES (?, ?, ?, ?)", variable_rows)
+
+    def get_variable_groups(self, name: str | None = None, variable_name: str | None = None, project: str | None = None) -> list[IndexedVariableGroup]:  # fmt: skip
+        """Returns the variable groups matching every filter passed in, `variable_name` matches groups which contain that variable."""
+        conditions: list[str] = []
+        parameters: list[Any] = []
+        contains_variable = "EXISTS (SELECT 1 FROM variables v WHERE v.owner_type = 'variable_group' AND v.owner_id = g.variable_group_id AND v.variable_name = ? COLLATE NOCASE)"  # fmt: skip
+        for condition, value in [("g.name = ?", name), ("g.project = ?", project), (contains_variable, variable_name)]:
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        where_clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.connection.execute(f"SELECT g.project, g.variable_group_id, g.name FROM variable_groups g{where_clause} ORDER BY g.project, g.name", parameters)  # fmt: skip
+        return [IndexedVariableGroup(*row) for row in rows]
+
+    def get_definitions_referencing_group(self, variable_group: str, project: str | None = None) -> list[IndexedDefinition]:
+        """Returns the build and release definitions which use a variable group, by name or id."""
+        variable_group_ids = {variable_group} | {x.variable_group_id for x in self.get_variable_groups(name=variable_group)}
+        return self._get_definitions(
+            f"SELECT project, definition_type, definition_id FROM group_references WHERE variable_group_id IN ({', '.join('?' * len(variable_group_ids))})",
+            list(variable_group_ids), project,
+        )  # fmt: skip
+
+    def get_definitions_referencing_variable(self, variable_name: str, include_groups: bool = True, project: str | None = None) -> list[IndexedDefinition]:  # fmt: skip
+        """Returns the build and release definitions which set a variable (case insensitive), or use a variable group which contains it."""
+        query = """SELECT project, owner_type AS definition_type, owner_id AS definition_id FROM variables
+            WHERE owner_type != 'variable_group' AND variable_name = ? COLLATE NOCASE"""
+        if include_groups:
+            query += """ UNION SELECT r.project, r.definition_type, r.definition_id FROM group_references r JOIN variables v
+                ON v.owner_type = 'variable_group' AND v.owner_id = r.variable_group_id WHERE v.variable_name = ? COLLATE NOCASE"""
+        return self._get_definitions(query, [variable_name, variable_name] if include_groups else [variable_name], project)
+
+    def _get_definitions(self, query: str, parameters: list[str], project: str | None) -> list[IndexedDefinition]:
+        rows = self.connection.execute(
+            f"""SELECT d.project, d.definition_type, d.definition_id, d.name FROM definitions d JOIN ({query}) m
+                ON d.project = m.project AND d.definition_type = m.definition_type AND d.definition_id = m.definition_id
+                {'WHERE d.project = ?' if project is not None else ''} ORDER BY d.project, d.definition_type, d.name""",
+            parameters + ([project] if project is not None else []),
+        )
+        return [IndexedDefinition(*row) for row in rows]
+
+    def close(self) -> None:
+        self.connection.close()
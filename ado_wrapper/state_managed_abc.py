@@ -3,7 +3,7 @@ from datetime import datetime
 from typing import TYPE_CHECKING, Any, Callable, Literal
 
 from ado_wrapper.plan_resources.plan_resource import PlannedStateManagedResource
-from ado_wrapper.errors import DeletionFailed, ResourceAlreadyExists, ResourceNotFound, UpdateFailed, InvalidPermissionsError  # fmt: skip
+from ado_wrapper.errors import CreationFailed, DeletionFailed, ResourceAlreadyExists, ResourceNotFound, UpdateFailed, InvalidPermissionsError  # fmt: skip
 from ado_wrapper.utils import extract_id, get_internal_field_names, get_resource_variables
 
 if TYPE_CHECKING:
@@ -92,7 +92,7 @@ class StateManagedResource:
                 raise InvalidPermissionsError(f"You do not have permission to create this {cls.__name__}! {request.text}")
             if request.status_code == 409:
                 raise ResourceAlreadyExists(f"The {cls.__name__} with that identifier already exist!")
-            raise ValueError(f"Error creating {cls.__name__}: {request.status_code} - {request.text}")
+            raise CreationFailed(f"Error creating {cls.__name__}: {request.status_code} - {request.text}", request.status_code)
         resource = cls.from_request_payload(request.json())
         if refetch:
             resource = cls._get_by_id(ado_client, extract_id(resource))
@@ -1,4 +1,6 @@
+import copy
 import json
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, Literal, TypedDict
@@ -29,12 +31,14 @@ class StateManager:
         self.ado_client = ado_client
         self.state_file_name = state_file_name
         self.run_id = str(uuid4())
+        self.lock = threading.RLock()  # Bulk operations modify state from many threads, and each change is a read-modify-write
 
         # If they have a state file name input, but the file doesn't exist:
         if self.state_file_name is not None and not Path(self.state_file_name).exists():
             self.wipe_state()  # Will automatically create the file
 
-        self.state: StateFileType = self.load_state() if self.state_file_name is not None else EMPTY_STATE
+        # Each in-memory state gets its own copy, otherwise every client without a state file would share (and mutate) one dict
+        self.state: StateFileType = self.load_state() if self.state_file_name is not None else copy.deepcopy(EMPTY_STATE)
 
     def load_state(self) -> StateFileType:
         if self.state_file_name is None:
@@ -55,32 +59,36 @@ class StateManager:
     # =======================================================================================================
 
     def add_resource_to_state(self, resource_type: ResourceType, resource_id: str, resource_data: dict[str, Any]) -> None:
-        all_states = self.load_state()
-        if resource_type not in all_states["resources"]:
-            all_states["resources"][resource_type] = {}
-        if resource_id in all_states["resources"][resource_type]:
-            self.remove_resource_from_state(resource_type, resource_id)
-        metadata = {"created_datetime": datetime.now().isoformat(), "run_id": self.run_id}
-        all_data = {resource_id: {"data": resource_data, "metadata": metadata, "lifecycle-policy": {}}}
-        all_states["resources"][resource_type] |= all_data
-        return self.write_state_file(all_states)
+        with self.lock:
+            all_states = self.load_state()
+            if resource_type not in all_states["resources"]:
+                all_states["resources"][resource_type] = {}
+            if resource_id in all_states["resources"][resource_type]:
+                self.remove_resource_from_state(resource_type, resource_id)
+            metadata = {"created_datetime": datetime.now().isoformat(), "run_id": self.run_id}
+            all_data = {resource_id: {"data": resource_data, "metadata": metadata, "lifecycle-policy": {}}}
+            all_states["resources"][resource_type] |= all_data
+            return self.write_state_file(all_states)
 
     def remove_resource_from_state(self, resource_type: ResourceType, resource_id: str) -> None:
-        all_states = self.load_state()
-        all_states["resources"][resource_type] = {k: v for k, v in all_states["resources"][resource_type].items() if k != resource_id}
-        return self.write_state_file(all_states)
+        with self.lock:
+            all_states = self.load_state()
+            all_states["resources"][resource_type] = {k: v for k, v in all_states["resources"][resource_type].items() if k != resource_id}
+            return self.write_state_file(all_states)
 
     def update_resource_in_state(self, resource_type: ResourceType, resource_id: str, updated_data: dict[str, Any]) -> None:
-        all_states = self.load_state()
-        all_states["resources"][resource_type][resource_id]["data"] = updated_data
-        all_states["resources"][resource_type][resource_id]["metadata"]["updated_datetime"] = datetime.now().isoformat()
-        return self.write_state_file(all_states)
+        with self.lock:
+            all_states = self.load_state()
+            all_states["resources"][resource_type][resource_id]["data"] = updated_data
+            all_states["resources"][resource_type][resource_id]["metadata"]["updated_datetime"] = datetime.now().isoformat()
+            return self.write_state_file(all_states)
 
     def update_lifecycle_policy(self, resource_type: ResourceType, resource_id: str,
                                 policy: Literal["prevent_destroy", "ignore_changes"]) -> None:  # fmt: skip
-        all_states = self.load_state()
-        all_states["resources"][resource_type][resource_id]["lifecycle-policy"] = policy
-        return self.write_state_file(all_states)
+        with self.lock:
+            all_states = self.load_state()
+            all_states["resources"][resource_type][resource_id]["lifecycle-policy"] = policy
+            return self.write_state_file(all_states)
     # =======================================================================================================
 
     def delete_resource(self, resource_type: ResourceType, resource_id: str) -> None:
@@ -122,7 +130,7 @@ class StateManager:
         self.add_resource_to_state(resource_type, resource_id, data)
 
     def wipe_state(self) -> None:
-        self.write_state_file(EMPTY_STATE)
+        self.write_state_file(copy.deepcopy(EMPTY_STATE))
 
     def generate_in_memory_state(self) -> StateFileType:
         """This method goes through every resource in state and updates it to the latest version in real world space"""
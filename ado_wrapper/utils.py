@@ -1,13 +1,24 @@
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import fields
 from datetime import datetime, timezone
-from typing import TYPE_CHECKING, Literal, overload, Any
+from typing import IO, TYPE_CHECKING, Any, Literal, TypeVar, overload
 
-from ado_wrapper.errors import ConfigurationError
+from ado_wrapper.errors import ConfigurationError, UnknownError
 
 if TYPE_CHECKING:
+    import requests
+
     from ado_wrapper.client import AdoClient
     from ado_wrapper.state_managed_abc import StateManagedResource
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB, small chunks spend more time in Python than on the network
+ProgressCallback = Callable[[int, "int | None"], None]  # (bytes downloaded so far, total bytes if known)
+DEFAULT_MAX_WORKERS = 8  # Enough to hide network latency without ADO rate limiting us
+
+ItemType = TypeVar("ItemType")
+ResultType = TypeVar("ResultType")
+
 
 @overload
 def from_ado_date_string(date_string: str) -> datetime:
@@ -112,6 +123,56 @@ def recursively_find_or_none(data: dict[str, Any], indexes: list[str]) -> Any:
     return current
 
 
+def stream_response_to_file(response: "requests.Response", file: IO[bytes], chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                            progress_callback: ProgressCallback | None = None) -> int:  # fmt: skip
+    """Writes a (stream=True) response into an open file in chunks, so the body is never held in memory. Returns the bytes written."""
+    total_size = int(response.headers["Content-Length"]) if "Content-Length" in response.headers else None
+    downloaded = 0
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        file.write(chunk)
+        downloaded += len(chunk)
+        if progress_callback is not None:
+            progress_callback(downloaded, total_size)
+    return downloaded
+
+
+def run_concurrently(function: Callable[[ItemType], ResultType], items: Iterable[ItemType], max_workers: int = DEFAULT_MAX_WORKERS,
+                     on_complete: Callable[[ItemType, ResultType], None] | None = None,
+                     ) -> tuple[list[tuple[ItemType, ResultType]], list[tuple[ItemType, Exception]]]:  # fmt: skip
+    """Calls `function` on every item, with at most `max_workers` calls running at once (the session is shared between them).
+    Returns ([(item, result), ...], [(item, exception), ...]), results are in the same order as `items`, and one call raising
+    doesn't stop the rest. `on_complete` is called from the calling thread as each call finishes, so it doesn't need to be thread safe."""
+    items = list(items)
+    results: dict[int, ResultType] = {}
+    failures: list[tuple[ItemType, Exception]] = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(function, item): index for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                failures.append((items[index], e))
+                continue
+            if on_complete is not None:
+                on_complete(items[index], results[index])
+    return [(items[index], results[index]) for index in sorted(results)], failures
+
+
+def iterate_continuation_pages(ado_client: "AdoClient", url: str) -> Iterator[list[dict[str, Any]]]:
+    """Yields the "value" list of each page of a listing endpoint, following the `x-ms-continuationtoken` response header
+    until there are no pages left. `url` should already contain its query string (e.g. `?api-version=7.1`)."""
+    continuation_token = None
+    while True:
+        request = ado_client.session.get(url + (f"&continuationToken={continuation_token}" if continuation_token else ""))
+        if request.status_code != 200:
+            raise UnknownError(f"Error fetching {url}! {request.status_code}, {request.text}")
+        yield request.json()["value"]
+        continuation_token = request.headers.get("x-ms-continuationtoken")
+        if not continuation_token:
+            return
+
+
 def get_resource_variables() -> dict[str, type["StateManagedResource"]]:  # We do this to avoid circular imports
     """This returns a mapping of resource name (str) to the class type of the resource. This is used to dynamically create instances of resources."""
     from ado_wrapper.resources import (  # type: ignore[attr-defined]  # pylint: disable=possibly-unused-variable
@@ -2,7 +2,7 @@ from datetime import datetime
 
 import pytest
 
-from ado_wrapper.resources.agent_pools import AgentPool
+from ado_wrapper.resources.agent_pools import Agent, AgentPool, AgentPoolCapacity, AgentPoolMonitor
 from tests.setup_client import setup_client, existing_agent_pool_id
 
 
@@ -64,6 +64,45 @@ class TestAgentPool:
     #     # =====
     #     agent_pool.delete(self.ado_client)
 
+    @pytest.mark.from_request_payload
+    def test_agent_from_request_payload(self) -> None:
+        agent = Agent.from_request_payload(
+            {
+                "id": 1,
+                "name": "test-agent",
+                "version": "3.240.1",
+                "status": "online",
+                "enabled": True,
+                "systemCapabilities": {"Agent.OS": "Linux", "docker": "1"},
+                "userCapabilities": {"docker": "2"},
+                "assignedRequest": {
+                    "requestId": 5,
+                    "poolId": 123,
+                    "assignTime": "2024-01-01T01:01:01.001Z",
+                    "definition": {"name": "build"},
+                },
+            }
+        )
+        assert agent.agent_id == "1"
+        assert agent.capabilities == {"Agent.OS": "Linux", "docker": "2"}
+        assert agent.current_job is not None and agent.current_job.request_id == "5"
+        assert agent.current_job.definition_name == "build"
+        capacity = AgentPoolCapacity("123", "test-agent-pool", 4, 3, 1, 1, datetime.now())
+        assert capacity.idle_agents == 2
+        assert capacity.free_slots == 1
+        assert round(capacity.utilisation, 2) == 0.33
+
+    @pytest.mark.get_all
+    def test_get_capacity(self) -> None:
+        agent_pool = AgentPool.get_by_id(self.ado_client, existing_agent_pool_id)
+        agents = agent_pool.get_agents(self.ado_client)
+        capacity = agent_pool.get_capacity(self.ado_client)
+        assert capacity.total_agents == len(agents)
+        assert capacity.busy_agents <= capacity.total_agents
+        monitor = AgentPoolMonitor([existing_agent_pool_id])
+        assert monitor.sample(self.ado_client)[existing_agent_pool_id].total_agents == len(agents)
+        assert monitor.get_free_slots() >= 0
+
     @pytest.mark.get_by_id
     def test_get_by_id(self) -> None:
         agent_pool = AgentPool.get_by_id(self.ado_client, existing_agent_pool_id)
@@ -1 +1,66 @@
-pass
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from ado_wrapper.resources.audit_logs import AuditLog, AuditLogStore, AuditLogWatermark
+
+AUDIT_LOG_PAYLOAD = {
+    "id": "999999999999999999;00000000-0000-0000-0000-000000000000;00000000-0000-0000-0000-000000000000",
+    "correlationId": "00000000-0000-0000-0000-000000000000",
+    "activityId": "00000000-0000-0000-0000-000000000000",
+    "actorUserId": "00000000-0000-0000-0000-000000000000",
+    "actorClientId": "00000000-0000-0000-0000-000000000000",
+    "actorUPN": "first.last@example.com",
+    "authenticationMechanism": "PAT_Unscoped authorizationId:<32_char_uuid>",
+    "timestamp": "2024-01-01T01:01:01.01Z",
+    "scopeType": "organization",
+    "scopeDisplayName": "<org_name> (Organization)",
+    "scopeId": "00000000-0000-0000-0000-000000000000",
+    "projectId": "00000000-0000-0000-0000-000000000000",
+    "projectName": None,
+    "ipAddress": "128.128.128.128",
+    "userAgent": "VSServices/128.128.123456.0",
+    "actionId": "Library.AgentAdded",
+    "data": {"agentName": "test-agent"},
+    "details": "Added agent <agent_name> to pool <pool_name>.",
+    "area": "Library",
+    "category": "modify",
+    "categoryDisplayName": "Modify",
+    "actorDisplayName": "First Last",
+}
+
+
+class TestAuditLog:
+    @pytest.mark.from_request_payload
+    def test_from_request_payload(self) -> None:
+        audit_log = AuditLog.from_request_payload(AUDIT_LOG_PAYLOAD)
+        assert audit_log.action_id == "Library.AgentAdded"
+        assert audit_log.actor_UPN == "first.last@example.com"
+        assert audit_log.created_on == datetime(2024, 1, 1, 1, 1, 1)
+        assert audit_log.to_json() == AuditLog.from_json(audit_log.to_json()).to_json()
+
+    def test_jsonl_round_trip(self, tmp_path: Path) -> None:
+        audit_log = AuditLog.from_request_payload(AUDIT_LOG_PAYLOAD)
+        AuditLog.append_to_jsonl(str(tmp_path / "logs.jsonl"), [audit_log, audit_log])
+        assert list(AuditLog.read_jsonl(str(tmp_path / "logs.jsonl"))) == [audit_log, audit_log]
+
+    def test_watermark_round_trip(self, tmp_path: Path) -> None:
+        file_name = str(tmp_path / "watermark.json")
+        assert AuditLogWatermark.load(file_name) == AuditLogWatermark()
+        AuditLogWatermark(datetime(2024, 1, 1, 1, 1, 1), ["id-1", "id-2"]).save(file_name)
+        assert AuditLogWatermark.load(file_name) == AuditLogWatermark(datetime(2024, 1, 1, 1, 1, 1), ["id-1", "id-2"])
+
+    def test_store_query(self) -> None:
+        with AuditLogStore() as store:
+            store.add([
+                AuditLog.from_request_payload(AUDIT_LOG_PAYLOAD),
+                AuditLog.from_request_payload(AUDIT_LOG_PAYLOAD | {"id": "2", "area": "Git", "timestamp": "2024-02-01T01:01:01Z"}),
+                AuditLog.from_request_payload(AUDIT_LOG_PAYLOAD | {"id": "3", "actorUPN": "other@example.com"}),
+            ])  # fmt: skip
+            store.add([AuditLog.from_request_payload(AUDIT_LOG_PAYLOAD)])  # Duplicates are ignored
+            assert len(store) == 3
+            assert [x.audit_log_id for x in store.query(area="Git")] == ["2"]
+            assert len(store.query(actor_upn="FIRST.LAST@example.com")) == 2
+            assert len(store.query(action_id="Library.AgentAdded", start_time=datetime(2024, 1, 15))) == 1
+            assert store.get_latest_timestamp() == datetime(2024, 2, 1, 1, 1, 1)
@@ -60,3 +60,9 @@ class TestBranch:
             # assert len(active_branches) == 2
 
             branch.delete(self.ado_client)
+
+    def test_get_head_commit_id(self) -> None:
+        with RepoContextManager(self.ado_client, "get-head-commit-id") as repo:
+            commit = Commit.create(self.ado_client, repo.repo_id, "main", "test-branch", {"text.txt": "Contents"}, "add", "Commmit 1")
+            assert Branch.get_head_commit_id(self.ado_client, repo.repo_id, "test-branch") == commit.commit_id
+            assert Branch.get_head_commit_id(self.ado_client, repo.repo_id, "test") is None  # Prefixes don't count
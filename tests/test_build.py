@@ -1,8 +1,14 @@
+import io
+import zipfile
 from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
 
 import pytest
+import requests
 
-from ado_wrapper.resources.builds import Build, BuildDefinition
+from ado_wrapper.resources.builds import Build, BuildArtifact, BuildDefinition, BuildLog, BuildTimelineRecord
 from ado_wrapper.resources.commits import Commit
 from ado_wrapper.resources.users import Member
 from tests.setup_client import (
@@ -108,6 +114,118 @@ class TestBuild:
             build_definition.delete(self.ado_client)  # Can't delete build_definitions without deleting builds first
             build.delete(self.ado_client)
 
+    def test_get_latest_by_definitions(self) -> None:
+        with RepoContextManager(self.ado_client, "get-latest-builds") as repo:
+            Commit.create(self.ado_client, repo.repo_id, "main", "my-branch", {"build.yaml": BUILD_YAML_FILE}, "add", "Update")
+            build_definition = BuildDefinition.create(
+                self.ado_client, "ado_wrapper-test-build-for-get-latest", repo.repo_id, repo.name, "build.yaml",
+                f"Please contact {email} if you see this build definition!", existing_agent_pool_id, "my-branch",  # fmt: skip
+            )
+            assert Build.get_latest(self.ado_client, build_definition.build_definition_id) is None  # Nothing has started yet
+            latest_builds = Build.get_latest_by_definitions(self.ado_client, [build_definition.build_definition_id, "-1"])
+            assert latest_builds == {build_definition.build_definition_id: None, "-1": None}
+            build_definition.delete(self.ado_client)
+
+    def test_query(self) -> None:
+        with RepoContextManager(self.ado_client, "query-builds") as repo:
+            Commit.create(self.ado_client, repo.repo_id, "main", "my-branch", {"build.yaml": BUILD_YAML_FILE}, "add", "Update")
+            build_definition = BuildDefinition.create(
+                self.ado_client, "ado_wrapper-test-build-for-query", repo.repo_id, repo.name, "build.yaml",
+                f"Please contact {email} if you see this build definition!", existing_agent_pool_id, "my-branch",  # fmt: skip
+            )
+            build = Build.create(self.ado_client, build_definition.build_definition_id, "refs/heads/my-branch")
+            definition_ids = [build_definition.build_definition_id]
+            assert [x.build_id for x in Build.query(self.ado_client, definition_ids, branch_name="my-branch")] == [build.build_id]
+            assert not list(Build.query(self.ado_client, definition_ids, branch_name="other-branch"))
+            assert not list(Build.query(self.ado_client, definition_ids, result="failed", status="completed"))
+            build_definition.delete(self.ado_client)
+
+    @pytest.mark.from_request_payload
+    def test_logs_and_timeline_from_request_payload(self) -> None:
+        log = BuildLog.from_request_payload({"id": 3, "lineCount": 120, "createdOn": "2021-10-01T00:00:00Z", "lastChangedOn": "2021-10-01T00:00:00Z"})  # fmt: skip
+        assert log.log_id == 3
+        assert log.line_count == 120
+        record = BuildTimelineRecord.from_request_payload(
+            {"id": "abc", "parentId": "def", "type": "Task", "name": "Run a one-line script", "state": "completed", "result": "succeeded",
+             "startTime": "2021-10-01T00:00:00Z", "finishTime": "2021-10-01T00:01:00Z", "log": {"id": 3}, "errorCount": 0, "order": 2}  # fmt: skip
+        )
+        assert record.log_id == 3
+        assert record.record_type == "Task"
+        assert record.result == "succeeded"
+
+    @pytest.mark.skip(reason="This requires waiting for build agents, and running a whole build")
+    def test_tail_logs(self) -> None:
+        with RepoContextManager(self.ado_client, "tail-build-logs") as repo:
+            Commit.create(self.ado_client, repo.repo_id, "main", "my-branch", {"build.yaml": BUILD_YAML_FILE}, "add", "Update")
+            build_definition = BuildDefinition.create(
+                self.ado_client, "ado_wrapper-test-build-for-tail-logs", repo.repo_id, repo.name, "build.yaml",
+                f"Please contact {email} if you see this build definition!", existing_agent_pool_id, "my-branch",  # fmt: skip
+            )
+            build = Build.create(self.ado_client, build_definition.build_definition_id, "my-branch")
+            lines: list[str] = []
+            build = build.tail_logs(self.ado_client, lambda _, line: lines.append(line), max_timeout_seconds=300)
+            assert build.status == "completed"
+            assert any("Hello, world!" in line for line in lines)
+            assert any(record.name == "Run a one-line script" for record in build.get_timeline(self.ado_client))
+            build_definition.delete(self.ado_client)
+
+    @pytest.mark.from_request_payload
+    def test_artifact_from_request_payload(self) -> None:
+        artifact = BuildArtifact.from_request_payload(
+            {"id": 12, "name": "drop", "resource": {"type": "Container", "data": "#/123/drop",
+             "downloadUrl": "https://dev.azure.com/org/project/_apis/build/builds/1/artifacts?artifactName=drop&$format=zip"}}  # fmt: skip
+        )
+        assert artifact.artifact_id == "12"
+        assert artifact.name == "drop"
+        assert artifact.resource_type == "Container"
+        assert artifact.download_url.endswith("$format=zip")
+
+
+class FakeArtifactSession:
+    """Serves `body` like the artifact download endpoint (honouring Range headers), recording the Range header of each request."""
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.range_headers: list[str | None] = []
+
+    def get(self, url: str, headers: dict[str, str] | None = None, **_: Any) -> requests.Response:
+        range_header = (headers or {}).get("Range")
+        self.range_headers.append(range_header)
+        start = int(range_header.removeprefix("bytes=").removesuffix("-")) if range_header else 0
+        response = requests.Response()
+        response.status_code = 416 if start >= len(self.body) else 206 if range_header else 200
+        response.raw = io.BytesIO(self.body[start:])
+        response.headers["Content-Length"] = str(max(len(self.body) - start, 0))
+        return response
+
+
+class TestBuildArtifactDownload:
+    def setup_method(self) -> None:
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w") as zip_file:
+            zip_file.writestr("drop/coverage.xml", "<coverage/>" * 100)
+            zip_file.writestr("drop/readme.txt", "Hello")
+        self.body = zip_buffer.getvalue()
+        self.session = FakeArtifactSession(self.body)
+        self.ado_client: Any = SimpleNamespace(session=self.session)
+        self.artifact = BuildArtifact("12", "drop", "Container", "https://dev.azure.com/org/project/_apis/build/builds/1/artifacts")
+
+    def test_download_artifact_resumes_partial_download(self, tmp_path: Path) -> None:
+        Path(tmp_path, "drop.zip.part").write_bytes(self.body[:100])
+        zip_path = Build.download_artifact(
+            self.ado_client, self.artifact, str(tmp_path / "drop.zip"), str(tmp_path / "out"), file_patterns=["*.xml"]
+        )
+        assert self.session.range_headers == ["bytes=100-"]  # Only the rest was requested
+        assert zip_path.read_bytes() == self.body
+        assert not Path(tmp_path, "drop.zip.part").exists()
+        assert [x.name for x in Path(tmp_path, "out", "drop").iterdir()] == ["coverage.xml"]
+
+    def test_download_artifact_already_complete(self, tmp_path: Path) -> None:
+        Path(tmp_path, "drop.zip.part").write_bytes(self.body)
+        zip_path = Build.download_artifact(self.ado_client, self.artifact, str(tmp_path / "drop.zip"))
+        assert self.session.range_headers == [f"bytes={len(self.body)}-"]  # Answered with a 416, so nothing is written
+        assert zip_path.read_bytes() == self.body
+
 
 # ======================================================================================================================
 
@@ -1,6 +1,6 @@
 import pytest
 
-from ado_wrapper.resources.commits import Commit
+from ado_wrapper.resources.commits import Commit, PushBuilder
 from tests.setup_client import RepoContextManager, setup_client
 
 
@@ -55,3 +55,25 @@ class TestCommit:
             all_commits = Commit.get_all_by_repo(self.ado_client, repo.repo_id, "new-branch")
             assert len(all_commits) == 2 + 1  # 1 For the initial README commit
             assert all(isinstance(commit, Commit) for commit in all_commits)
+
+    def test_get_all_with_filters(self) -> None:
+        with RepoContextManager(self.ado_client, "get-all-commits-with-filters") as repo:
+            Commit.create(self.ado_client, repo.repo_id, "main", "main", {"src/test.txt": "This is one thing"}, "add", "Test commit 1")
+            Commit.create(
+                self.ado_client, repo.repo_id, "main", "main", {"docs/test2.txt": "This is something else"}, "add", "Test commit 2"
+            )
+            assert [x.message for x in Commit.get_all_by_repo(self.ado_client, repo.repo_id, "main", item_path="/src")] == ["Test commit 1"]
+            assert len(Commit.get_all_by_repo(self.ado_client, repo.repo_id, "main", top=2)) == 2
+            assert len(list(Commit.iterate_by_repo(self.ado_client, repo.repo_id, "main", page_size=1))) == 2 + 1  # 1 For the README
+
+    def test_push_builder(self) -> None:
+        with RepoContextManager(self.ado_client, "push-builder") as repo:
+            commits = (
+                PushBuilder(repo.repo_id, "main")
+                .add("test.txt", "This is one thing").add("image.bin", bytes(range(256))).commit("Test commit 1")
+                .edit("test.txt", "This is something else").rename("image.bin", "renamed.bin").delete("README.md").commit("Test commit 2")
+                .push(self.ado_client)
+            )  # fmt: skip
+            assert [commit.message for commit in commits] == ["Test commit 1", "Test commit 2"]
+            latest_commit = Commit.get_latest_by_repo(self.ado_client, repo.repo_id, "main")
+            assert latest_commit is not None and latest_commit.commit_id == commits[-1].commit_id
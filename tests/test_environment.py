@@ -81,17 +81,40 @@ class TestEnvironment:
             build_def = BuildDefinition.create(
                 self.ado_client, repo.name, repo.repo_id, repo.name, "build.yaml", "", existing_agent_pool_id,
             )  # fmt: skip
+            environment = Environment.create(self.ado_client, "ado_wrapper-test-environment-pipeline-perms", "test environment")
+            # ---
+            perms = environment.get_pipeline_permissions(self.ado_client)
+            assert perms is not None
+            environment.add_pipeline_permission(self.ado_client, build_def.build_definition_id)
+            new_perms = environment.get_pipeline_permissions(self.ado_client)
+            assert len(new_perms) == 1
+            environment.remove_pipeline_permissions(self.ado_client, build_def.build_definition_id)
+            final_perms = environment.get_pipeline_permissions(self.ado_client)
+            assert len(final_perms) == 0
+            # ---
+            build_def.delete(self.ado_client)
+            environment.delete(self.ado_client)
 
-        environment = Environment.create(self.ado_client, "ado_wrapper-test-environment-pipeline-perms", "test environment")
-        # ---
-        perms = environment.get_pipeline_permissions(self.ado_client)
-        assert perms is not None
-        environment.add_pipeline_permission(self.ado_client, build_def.build_definition_id)
-        new_perms = environment.get_pipeline_permissions(self.ado_client)
-        assert len(new_perms) == 1
-        environment.remove_pipeline_permissions(self.ado_client, build_def.build_definition_id)
-        final_perms = environment.get_pipeline_permissions(self.ado_client)
-        assert len(final_perms) == 0
-        # ---
-        build_def.delete(self.ado_client)
-        environment.delete(self.ado_client)
+    def test_pipeline_perms_batch(self) -> None:
+        with RepoContextManager(self.ado_client, "pipeline_perms_batch") as repo:
+            Commit.create(self.ado_client, repo.repo_id, "main", "my-branch", {"build.yaml": BUILD_YAML_FILE}, "add", "test commit")
+            build_defs = [
+                BuildDefinition.create(
+                    self.ado_client, f"{repo.name}-{i}", repo.repo_id, repo.name, "build.yaml", "", existing_agent_pool_id
+                )
+                for i in range(2)
+            ]
+            pipeline_ids = [build_def.build_definition_id for build_def in build_defs]
+            environments = [Environment.create(self.ado_client, f"ado_wrapper-test-environment-pipeline-perms-batch-{i}", "test environment") for i in range(2)]  # fmt: skip
+            environment_ids = [environment.environment_id for environment in environments]
+            # ---
+            authorisations = Environment.set_pipeline_permissions_for_environments(self.ado_client, environment_ids, pipeline_ids)
+            assert all(len(authorisations[environment_id]) == 2 for environment_id in environment_ids)
+            assert len(environments[0].get_pipeline_permissions(self.ado_client)) == 2
+            environments[0].remove_pipeline_permissions_batch(self.ado_client, pipeline_ids)
+            assert len(environments[0].get_pipeline_permissions(self.ado_client)) == 0
+            # ---
+            for build_def in build_defs:
+                build_def.delete(self.ado_client)
+            for environment in environments:
+                environment.delete(self.ado_client)
@@ -1,6 +1,6 @@
 import pytest
 
-from ado_wrapper.resources.merge_policies import MergePolicies
+from ado_wrapper.resources.merge_policies import BranchPolicyIndex, DesiredBranchPolicy, MergePolicies, get_policy_type_ids
 from tests.setup_client import RepoContextManager, existing_user_id, setup_client
 
 
@@ -56,3 +56,53 @@ class TestMergePolicy:
 
             # We also need to do way more work with the "inheritedPolicies" field, currently, "currentScopePolicies" is None for many, this
             # Might not actually be a problem though, idk
+
+    def test_branch_policy_index(self) -> None:
+        with RepoContextManager(self.ado_client, "branch-policy-index") as repo:
+            MergePolicies.add_default_reviewer(self.ado_client, repo.repo_id, existing_user_id, False)
+            MergePolicies.set_branch_policy(self.ado_client, repo.repo_id, 2, False, False, False, "do_nothing")
+            index = BranchPolicyIndex.from_project(self.ado_client)
+            assert existing_user_id in index.get_default_reviewer_ids(repo.repo_id)
+            assert len(index.get_policies(repo.repo_id, policy_type="Minimum number of reviewers")) == 1
+            fallback_index = BranchPolicyIndex.from_repos(self.ado_client, [repo.repo_id])
+            assert fallback_index.get_default_reviewer_ids(repo.repo_id) == index.get_default_reviewer_ids(repo.repo_id)
+
+    def test_set_branch_policy_many(self) -> None:
+        assert "Required reviewers" in get_policy_type_ids(self.ado_client)
+        with RepoContextManager(self.ado_client, "set-branch-policy-many-1") as repo_1, RepoContextManager(self.ado_client, "set-branch-policy-many-2") as repo_2:  # fmt: skip
+            MergePolicies.set_branch_policy(self.ado_client, repo_1.repo_id, 1, False, False, False, "do_nothing")
+            MergePolicies.set_branch_policy_many(self.ado_client, [repo_1.repo_id, repo_2.repo_id], 3, True, False, False, "do_nothing")
+            MergePolicies.add_default_reviewer_many(self.ado_client, [repo_1.repo_id, repo_2.repo_id], existing_user_id, False)
+            for repo_id in [repo_1.repo_id, repo_2.repo_id]:
+                policies = MergePolicies.get_all_branch_policies_by_repo_id(self.ado_client, repo_id)
+                assert policies is not None and len(policies) == 1  # Updated in place, rather than adding a second one
+                assert policies[0].minimum_approver_count == 3
+                assert [x.member_id for x in MergePolicies.get_default_reviewers(self.ado_client, repo_id)] == [existing_user_id]
+
+    def test_enforce_desired_policies(self) -> None:
+        with RepoContextManager(self.ado_client, "enforce-desired-policies") as repo:
+            MergePolicies.set_branch_policy(self.ado_client, repo.repo_id, 1, False, False, False, "do_nothing")
+            desired = [DesiredBranchPolicy(repo.repo_id, "main", "Minimum number of reviewers", {"minimumApproverCount": 2})]
+            changes = MergePolicies.enforce_desired_policies(self.ado_client, desired)
+            assert [change.action for change in changes] == ["update"]
+            policy = MergePolicies.get_branch_policy(self.ado_client, repo.repo_id)
+            assert policy is not None and policy.minimum_approver_count == 2
+            assert not BranchPolicyIndex.from_project(self.ado_client).diff(desired)  # Nothing left to change
+
+    def test_diff_only_touches_desired_branches(self) -> None:
+        index = BranchPolicyIndex()
+        for policy_id, branch_name in [(1, "main"), (2, "dev")]:
+            index.add(
+                {
+                    "id": policy_id, "isEnabled": True, "isBlocking": True,
+                    "type": {"id": "abc", "displayName": "Minimum number of reviewers"},
+                    "settings": {"minimumApproverCount": 1, "scope": [{"repositoryId": "123", "refName": f"refs/heads/{branch_name}", "matchKind": "Exact"}]},
+                }
+            )  # fmt: skip
+        desired = [DesiredBranchPolicy("123", "dev", "Minimum number of reviewers", {"minimumApproverCount": 2})]
+        assert [(change.action, change.ref_name) for change in index.diff(desired)] == [("update", "refs/heads/dev")]
+        pruned = index.diff(desired, prune_other_branches=True)
+        assert sorted((change.action, change.ref_name) for change in pruned) == [
+            ("delete", "refs/heads/main"),
+            ("update", "refs/heads/dev"),
+        ]
@@ -1,7 +1,8 @@
 import pytest
 
+from ado_wrapper.client import AdoClientPool
 from ado_wrapper.resources.projects import Project
-from tests.setup_client import existing_project_id, existing_project_name, setup_client
+from tests.setup_client import ado_org, email, existing_project_id, existing_project_name, pat_token, setup_client
 
 
 class TestProject:
@@ -46,3 +47,13 @@ class TestProject:
         project = Project.get_by_name(self.ado_client, existing_project_name)
         assert project is not None
         assert project.name == existing_project_name
+
+    @pytest.mark.get_all
+    def test_client_pool(self) -> None:
+        pool = AdoClientPool(email, pat_token, ado_org, max_requests_per_second=10)
+        assert existing_project_name in pool.projects
+        project_client = pool.get_client(existing_project_name)
+        assert project_client.ado_project_id == existing_project_id
+        assert project_client.session is pool.session
+        assert pool.get_client(existing_project_name) is project_client
+        assert Project.get_by_id(project_client, existing_project_id).name == existing_project_name
@@ -1,8 +1,10 @@
+from pathlib import Path
+
 import pytest
 
 from ado_wrapper.resources.commits import Commit
 from ado_wrapper.resources.pull_requests import PullRequest
-from ado_wrapper.resources.repo import Repo
+from ado_wrapper.resources.repo import Repo, RepoContentCache
 from tests.setup_client import setup_client
 
 
@@ -86,6 +88,40 @@ class TestRepo:
         assert isinstance(contents, dict)
         repo.delete(self.ado_client)
 
+    def test_iterate_contents(self) -> None:
+        repo = Repo.create(self.ado_client, "ado_wrapper-test-repo-for-iterate-repo-contents")
+        Commit.create(
+            self.ado_client, repo.repo_id, "main", "main", {"config/test.json": "{}", "test.txt": "Delete me!"}, "add", "Test commit"
+        )
+        contents = dict(repo.iterate_contents(self.ado_client, glob_patterns=["config/*"]))
+        assert contents == {"config/test.json": b"{}"}
+        repo.delete(self.ado_client)
+
+    def test_get_contents_many(self) -> None:
+        repo = Repo.create(self.ado_client, "ado_wrapper-test-repo-for-get-contents-many")
+        empty_repo = Repo.create(self.ado_client, "ado_wrapper-test-repo-for-get-contents-many-empty", include_readme=False)
+        contents: dict[str, dict[str, str]] = {}
+        summary = Repo.get_contents_many(self.ado_client, lambda repo, files: contents.update({repo.repo_id: files}), [repo, empty_repo])
+        assert list(contents[repo.repo_id].keys()) == ["README.md"]
+        assert summary.downloaded_repo_ids == [repo.repo_id]
+        assert summary.skipped_repo_ids == [empty_repo.repo_id]
+        assert summary.total_bytes > 0
+        repo.delete(self.ado_client)
+        empty_repo.delete(self.ado_client)
+
+    def test_content_cache(self, tmp_path: Path) -> None:
+        repo = Repo.create(self.ado_client, "ado_wrapper-test-repo-for-content-cache")
+        cache = RepoContentCache(repo, cache_dir=str(tmp_path), file_types=["json"])
+        Commit.create(self.ado_client, repo.repo_id, "main", "main", {"test.json": '{"a": 1}'}, "add", "Test commit")
+        assert cache.refresh(self.ado_client)
+        assert cache.get_and_decode_file("test.json") == {"a": 1}
+        assert not cache.refresh(self.ado_client)  # Nothing has changed
+        Commit.create(self.ado_client, repo.repo_id, "main", "main", {"test.json": '{"a": 2}'}, "edit", "Test commit 2")
+        assert cache.refresh(self.ado_client)
+        assert cache.get_and_decode_file("test.json") == {"a": 2}
+        assert cache.list_files() == ["test.json"]
+        repo.delete(self.ado_client)
+
     def test_get_pull_requests(self) -> None:
         repo = Repo.create(self.ado_client, "ado_wrapper-test-repo-for-get-pull-requests")
         Commit.create(
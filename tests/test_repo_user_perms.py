@@ -1,6 +1,6 @@
 import pytest
 
-from ado_wrapper.resources.repo_user_permission import RepoUserPermissions, UserPermission, PermissionType, ActionType
+from ado_wrapper.resources.repo_user_permission import RepoPermissionAudit, RepoUserPermissions, UserPermission, PermissionType, ActionType
 from tests.setup_client import setup_client, RepoContextManager, email, existing_user_name, existing_group_descriptor
 
 
@@ -49,6 +49,22 @@ class TestRepoUserPerms:
             assert isinstance(all_perms[existing_user_name], list)
             assert [x for x in all_perms[existing_user_name] if x.programmatic_name == "contribute"][0].permission_display_string == "Allow"
 
+    def test_get_all_by_repo_ids(self) -> None:
+        with RepoContextManager(self.ado_client, "get-all-user-perms-by-repo-ids-1") as repo, \
+             RepoContextManager(self.ado_client, "get-all-user-perms-by-repo-ids-2") as other_repo:  # fmt: skip
+            RepoUserPermissions.set_by_user_email(self.ado_client, repo.repo_id, email, "Allow", "contribute")
+            all_perms = RepoUserPermissions.get_all_by_repo_ids(self.ado_client, [repo.repo_id, other_repo.repo_id])
+            assert all_perms[repo.repo_id] == RepoUserPermissions.get_all_by_repo_id(self.ado_client, repo.repo_id)
+            assert existing_user_name in all_perms[repo.repo_id]
+            assert existing_user_name not in all_perms[other_repo.repo_id]
+
+    def test_permission_audit(self) -> None:
+        with RepoContextManager(self.ado_client, "permission-audit") as repo:
+            RepoUserPermissions.set_by_user_email(self.ado_client, repo.repo_id, email, "Allow", "force_push")
+            audit = RepoPermissionAudit.from_project(self.ado_client, [repo.repo_id])
+            assert repo.repo_id in audit.get_identities_with_permission("force_push")[existing_user_name]
+            assert audit.get_permissions(repo.repo_id, existing_user_name)["force_push"] == "Allow"
+
     def test_set_by_user_email_batch(self) -> None:
         with RepoContextManager(self.ado_client, "set-by-user-email-batch") as repo:
             input_perms: dict[PermissionType, ActionType] = {
@@ -105,6 +121,16 @@ class TestRepoUserPerms:
             }
             assert perms_formatted == input_perms[email]
 
+    def test_set_all_permissions_for_repos(self) -> None:
+        with RepoContextManager(self.ado_client, "set-all-perms-for-repos-1") as repo_1, RepoContextManager(self.ado_client, "set-all-perms-for-repos-2") as repo_2:  # fmt: skip
+            input_perms: dict[str, dict[PermissionType, ActionType]] = {
+                email: {"contribute": "Allow", "force_push": "Deny", "create_tag": "Deny"}
+            }
+            RepoUserPermissions.set_all_permissions_for_repos(self.ado_client, [repo_1.repo_id, repo_2.repo_id], input_perms)
+            for repo_perms in RepoUserPermissions.get_all_by_repo_ids(self.ado_client, [repo_1.repo_id, repo_2.repo_id]).values():
+                perms_formatted = {perm.programmatic_name: perm.permission_display_string for perm in repo_perms[existing_user_name]}
+                assert perms_formatted == input_perms[email]
+
     def test_remove_perms(self) -> None:
         with RepoContextManager(self.ado_client, "remove-perms") as repo:
             RepoUserPermissions.set_by_user_email(self.ado_client, repo.repo_id, email, "Allow", "contribute")
@@ -1,6 +1,6 @@
 import pytest
 
-from ado_wrapper.resources.runs import Run
+from ado_wrapper.resources.runs import Run, RunRequest, RunScheduler
 from ado_wrapper.resources.builds import BuildDefinition
 from ado_wrapper.resources.commits import Commit
 from tests.setup_client import RepoContextManager, email, existing_agent_pool_id, setup_client  # fmt: skip
@@ -78,3 +78,22 @@ class TestRun:
             assert run.status == "completed"
             run_definition.delete(self.ado_client)  # Can't delete run_definitions without deleting runs first
             run.delete(self.ado_client)
+
+    @pytest.mark.skip(reason="This requires waiting for run agents, and running for a whole run")
+    def test_run_scheduler(self) -> None:
+        with RepoContextManager(self.ado_client, "run-scheduler-runs") as repo:
+            Commit.create(self.ado_client, repo.repo_id, "main", "my-branch", {"run.yaml": BUILD_YAML_FILE}, "add", "Update")
+            run_definition = BuildDefinition.create(
+                self.ado_client, "ado_wrapper-test-run-for-run-scheduler", repo.repo_id, repo.name, "run.yaml",
+                f"Please contact {email} if you see this run definition!", existing_agent_pool_id, "my-branch",  # fmt: skip
+            )
+            scheduler = RunScheduler(self.ado_client, max_in_flight=1)
+            for priority in range(2):
+                scheduler.add(RunRequest(run_definition.build_definition_id, {}, "my-branch", priority=priority))
+            result = scheduler.run()
+            assert not result.failures
+            assert all(run is not None and run.status == "completed" for run in result.runs)
+            assert result.queue_wait_seconds[0] >= result.queue_wait_seconds[1]  # Higher priority launched first
+            run_definition.delete(self.ado_client)
+            for run in result.runs:
+                run.delete(self.ado_client)  # type: ignore[union-attr]
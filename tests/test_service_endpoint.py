@@ -1,6 +1,6 @@
 import pytest
 
-from ado_wrapper.resources.service_endpoint import ServiceEndpoint
+from ado_wrapper.resources.service_endpoint import ServiceEndpoint, ServiceEndpointPermissionIndex, ServiceEndpointPipelinePermissions
 from tests.setup_client import setup_client
 
 
@@ -41,6 +41,21 @@ class TestServiceEndpoints:
         assert not service_endpoint.is_shared
         assert service_endpoint.to_json() == ServiceEndpoint.from_json(service_endpoint.to_json()).to_json()
 
+    @pytest.mark.from_request_payload
+    def test_permission_index_from_request_payload(self) -> None:
+        index = ServiceEndpointPermissionIndex(
+            {
+                "1": ServiceEndpointPipelinePermissions.from_request_payload({"pipelines": [{"id": 5, "authorized": True}]}, "1"),
+                "2": ServiceEndpointPipelinePermissions.from_request_payload({"pipelines": [], "allPipelines": {"authorized": True}}, "2"),
+                "3": ServiceEndpointPipelinePermissions.from_request_payload({"pipelines": [{"id": 6, "authorized": False}]}, "3"),
+            }
+        )
+        assert index.get_pipeline_ids("1") == {"5"}
+        assert index.get_endpoint_ids_for_pipeline("5") == ["1", "2"]
+        assert index.can_use("6", "2")
+        assert not index.can_use("6", "3")
+        assert not index.can_use("6", "4")
+
     @pytest.mark.create_delete
     def test_create_delete(self) -> None:
         service_endpoint = ServiceEndpoint.create(
@@ -1,5 +1,6 @@
 # from ado_wrapper.resources.variable_groups import VariableGroup
 # from ado_wrapper.resources.service_endpoint import ServiceEndpoint
+from ado_wrapper.utils import run_concurrently
 from tests.setup_client import RepoContextManager, setup_client
 
 # import pytest
@@ -39,3 +40,11 @@ class TestStateManager:
             state_manager.remove_resource_from_state("Repo", repo.repo_id)
             state_manager.import_into_state("Repo", repo.repo_id)
             assert state_manager.load_state()["resources"]["Repo"][repo.repo_id]["data"] == repo.to_json()
+
+    def test_concurrent_state_changes(self) -> None:
+        state_manager = self.ado_client.state_manager
+        resource_ids = [f"ado_wrapper-test-concurrent-{i}" for i in range(50)]
+        run_concurrently(lambda resource_id: state_manager.add_resource_to_state("Build", resource_id, {}), resource_ids)
+        assert all(resource_id in state_manager.load_state()["resources"]["Build"] for resource_id in resource_ids)
+        run_concurrently(lambda resource_id: state_manager.remove_resource_from_state("Build", resource_id), resource_ids)
+        assert not any(resource_id in state_manager.load_state()["resources"]["Build"] for resource_id in resource_ids)
@@ -1,7 +1,10 @@
 import pytest
 
-from ado_wrapper.resources.variable_groups import VariableGroup
-from tests.setup_client import setup_client
+from ado_wrapper.resources.builds import BuildDefinition
+from ado_wrapper.resources.commits import Commit
+from ado_wrapper.resources.variable_groups import VariableGroup, VariableReferenceIndex
+from tests.setup_client import RepoContextManager, existing_agent_pool_id, setup_client
+from tests.test_build import BUILD_YAML_FILE
 
 
 class TestVariableGroup:
@@ -51,6 +54,41 @@ class TestVariableGroup:
         # =====
         variable_group.delete(self.ado_client)
 
+    @pytest.mark.update
+    def test_sync_many(self) -> None:
+        variable_groups = [VariableGroup.create(self.ado_client, f"ado_wrapper-test-for-sync-many-{i}", "my_description", {"a": "b"}) for i in range(2)]  # fmt: skip
+        # =====
+        result = VariableGroup.sync_many(
+            self.ado_client, {variable_groups[0].name: {"a": "b"}, variable_groups[1].name: {"a": "c", "d": "e"}}, snapshot=variable_groups
+        )
+        assert not result.failures
+        assert result.unchanged == [variable_groups[0].name]
+        assert [variable_group.name for variable_group in result.updated] == [variable_groups[1].name]
+        assert VariableGroup.get_by_id(self.ado_client, variable_groups[1].variable_group_id).variables == {"a": "c", "d": "e"}
+        # =====
+        for variable_group in variable_groups:
+            variable_group.delete(self.ado_client)
+
+    @pytest.mark.get_all
+    def test_variable_reference_index(self) -> None:
+        variable_group = VariableGroup.create(self.ado_client, "ado_wrapper-test-for-reference-index", "my_description", {"ado_wrapper_variable": "b"})  # fmt: skip
+        with RepoContextManager(self.ado_client, "variable-reference-index") as repo:
+            Commit.create(self.ado_client, repo.repo_id, "main", "my-branch", {"build.yaml": BUILD_YAML_FILE}, "add", "test commit")
+            build_def = BuildDefinition.create(
+                self.ado_client, repo.name, repo.repo_id, repo.name, "build.yaml", "", existing_agent_pool_id,
+                variables={"ado_wrapper_definition_variable": "c"}, variable_group_ids=[variable_group.variable_group_id],
+            )  # fmt: skip
+            # =====
+            with VariableReferenceIndex.from_organisation(self.ado_client, [self.ado_client.ado_project]) as index:
+                assert [x.variable_group_id for x in index.get_variable_groups(variable_name="ADO_WRAPPER_VARIABLE")] == [variable_group.variable_group_id]  # fmt: skip
+                assert [x.definition_id for x in index.get_definitions_referencing_group(variable_group.name)] == [build_def.build_definition_id]  # fmt: skip
+                assert [x.definition_id for x in index.get_definitions_referencing_variable("ADO_WRAPPER_DEFINITION_VARIABLE")] == [build_def.build_definition_id]  # fmt: skip
+                assert [x.definition_id for x in index.get_definitions_referencing_variable("ado_wrapper_variable")] == [build_def.build_definition_id]  # fmt: skip
+                assert index.get_definitions_referencing_variable("ado_wrapper_variable", include_groups=False) == []
+            # =====
+            build_def.delete(self.ado_client)
+        variable_group.delete(self.ado_client)
+
     @pytest.mark.get_by_id
     def test_get_by_id(self) -> None:
         variable_group_created = VariableGroup.create(self.ado_client, "ado_wrapper-test-for-get-by-id", "my_description", {"a": "b"})